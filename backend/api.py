@@ -2,29 +2,80 @@
 
 from fastapi import FastAPI, UploadFile, File, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import List, Optional, Tuple
 from pathlib import Path
 import os
 import json
+import time
+import uuid
+import asyncio
+import hashlib
 
 from .rag_core import (
     set_openai_config,
     index_rag_paths,
     index_bm25_paths,
+    delete_rag_file,
+    delete_bm25_file,
     create_chat,
     list_chats,
     get_chat_messages,
     run_rag_chat,
     bm25_search,
-    RAGAgent,
+    AsyncRAGAgent,
     append_chat_exchange,
+    get_stats,
+    record_stream_ttft,
+    warm_up_query_pipelines,
+    train_intent_router,
     Chat,
 )
+from .ingestion import remember_sha256, set_ingest_workers
+from .jobs import IngestionQueue
 
 app = FastAPI()
 
+UPLOADS_RAG_DIR = Path("uploads_rag")
+UPLOADS_BM25_DIR = Path("uploads_bm25")
+UPLOADS_RAG_DIR.mkdir(exist_ok=True)
+UPLOADS_BM25_DIR.mkdir(exist_ok=True)
+
+# Uploads are streamed to disk a block at a time and hashed on the way, so memory
+# per upload stays constant whatever the file size. RAG_MAX_UPLOAD_FILE_MB and
+# RAG_MAX_UPLOAD_REQUEST_MB cap one file and one request (0 for no limit); an
+# upload over a cap is rejected with 413 and none of its files are kept.
+UPLOAD_BLOCK_BYTES = 1 << 20
+MAX_UPLOAD_FILE_BYTES = int(float(os.environ.get("RAG_MAX_UPLOAD_FILE_MB", "200")) * (1 << 20))
+MAX_UPLOAD_REQUEST_BYTES = int(float(os.environ.get("RAG_MAX_UPLOAD_REQUEST_MB", "1000")) * (1 << 20))
+UPLOAD_PATHS = {"/rag/upload", "/bm25/upload"}
+
+
+class UploadSizeLimit:
+    """
+    Rejects an upload whose Content-Length is over the request cap before its body is
+    read (the multipart parser spools the whole body before the endpoint runs).
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"] in UPLOAD_PATHS and MAX_UPLOAD_REQUEST_BYTES:
+            length = dict(scope["headers"]).get(b"content-length", b"")
+            if length.isdigit() and int(length) > MAX_UPLOAD_REQUEST_BYTES:
+                response = JSONResponse(
+                    status_code=413,
+                    content={"detail": f"Upload is larger than {MAX_UPLOAD_REQUEST_BYTES} bytes"},
+                )
+                await response(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
+
+
+app.add_middleware(UploadSizeLimit)
+# added last so it wraps the middleware above and its 413s carry CORS headers too
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # in production, restrict this
@@ -33,15 +84,26 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-UPLOADS_RAG_DIR = Path("uploads_rag")
-UPLOADS_BM25_DIR = Path("uploads_bm25")
-UPLOADS_RAG_DIR.mkdir(exist_ok=True)
-UPLOADS_BM25_DIR.mkdir(exist_ok=True)
+# Indexing runs on a background worker so uploads never block the event loop
+ingestion_queue = IngestionQueue()
+JOB_EVENTS_POLL_SECONDS = 0.25
+
+# /rag/ask-stream sends an SSE comment after this long without an event, so
+# proxies and browsers keep the connection open during long summaries
+STREAM_HEARTBEAT_SECONDS = 10.0
+
+
+@app.on_event("startup")
+def warm_up():
+    # build the query pipelines before the first question arrives
+    warm_up_query_pipelines()
 
 
 class ConfigRequest(BaseModel):
     api_key: str
     model_name: Optional[str] = "gpt-4o-mini"
+    ingest_workers: Optional[int] = None  # parser processes for uploads
+    base_url: Optional[str] = None  # OpenAI-compatible endpoint, None = api.openai.com
 
 
 class ChatCreateResponse(BaseModel):
@@ -73,12 +135,80 @@ class BM25Request(BaseModel):
 
 @app.post("/config")
 def configure(req: ConfigRequest):
-    set_openai_config(req.api_key, req.model_name)
+    set_openai_config(req.api_key, req.model_name, req.base_url)
+    if req.ingest_workers:
+        set_ingest_workers(req.ingest_workers)
     return {"status": "ok"}
 
 
+@app.get("/stats")
+def api_stats():
+    """Cache hit/miss counters and index statistics"""
+    return get_stats()
+
+
+@app.post("/router/train")
+def api_train_router():
+    """Retrain the local intent classifier on the logged LLM router decisions"""
+    return train_intent_router()
+
+
+async def _save_uploads(files: List[UploadFile], uploads_dir: Path) -> Tuple[List[Path], List[str]]:
+    """
+    Stream the uploaded files into `uploads_dir`, computing their SHA-256 in the same
+    pass. Each is written to a temporary file first and renamed over its name only
+    once the whole request is within the size caps, so a file being indexed is never
+    seen half-written. Returns the saved paths and their digests.
+    """
+    names = [Path(file.filename or "").name for file in files]
+    for file, name in zip(files, names):
+        if name in ("", ".", ".."):
+            raise HTTPException(status_code=400, detail=f"Invalid file name: {file.filename!r}")
+    staged = {}  # file name -> (temporary path, digest); a repeated name keeps the last
+    temporary = []
+    total = 0
+    try:
+        for file, name in zip(files, names):
+            tmp = uploads_dir / f".{name}.{uuid.uuid4().hex}.part"
+            temporary.append(tmp)
+            digest = hashlib.sha256()
+            size = 0
+            with tmp.open("wb") as f:
+                while True:
+                    block = await file.read(UPLOAD_BLOCK_BYTES)
+                    if not block:
+                        break
+                    size += len(block)
+                    total += len(block)
+                    if MAX_UPLOAD_FILE_BYTES and size > MAX_UPLOAD_FILE_BYTES:
+                        raise HTTPException(
+                            status_code=413, detail=f"{name} is larger than {MAX_UPLOAD_FILE_BYTES} bytes"
+                        )
+                    if MAX_UPLOAD_REQUEST_BYTES and total > MAX_UPLOAD_REQUEST_BYTES:
+                        raise HTTPException(
+                            status_code=413, detail=f"Upload is larger than {MAX_UPLOAD_REQUEST_BYTES} bytes"
+                        )
+                    digest.update(block)
+                    await asyncio.to_thread(f.write, block)
+            staged[name] = (tmp, digest.hexdigest())
+
+        paths, digests = [], []
+        for name, (tmp, digest) in staged.items():
+            dest = uploads_dir / name
+            os.replace(tmp, dest)
+            remember_sha256(dest, digest)
+            paths.append(dest)
+            digests.append(digest)
+    finally:
+        # files of a failed upload, and ones superseded by a later file of the same name
+        for tmp in temporary:
+            tmp.unlink(missing_ok=True)
+    return paths, digests
+
+
 @app.post("/rag/upload")
 async def upload_rag(files: List[UploadFile] = File(...)):
+    """Save the files and queue them for indexing; poll /jobs/{job_id} for progress"""
     # Check if OpenAI is configured
     import openai as oai
     if not oai.api_key:
@@ -87,40 +217,91 @@ async def upload_rag(files: List[UploadFile] = File(...)):
             detail="OpenAI API key not configured. Please configure it first in the settings."
         )
     
-    paths = []
-    for file in files:
-        dest = UPLOADS_RAG_DIR / file.filename
-        with dest.open("wb") as f:
-            content = await file.read()
-            f.write(content)
-        paths.append(dest)
+    paths, digests = await _save_uploads(files, UPLOADS_RAG_DIR)
 
     if not paths:
         raise HTTPException(status_code=400, detail="No files uploaded")
 
-    try:
-        index_rag_paths(paths)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to index documents: {str(e)}")
-    
-    return {"indexed": len(paths), "file_names": [p.name for p in paths]}
+    job = ingestion_queue.submit("rag", paths, index_rag_paths)
+    return {"job_id": job.id, "indexed": len(paths), "file_names": [p.name for p in paths], "sha256": digests}
 
 
 @app.post("/bm25/upload")
 async def upload_bm25(files: List[UploadFile] = File(...)):
-    paths = []
-    for file in files:
-        dest = UPLOADS_BM25_DIR / file.filename
-        with dest.open("wb") as f:
-            content = await file.read()
-            f.write(content)
-        paths.append(dest)
+    """Save the files and queue them for indexing; poll /jobs/{job_id} for progress"""
+    paths, digests = await _save_uploads(files, UPLOADS_BM25_DIR)
 
     if not paths:
         raise HTTPException(status_code=400, detail="No files uploaded")
 
-    index_bm25_paths(paths)
-    return {"indexed": len(paths), "file_names": [p.name for p in paths]}
+    job = ingestion_queue.submit("bm25", paths, index_bm25_paths)
+    return {"job_id": job.id, "indexed": len(paths), "file_names": [p.name for p in paths], "sha256": digests}
+
+
+def _delete_upload(uploads_dir: Path, file_name: str, delete_chunks) -> dict:
+    path = uploads_dir / Path(file_name).name
+    removed = delete_chunks(path)
+    existed = path.exists()
+    if existed:
+        path.unlink()
+    if not removed and not existed:
+        raise HTTPException(status_code=404, detail="Document not found")
+    return {"status": "deleted", "file_name": path.name, "chunks_removed": removed}
+
+
+@app.delete("/rag/documents/{file_name}")
+def api_delete_rag_document(file_name: str):
+    """Remove an uploaded file and its chunks from the RAG collection"""
+    return _delete_upload(UPLOADS_RAG_DIR, file_name, delete_rag_file)
+
+
+@app.delete("/bm25/documents/{file_name}")
+def api_delete_bm25_document(file_name: str):
+    """Remove an uploaded file and its chunks from the BM25 collection"""
+    return _delete_upload(UPLOADS_BM25_DIR, file_name, delete_bm25_file)
+
+
+@app.get("/jobs/{job_id}")
+def api_get_job(job_id: str):
+    """Per-file state, chunk counts and errors of an ingestion job"""
+    job = ingestion_queue.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+
+@app.post("/jobs/{job_id}/cancel")
+def api_cancel_job(job_id: str):
+    """Stop a queued or running ingestion job; files still being parsed are not indexed"""
+    job = ingestion_queue.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job.finished:
+        raise HTTPException(status_code=409, detail=f"Job already {job.state}")
+    job.cancel()
+    return job.to_dict()
+
+
+@app.get("/jobs/{job_id}/events")
+async def api_job_events(job_id: str):
+    """SSE stream of job snapshots, sent on every change until the job finishes"""
+    job = ingestion_queue.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def generate():
+        last_version = -1
+        while True:
+            finished = job.finished
+            if job.version != last_version:
+                snapshot = job.to_dict()
+                last_version = snapshot["version"]
+                yield f"data: {json.dumps(snapshot)}\n\n"
+            if finished:
+                break
+            await asyncio.sleep(JOB_EVENTS_POLL_SECONDS)
+
+    return StreamingResponse(generate(), media_type="text/event-stream")
 
 
 @app.post("/chats", response_model=ChatCreateResponse)
@@ -165,24 +346,74 @@ def api_rag_ask(req: AskRequest):
     return AskResponse(answer=answer)
 
 
+async def _with_heartbeats(chunks, interval: float):
+    """
+    Relays an async iterator, yielding None whenever `interval` passes without an item.
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize=1)
+    finished = object()
+
+    async def pump():
+        try:
+            async for chunk in chunks:
+                await queue.put(chunk)
+        except Exception as e:
+            await queue.put(e)
+        else:
+            await queue.put(finished)
+
+    task = asyncio.ensure_future(pump())
+    try:
+        while True:
+            try:
+                item = await asyncio.wait_for(queue.get(), timeout=interval)
+            except asyncio.TimeoutError:
+                yield None
+                continue
+            if item is finished:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        task.cancel()
+
+
 @app.post("/rag/ask-stream")
 async def api_rag_ask_stream(req: AskRequest):
-    """Streaming version for real-time responses"""
+    """
+    Streaming version for real-time responses. Besides {"content"} events, summaries
+    send {"progress"} events while they are prepared; ": heartbeat" comments keep
+    quiet streams alive.
+    """
     async def generate():
-        agent = RAGAgent()
+        agent = AsyncRAGAgent()
         full_response = ""
+        started = time.perf_counter()
+        ttft = None
         
         try:
-            for chunk in agent.invoke_agent(req.query, req.file_names or []):
-                if isinstance(chunk, dict) and "replies" in chunk and chunk["replies"]:
+            chunks = agent.invoke_agent(req.query, req.file_names or [])
+            async for chunk in _with_heartbeats(chunks, STREAM_HEARTBEAT_SECONDS):
+                if chunk is None:
+                    yield ": heartbeat\n\n"
+                elif "progress" in chunk:
+                    yield f"data: {json.dumps({'progress': chunk['progress']})}\n\n"
+                elif isinstance(chunk, dict) and "replies" in chunk and chunk["replies"]:
                     content = chunk["replies"][0]["content"]
                     if content:
+                        if ttft is None:
+                            ttft = time.perf_counter() - started
+                            record_stream_ttft(ttft)
                         full_response += content
                         yield f"data: {json.dumps({'content': content})}\n\n"
             
             # Save to database after streaming is complete
-            append_chat_exchange(req.chat_id, req.query, full_response)
-            yield f"data: {json.dumps({'done': True})}\n\n"
+            await asyncio.to_thread(append_chat_exchange, req.chat_id, req.query, full_response)
+            done = {"done": True}
+            if ttft is not None:
+                done["ttft_ms"] = round(ttft * 1000, 1)
+            yield f"data: {json.dumps(done)}\n\n"
         except Exception as e:
             yield f"data: {json.dumps({'error': str(e)})}\n\n"
     
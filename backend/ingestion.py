@@ -0,0 +1,390 @@
+# backend/ingestion.py
+
+from haystack import Document, Pipeline
+from haystack.components.converters.txt import TextFileToDocument
+from haystack.components.preprocessors import DocumentCleaner, DocumentSplitter
+from pypdf import PdfReader
+
+from .utils.custom_converters import DocxToTextConverter, ExcelToTextConverter, PDFPagesToDocument
+
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import hashlib
+import multiprocessing
+import threading
+import time
+import os
+
+
+# This module is kept free of DB / store / OpenAI state so that ingestion
+# worker processes can import it cheaply. Workers are never forked from the
+# (multithreaded) server process: a fork could inherit a lock, an HTTP
+# connection pool or a SQLite connection in a held state and deadlock. They
+# are forked from a clean forkserver process where available, else spawned.
+
+
+# ================
+# CONVERTERS
+# ================
+
+_CONVERTER_FACTORIES = {
+    "docx": DocxToTextConverter,
+    "text": TextFileToDocument,
+    "xlsx": ExcelToTextConverter,
+    "pdf": PDFPagesToDocument,
+}
+
+
+def converter_kind(path: Path) -> str:
+    suffix = path.suffix.lower()
+    if suffix == ".docx":
+        return "docx"
+    elif suffix in [".txt", ".csv"]:
+        return "text"
+    elif suffix == ".xlsx":
+        return "xlsx"
+    else:
+        return "pdf"
+
+
+def build_converter_for_path(path: Path):
+    return _CONVERTER_FACTORIES[converter_kind(path)]()
+
+
+# ================
+# REUSABLE PIPELINES
+# ================
+
+class ReusablePipeline:
+    """
+    Pipelines that are built once and shared between requests.
+    Pipeline.run keeps per-run state on the graph, so each concurrent run borrows
+    its own instance; instances are built on first demand and kept for reuse.
+    """
+
+    def __init__(self, build: Callable[[], Pipeline]):
+        self._build = build
+        self._idle: List[Pipeline] = []
+        self._lock = threading.Lock()
+
+    def _acquire(self) -> Pipeline:
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        return self._build()
+
+    def _release(self, pipeline: Pipeline):
+        with self._lock:
+            self._idle.append(pipeline)
+
+    def warm_up(self):
+        """
+        Build an instance and warm its components ahead of the first request.
+        """
+        pipeline = self._acquire()
+        try:
+            pipeline.warm_up()
+        finally:
+            self._release(pipeline)
+
+    def run(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        pipeline = self._acquire()
+        try:
+            return pipeline.run(data)
+        finally:
+            self._release(pipeline)
+
+
+_pipelines: Dict[tuple, ReusablePipeline] = {}
+_pipelines_lock = threading.Lock()
+
+
+def get_pipeline(key: tuple, build: Callable[[], Pipeline]) -> ReusablePipeline:
+    with _pipelines_lock:
+        if key not in _pipelines:
+            _pipelines[key] = ReusablePipeline(build)
+        return _pipelines[key]
+
+
+def reset_pipelines():
+    """
+    Drop every cached pipeline, e.g. after the API key changed.
+    """
+    with _pipelines_lock:
+        _pipelines.clear()
+
+
+def preprocessing_pipeline(kind: str, split_length: int) -> ReusablePipeline:
+    """
+    converter -> cleaner -> splitter for one file type.
+    """
+    def build():
+        pipeline = Pipeline()
+        pipeline.add_component("converter", _CONVERTER_FACTORIES[kind]())
+        pipeline.add_component("cleaner", DocumentCleaner())
+        pipeline.add_component(
+            "splitter", DocumentSplitter(split_by="word", split_length=split_length)
+        )
+        pipeline.connect("converter", "cleaner")
+        pipeline.connect("cleaner", "splitter")
+        return pipeline
+
+    return get_pipeline(("preprocess", kind, split_length), build)
+
+
+# ================
+# PARSING (serial or process pool)
+# ================
+
+# Conversion, cleaning and splitting are pure-Python CPU work, so they are fanned
+# out over a process pool; only the resulting chunks come back to the parent.
+# Set RAG_INGEST_WORKERS=1 (or call set_ingest_workers(1)) to parse in-process.
+_ingest_workers = int(os.environ.get("RAG_INGEST_WORKERS", "0")) or (os.cpu_count() or 1)
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def set_ingest_workers(workers: int):
+    global _ingest_workers, _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False)
+            _pool = None
+        _ingest_workers = max(1, workers)
+
+
+def _pool_context():
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload([__name__])  # workers start with the converters imported
+        return context
+    return multiprocessing.get_context("spawn")
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=_ingest_workers, mp_context=_pool_context())
+        return _pool
+
+
+# path -> (size, mtime_ns, sha256) of files whose digest is already known, e.g.
+# hashed while the upload was streamed to disk, so indexing does not read them twice
+_known_digests: Dict[str, Tuple[int, int, str]] = {}
+_known_digests_lock = threading.Lock()
+
+
+def remember_sha256(path: Path, digest: str):
+    """
+    Record the SHA-256 of `path` as it is now; file_sha256 returns it until the file changes.
+    """
+    stat = os.stat(path)
+    with _known_digests_lock:
+        _known_digests[str(Path(path).resolve())] = (stat.st_size, stat.st_mtime_ns, digest)
+
+
+def file_sha256(path: Path) -> str:
+    key = str(Path(path).resolve())
+    stat = os.stat(path)
+    with _known_digests_lock:
+        known = _known_digests.get(key)
+    if known is not None and known[:2] == (stat.st_size, stat.st_mtime_ns):
+        return known[2]
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# PDFs are parsed in ranges of this many pages, so the pages of one large file are
+# spread over the workers and a cancelled job stops after the ranges in progress.
+PDF_PAGES_PER_TASK = int(os.environ.get("RAG_PDF_PAGES_PER_TASK", "25"))
+
+
+class IngestionCancelled(Exception):
+    """
+    Raised by split_paths when its `cancel` event is set.
+    """
+
+
+def pdf_page_count(path: Path) -> Optional[int]:
+    try:
+        return len(PdfReader(path).pages)
+    except Exception:
+        return None  # converting it reports the error
+
+
+def split_file(
+    path: Path,
+    split_length: int,
+    meta: Optional[Dict[str, Any]] = None,
+    page_range: Optional[Tuple[int, int]] = None,
+) -> Tuple[List[Document], float, float]:
+    """
+    Convert, clean and split one file. Returns the chunks, the seconds it took and
+    the wall-clock time it started at (comparable across worker processes).
+    `meta` replaces the converter's metadata (e.g. the upload directory in file_path).
+    `page_range` ([start, end), 0-based) converts only those pages of a PDF.
+    """
+    started = time.time()
+    start = time.perf_counter()
+    converter_input: Dict[str, Any] = {"sources": [path]}
+    if meta is not None:
+        converter_input["meta"] = meta
+    if page_range is not None:
+        converter_input["page_range"] = page_range
+    result = preprocessing_pipeline(converter_kind(path), split_length).run(
+        {"converter": converter_input}
+    )
+    return result["splitter"]["documents"], time.perf_counter() - start, started
+
+
+def split_paths(
+    paths: List[Path],
+    split_length: int,
+    progress: Optional[Callable[..., None]] = None,
+    metas: Optional[Dict[Path, Dict[str, Any]]] = None,
+    cancel: Optional[threading.Event] = None,
+) -> Tuple[List[Document], List[Dict[str, Any]]]:
+    """
+    Convert, clean and split files, in parallel when more than one worker is configured.
+    PDFs are split into ranges of PDF_PAGES_PER_TASK pages, parsed like separate files.
+    Returns all chunks (in input file order) and one report per file with its
+    chunk count and measured parse time (summed over its page ranges), or the error
+    if the file could not be parsed. Reports of PDFs add their `pages` and the
+    `pages_per_second` they were parsed at, timed from when the first of their page
+    ranges started (not from when they were queued) to when the last one finished.
+    `progress(file_name, **fields)` is called as each file starts and finishes, and
+    as the page ranges of a PDF complete.
+    `metas` optionally gives the chunk metadata of each path.
+    Once `cancel` is set, no further file or page range is started and
+    IngestionCancelled is raised.
+    """
+    progress = progress or (lambda file_name, **fields: None)
+    metas = metas or {}
+
+    # (path, page range) per task; None converts the whole file
+    tasks: List[Tuple[Path, Optional[Tuple[int, int]]]] = []
+    pages: Dict[Path, int] = {}
+    for path in paths:
+        progress(path.name, state="parsing")
+        count = pdf_page_count(path) if converter_kind(path) == "pdf" else None
+        if count is None:
+            tasks.append((path, None))
+            continue
+        pages[path] = count
+        ranges = [(first, min(first + PDF_PAGES_PER_TASK, count)) for first in range(0, count, PDF_PAGES_PER_TASK)]
+        tasks.extend((path, page_range) for page_range in ranges or [(0, 0)])
+
+    task_docs: List[List[Document]] = [[] for _ in tasks]
+    path_tasks: Dict[Path, List[int]] = {path: [] for path in paths}
+    for index, (path, _) in enumerate(tasks):
+        path_tasks[path].append(index)
+    remaining = {path: len(indexes) for path, indexes in path_tasks.items()}
+    seconds: Dict[Path, float] = {path: 0.0 for path in paths}
+    errors: Dict[Path, str] = {}
+    pages_parsed: Dict[Path, int] = {path: 0 for path in paths}
+    pages_per_second: Dict[Path, float] = {}
+    pages_started: Dict[Path, float] = {}
+
+    def finish(index: int, get_result: Callable[[], Tuple[List[Document], float, float]]):
+        path, page_range = tasks[index]
+        try:
+            task_docs[index], task_seconds, task_started = get_result()
+            seconds[path] += task_seconds
+            pages_started[path] = min(task_started, pages_started.get(path, task_started))
+        except Exception as e:
+            errors.setdefault(path, str(e))
+        remaining[path] -= 1
+        if path in pages:
+            pages_parsed[path] += page_range[1] - page_range[0]
+            if remaining[path]:
+                progress(path.name, pages_parsed=pages_parsed[path], pages=pages[path])
+        if remaining[path]:
+            return
+        if path in errors:
+            progress(path.name, state="failed", error=errors[path])
+            return
+        fields: Dict[str, Any] = {}
+        if path in pages:
+            finished = time.time()
+            elapsed = finished - pages_started[path]
+            pages_per_second[path] = round(pages[path] / elapsed, 2) if elapsed > 0 else 0.0
+            fields = {
+                "pages": pages[path],
+                "pages_parsed": pages[path],
+                "pages_per_second": pages_per_second[path],
+                "pages_started_at": datetime.utcfromtimestamp(pages_started[path]).isoformat(),
+                "pages_finished_at": datetime.utcfromtimestamp(finished).isoformat(),
+            }
+        chunk_count = sum(len(task_docs[index]) for index in path_tasks[path])
+        progress(path.name, state="parsed", chunks=chunk_count, parse_seconds=round(seconds[path], 4), **fields)
+
+    def check_cancelled():
+        if cancel is not None and cancel.is_set():
+            raise IngestionCancelled("Ingestion was cancelled")
+
+    if _ingest_workers > 1 and len(tasks) > 1:
+        pool = _get_pool()
+        futures = {
+            pool.submit(split_file, path, split_length, metas.get(path), page_range): index
+            for index, (path, page_range) in enumerate(tasks)
+        }
+        pending = set(futures)
+        try:
+            while pending:
+                check_cancelled()
+                done, pending = wait(pending, timeout=0.25, return_when=FIRST_COMPLETED)
+                for future in done:
+                    finish(futures[future], future.result)
+        finally:
+            for future in pending:
+                future.cancel()  # ranges already running finish in the background
+    else:
+        for index, (path, page_range) in enumerate(tasks):
+            check_cancelled()
+            finish(index, lambda: split_file(path, split_length, metas.get(path), page_range))
+
+    chunks: List[Document] = []
+    reports: List[Dict[str, Any]] = []
+    for path in paths:
+        docs = [doc for index in path_tasks[path] for doc in task_docs[index]]
+        error = errors.get(path)
+        if error is not None:
+            docs = []
+        chunks.extend(docs)
+        report = {
+            "file_name": path.name,
+            "chunks": len(docs),
+            "parse_seconds": round(seconds[path], 4) if error is None else None,
+        }
+        if path in pages_per_second:
+            report["pages"] = pages[path]
+            report["pages_per_second"] = pages_per_second[path]
+        if error is not None:
+            report["error"] = error
+        reports.append(report)
+    return chunks, reports
+
+
+def resplit(chunks: List[Document], split_length: int) -> List[Document]:
+    """
+    Re-split a file's chunks (split_paths output, in order) into `split_length`-word
+    chunks without converting the file again. Word splits without overlap concatenate
+    back to the cleaned text of their source document; the documents of a file
+    (pages, sections, row groups) are then joined by newlines, so the new chunks
+    run across them.
+    """
+    texts: Dict[str, List[str]] = {}
+    for chunk in chunks:
+        texts.setdefault(chunk.meta.get("source_id"), []).append(chunk.content or "")
+    if not texts:
+        return []
+    text = "\n".join("".join(parts) for parts in texts.values())
+    splitter = DocumentSplitter(split_by="word", split_length=split_length)
+    return splitter.run(documents=[Document(content=text)])["documents"]
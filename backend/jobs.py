@@ -0,0 +1,186 @@
+# backend/jobs.py
+
+from collections import OrderedDict
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import queue
+import threading
+import traceback
+import uuid
+
+from .ingestion import IngestionCancelled
+
+
+# ================
+# INGESTION JOBS
+# ================
+
+class IngestionJob:
+    """
+    Tracks one upload while it is parsed, embedded and written in the background.
+    Every update bumps `version`, which lets pollers and SSE streams detect changes.
+    """
+
+    def __init__(self, kind: str, paths: List[Path]):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.paths = paths
+        self.state = "queued"  # queued -> running -> done | failed | cancelled
+        self.error: Optional[str] = None
+        self.created_at = datetime.utcnow()
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        self.version = 0
+        self.files: Dict[str, Dict[str, Any]] = {
+            path.name: {
+                "state": "queued",
+                "chunks": 0,
+                "chunks_embedded": 0,
+                "parse_seconds": None,
+                "error": None,
+            }
+            for path in paths
+        }
+        self.cancel_event = threading.Event()
+        self._lock = threading.Lock()
+
+    def cancel(self):
+        """
+        Ask the job to stop. A queued job never starts; a running one stops parsing
+        and fails with nothing written, unless it is already writing chunks.
+        """
+        self.cancel_event.set()
+
+    def update_file(self, file_name: str, **fields):
+        """
+        Progress callback handed to index_rag_paths / index_bm25_paths.
+        """
+        with self._lock:
+            self.files.setdefault(file_name, {}).update(fields)
+            self.version += 1
+
+    def _set_state(self, state: str, error: Optional[str] = None):
+        with self._lock:
+            self.state = state
+            self.error = error
+            if state == "running":
+                self.started_at = datetime.utcnow()
+            elif state in ("done", "failed", "cancelled"):
+                self.finished_at = datetime.utcnow()
+            self.version += 1
+
+    @property
+    def finished(self) -> bool:
+        return self.state in ("done", "failed", "cancelled")
+
+    @staticmethod
+    def _pages_per_second(files: List[Dict[str, Any]]) -> Optional[float]:
+        """
+        PDF pages parsed per second over the job's PDFs, which are parsed together:
+        their page count over the span from the first page range starting to the
+        last one finishing.
+        """
+        pdfs = [f for f in files if f.get("pages_started_at") and f.get("pages_finished_at")]
+        if not pdfs:
+            return None
+        started = min(datetime.fromisoformat(f["pages_started_at"]) for f in pdfs)
+        finished = max(datetime.fromisoformat(f["pages_finished_at"]) for f in pdfs)
+        seconds = (finished - started).total_seconds()
+        return round(sum(f["pages"] for f in pdfs) / seconds, 2) if seconds > 0 else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            files = [{"file_name": name, **info} for name, info in self.files.items()]
+            return {
+                "id": self.id,
+                "kind": self.kind,
+                "state": self.state,
+                "error": self.error,
+                "created_at": self.created_at.isoformat(),
+                "started_at": self.started_at.isoformat() if self.started_at else None,
+                "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+                "chunks": sum(f.get("chunks", 0) for f in files),
+                "chunks_embedded": sum(f.get("chunks_embedded", 0) for f in files),
+                "pages": sum(f.get("pages") or 0 for f in files),
+                "pages_per_second": self._pages_per_second(files),
+                "files": files,
+                "version": self.version,
+            }
+
+
+class IngestionQueue:
+    """
+    Runs indexing jobs on background threads so upload handlers return immediately
+    and never block the event loop. Jobs run one at a time by default; parsing
+    within a job is already parallel (see ingestion.split_paths).
+    """
+
+    def __init__(self, workers: int = 1, max_jobs: int = 200):
+        self.workers = workers
+        self.max_jobs = max_jobs
+        self._jobs: "OrderedDict[str, IngestionJob]" = OrderedDict()
+        self._queue: "queue.Queue" = queue.Queue()
+        self._lock = threading.Lock()
+        self._threads: List[threading.Thread] = []
+
+    def _ensure_workers(self):
+        if self._threads:
+            return
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"ingestion-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, kind: str, paths: List[Path], index_func: Callable[..., Any]) -> IngestionJob:
+        """
+        Queue `index_func(paths, progress=job.update_file, cancel=job.cancel_event)` and
+        return the job right away.
+        """
+        job = IngestionJob(kind, paths)
+        with self._lock:
+            self._ensure_workers()
+            self._jobs[job.id] = job
+            # forget the oldest finished jobs
+            while len(self._jobs) > self.max_jobs:
+                oldest_id, oldest = next(iter(self._jobs.items()))
+                if not oldest.finished:
+                    break
+                del self._jobs[oldest_id]
+        self._queue.put((job, index_func))
+        return job
+
+    def get(self, job_id: str) -> Optional[IngestionJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _work(self):
+        while True:
+            job, index_func = self._queue.get()
+            if job.cancel_event.is_set():
+                job._set_state("cancelled")
+                self._queue.task_done()
+                continue
+            job._set_state("running")
+            try:
+                index_func(job.paths, progress=job.update_file, cancel=job.cancel_event)
+            except IngestionCancelled:
+                # cancelling stops the job before anything is written
+                with job._lock:
+                    names = [name for name, info in job.files.items() if info.get("state") != "failed"]
+                for name in names:
+                    job.update_file(name, state="cancelled")
+                job._set_state("cancelled")
+            except Exception as e:
+                traceback.print_exc()
+                job._set_state("failed", error=str(e))
+            else:
+                with job._lock:
+                    states = [info.get("state") for info in job.files.values()]
+                if "failed" in states and states.count("failed") == len(states):
+                    job._set_state("failed", error="All files failed to index")
+                else:
+                    job._set_state("done")
+            finally:
+                self._queue.task_done()
@@ -1,12 +1,7 @@
 # backend/rag_core.py
 
-from haystack import Pipeline
-from haystack.document_stores.in_memory import InMemoryDocumentStore
-from haystack.components.converters import PyPDFToDocument
-from haystack.components.converters.txt import TextFileToDocument
-from haystack.components.preprocessors import DocumentCleaner, DocumentSplitter
+from haystack import Document, Pipeline
 from haystack.components.writers import DocumentWriter
-from haystack.components.embedders import OpenAIDocumentEmbedder, OpenAITextEmbedder
 from haystack.components.joiners import DocumentJoiner
 from haystack.utils import Secret
 from haystack.components.retrievers.in_memory import (
@@ -14,7 +9,29 @@ from haystack.components.retrievers.in_memory import (
     InMemoryBM25Retriever,
 )
 
-from .utils.custom_converters import DocxToTextConverter, ExcelToTextConverter
+from .ingestion import (
+    IngestionCancelled,
+    ReusablePipeline,
+    file_sha256,
+    get_pipeline,
+    reset_pipelines,
+    resplit,
+    split_paths,
+)
+from .utils.persistent_store import PersistentDocumentStore, StoreView
+from .utils.vector_index import vector_index_from_env
+from .utils.metrics import LatencyRecorder
+from .utils.intent_classifier import LocalIntentRouter, rule_intent
+from .utils.summary_cache import GENERIC_QUERY, SummaryCache
+from .utils.summary_chunks import SummaryChunkStore
+from .utils.llm_scheduler import LLMScheduler
+from .utils.openai_clients import OpenAIClientManager
+from .utils.embedding_cache import (
+    EmbeddingCache,
+    QueryEmbeddingCache,
+    CachedOpenAIDocumentEmbedder,
+    CachedOpenAITextEmbedder,
+)
 
 from sqlalchemy import (
     create_engine,
@@ -30,10 +47,13 @@ from sqlalchemy.orm import sessionmaker, relationship
 
 from datetime import datetime
 from pathlib import Path
-from typing import List, Optional, Dict, Any
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 import openai
+import asyncio
 import concurrent.futures
+import threading
+import time
 import os
 
 
@@ -71,121 +91,489 @@ SessionLocal = sessionmaker(bind=engine)
 # GLOBAL STATE (doc stores + OpenAI configuration)
 # ================
 
-_document_store_rag = InMemoryDocumentStore(embedding_similarity_function="cosine")
-_document_store_bm25 = InMemoryDocumentStore()
+# One persisted chunk store holds the text of both collections once; the RAG and
+# BM25 stores are views of it. Embeddings are memory-mapped from INDEX_RAG_DIR on
+# startup, so a restart does not require re-uploading (and re-embedding) files.
+# Queries score the whole matrix by default; with RAG_VECTOR_INDEX=ivf, stores
+# past RAG_IVF_EXACT_BELOW chunks only score the rows of the nearest IVF buckets
+# (faster, but recall depends on how clustered the embeddings are).
+# BM25 queries use an inverted index shared by both views.
+INDEX_RAG_DIR = Path("index_rag")
+
+_chunk_store = PersistentDocumentStore(
+    INDEX_RAG_DIR,
+    embedding_similarity_function="cosine",
+    vector_index=vector_index_from_env(),
+    default_view="rag",  # chunks indexed before views existed
+    partition_field="file_path",  # per-file partitions for scoped questions
+)
+_document_store_rag = _chunk_store.view("rag")
+_document_store_bm25 = _chunk_store.view("bm25")
+
+# Embeddings are cached on disk by (text, model), so re-indexing unchanged
+# chunks and repeated queries never hit the embeddings API twice.
+EMBEDDING_CACHE_PATH = Path("embedding_cache.db")
+_embedding_cache = EmbeddingCache(EMBEDDING_CACHE_PATH)
+
+# Hot query embeddings are kept in memory in front of their own table in the
+# same file, so query lookups do not show up in the document cache's counters.
+QUERY_CACHE_SIZE = 4096
+QUERY_CACHE_ON_DISK = True
+QUERY_CACHE_DISK_SIZE = 100_000
+_query_embedding_cache = QueryEmbeddingCache(
+    max_entries=QUERY_CACHE_SIZE,
+    backing=(
+        EmbeddingCache(EMBEDDING_CACHE_PATH, max_entries=QUERY_CACHE_DISK_SIZE, table="query_embeddings")
+        if QUERY_CACHE_ON_DISK
+        else None
+    ),
+)
+
+# Map-phase summaries are cached on disk by (chunk, normalized query, model), so
+# follow-up summary questions about the same files only summarize new chunks.
+# With RAG_GENERIC_SUMMARIES=1, a query-independent summary of every chunk is
+# computed at upload; plain "summarize this" questions are answered from those.
+SUMMARY_CACHE_PATH = Path("summary_cache.db")
+SUMMARY_CACHE_SIZE = 100_000
+SUMMARY_CACHE_TTL_SECONDS = 7 * 24 * 3600
+GENERIC_SUMMARIES_AT_UPLOAD = os.environ.get("RAG_GENERIC_SUMMARIES", "0") == "1"
+_summary_cache = SummaryCache(
+    SUMMARY_CACHE_PATH, max_entries=SUMMARY_CACHE_SIZE, ttl_seconds=SUMMARY_CACHE_TTL_SECONDS
+)
+
+# Summaries map over SUMMARY_SPLIT_LENGTH-word chunks. They are cut from the
+# retrieval chunks while a file is indexed and stored by content hash next to the
+# chunk store, so summary questions never parse the uploaded files again.
+SUMMARY_SPLIT_LENGTH = 3000
+_summary_chunks = SummaryChunkStore(INDEX_RAG_DIR / "summary_chunks", split_length=SUMMARY_SPLIT_LENGTH)
+
+# Summary LLM calls go through one scheduler: at most RAG_LLM_MAX_CONCURRENCY in
+# flight, within RAG_LLM_RPM / RAG_LLM_TPM, retried on 429/5xx, and shared fairly
+# between the summary questions running at the same time.
+_llm_scheduler = LLMScheduler()
 
 _selected_model = "gpt-4o-mini"  # default, can be changed via API
+EMBEDDING_MODEL = "text-embedding-ada-002"
+
+# One sync and one async OpenAI client (with keep-alive connection pools) for
+# every LLM and embedding call in the process.
+_openai_clients = OpenAIClientManager()
+
+# Time-to-first-token of /rag/ask-stream responses
+_stream_ttft = LatencyRecorder()
+
+# Routing decisions are made locally when possible (rules, then a hashed n-gram
+# model trained on logged LLM router decisions); only queries the local tiers
+# are not confident about go to the LLM router.
+ROUTER_LOG_PATH = Path("router_decisions.jsonl")
+INTENT_MODEL_PATH = Path("intent_model.npz")
+INTENT_CONFIDENCE_THRESHOLD = 0.9
+_intent_router = LocalIntentRouter(
+    ROUTER_LOG_PATH, INTENT_MODEL_PATH, threshold=INTENT_CONFIDENCE_THRESHOLD
+)
+_routing_latency = {tier: LatencyRecorder() for tier in ("rules", "model", "llm")}
 
 
-def set_openai_config(api_key: str, model_name: Optional[str] = None):
+def set_openai_config(api_key: str, model_name: Optional[str] = None, base_url: Optional[str] = None):
     """
     Configure OpenAI globally for this process.
     Call this once from your API after user provides key/model.
+    `base_url` points every call at an OpenAI-compatible server (None = default).
     """
     global _selected_model
     openai.api_key = api_key
     if model_name:
         _selected_model = model_name
+    _openai_clients.configure(api_key=api_key, base_url=base_url)
+    reset_pipelines()
+    warm_up_query_pipelines()
 
 
-def get_doc_store_rag() -> InMemoryDocumentStore:
+def get_chunk_store() -> PersistentDocumentStore:
+    return _chunk_store
+
+
+def get_doc_store_rag() -> StoreView:
     return _document_store_rag
 
 
-def get_doc_store_bm25() -> InMemoryDocumentStore:
+def get_doc_store_bm25() -> StoreView:
     return _document_store_bm25
 
 
-# ================
-# INDEXING (RAG + BM25)
-# ================
+def get_openai_client() -> openai.OpenAI:
+    return _openai_clients.client()
+
+
+def get_async_openai_client() -> openai.AsyncOpenAI:
+    return _openai_clients.async_client()
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    return _embedding_cache
+
+
+def get_query_embedding_cache() -> QueryEmbeddingCache:
+    return _query_embedding_cache
+
+
+def get_llm_scheduler() -> LLMScheduler:
+    return _llm_scheduler
+
+
+def get_summary_cache() -> SummaryCache:
+    return _summary_cache
 
-def _build_converter_for_path(path: Path):
-    suffix = path.suffix.lower()
-    if suffix == ".docx":
-        return DocxToTextConverter()
-    elif suffix in [".txt", ".csv"]:
-        return TextFileToDocument()
-    elif suffix == ".xlsx":
-        return ExcelToTextConverter()
-    else:
-        return PyPDFToDocument()
 
+def get_summary_chunk_store() -> SummaryChunkStore:
+    return _summary_chunks
 
-def index_rag_paths(paths: List[Path]):
+
+def get_stats() -> Dict[str, Any]:
     """
-    Equivalent to your old write_documents_rag, but works on already-saved files.
+    Runtime counters for the caches and indexes, served by the /stats endpoint.
     """
-    document_store_rag = get_doc_store_rag()
+    return {
+        "embedding_cache": _embedding_cache.stats(),
+        "query_embedding_cache": _query_embedding_cache.stats(),
+        "summary_cache": _summary_cache.stats(),
+        "summary_chunks": _summary_chunks.stats(),
+        "llm_scheduler": _llm_scheduler.stats(),
+        "openai_client": _openai_clients.settings(),
+        "chunk_store": {
+            "chunks": _chunk_store.count_documents(),
+            "rag": _document_store_rag.count_documents(),
+            "bm25": _document_store_bm25.count_documents(),
+            "dead_fraction": round(_chunk_store.dead_fraction(), 4),
+        },
+        "vector_index": _chunk_store.vector_index.stats(),
+        "chat_stream_ttft": _stream_ttft.stats(),
+        "speculative_retrieval": get_speculation_stats(),
+        "query_routing": get_routing_stats(),
+    }
+
+
+def record_stream_ttft(seconds: float):
+    _stream_ttft.record(seconds)
 
-    for path in paths:
+
+# ================
+# INDEXING (RAG + BM25)
+# ================
+
+def _rag_writing_pipeline() -> ReusablePipeline:
+    """
+    embedder -> writer into the RAG store.
+    """
+    def build():
         pipeline = Pipeline()
-        pipeline.add_component("converter", _build_converter_for_path(path))
-        pipeline.add_component("cleaner", DocumentCleaner())
-        pipeline.add_component(
-            "splitter", DocumentSplitter(split_by="word", split_length=350)
-        )
         pipeline.add_component(
             "embedder",
-            OpenAIDocumentEmbedder(api_key=Secret.from_token(openai.api_key)),
+            CachedOpenAIDocumentEmbedder(
+                cache=get_embedding_cache(),
+                client=get_openai_client(),
+                api_key=Secret.from_token(openai.api_key),
+                model=EMBEDDING_MODEL,
+            ),
         )
-        pipeline.add_component("writer", DocumentWriter(document_store=document_store_rag))
-
-        pipeline.connect("converter", "cleaner")
-        pipeline.connect("cleaner", "splitter")
-        pipeline.connect("splitter", "embedder")
+        pipeline.add_component("writer", DocumentWriter(document_store=get_doc_store_rag()))
         pipeline.connect("embedder.documents", "writer")
+        return pipeline
+
+    return get_pipeline(("write", "rag"), build)
+
+
+def _bm25_writing_pipeline() -> ReusablePipeline:
+    def build():
+        pipeline = Pipeline()
+        pipeline.add_component("writer", DocumentWriter(document_store=get_doc_store_bm25()))
+        return pipeline
+
+    return get_pipeline(("write", "bm25"), build)
+
+
+# Chunks are embedded and written in slices of this size, so progress can be
+# reported while a large upload is indexed (each slice is still several full
+# embedding API batches).
+INDEX_WRITE_BATCH = 256
+
+
+def _write_chunks(
+    pipeline: ReusablePipeline,
+    input_name: str,
+    chunks: List[Document],
+    reports: List[Dict[str, Any]],
+    progress: Optional[Callable[..., None]],
+):
+    progress = progress or (lambda file_name, **fields: None)
+    # chunks are grouped by file, in report order; unchanged files bring none
+    chunk_files = [r["file_name"] for r in reports if not r.get("unchanged") for _ in range(r["chunks"])]
+    written: Dict[str, int] = {}
+    for i in range(0, len(chunks), INDEX_WRITE_BATCH):
+        pipeline.run({input_name: {"documents": chunks[i : i + INDEX_WRITE_BATCH]}})
+        for file_name in chunk_files[i : i + INDEX_WRITE_BATCH]:
+            written[file_name] = written.get(file_name, 0) + 1
+        for file_name in set(chunk_files[i : i + INDEX_WRITE_BATCH]):
+            progress(file_name, chunks_embedded=written[file_name])
+    for report in reports:
+        if "error" not in report and not report.get("unchanged"):
+            # converters skip unreadable files with a warning instead of raising
+            progress(report["file_name"], state="indexed" if report["chunks"] else "empty")
 
-        pipeline.run({"converter": {"sources": [path]}})
 
+INDEX_SPLIT_LENGTH = 350
 
-def index_bm25_paths(paths: List[Path]):
+# Replacing and deleting files leaves dead chunks behind in the store files and
+# the BM25 index; the store is compacted in the background once they reach this
+# share of it.
+COMPACT_DEAD_FRACTION = 0.3
+
+_compaction: Optional[threading.Thread] = None
+
+
+def _indexed_chunks(view: str, path: Path) -> List[Document]:
     """
-    Equivalent to your old write_documents_bm25, no embeddings.
+    Chunks of `path` currently in `view`, including ones indexed before chunks were
+    tagged with the bare file name (their file_path is the upload path).
     """
-    document_store_bm25 = get_doc_store_bm25()
+    store = get_chunk_store()
+    return store.get_documents_by_meta("file_path", path.name, view=view) + store.get_documents_by_meta(
+        "file_path", str(path), view=view
+    )
 
+
+def _chunk_paths(
+    view: str,
+    paths: List[Path],
+    progress: Optional[Callable[..., None]] = None,
+    cancel: Optional[threading.Event] = None,
+) -> Tuple[List[Document], List[Dict[str, Any]], List[Document], Dict[str, List[str]]]:
+    """
+    Chunks to write into `view`, diffed against what the view already holds for each file:
+    * unchanged files (same content hash) are skipped,
+    * files whose bytes are already in the chunk store (uploaded to the other collection)
+      reuse the stored chunks instead of being parsed again, so the collections share them,
+    * chunks of a changed file keep the embedding of an identical chunk of its previous
+      version, so only new or modified text is embedded.
+    For the "rag" view, the summary chunks of each parsed file are cut from its chunks.
+    Returns the chunks, one report per file (split_paths' shape plus "shared" and
+    "unchanged"), the previous chunks to delete once the new ones are written and
+    the summary chunks by source_hash, to store along with the chunks.
+    Stores nothing; raises IngestionCancelled once `cancel` is set.
+    """
+    progress = progress or (lambda file_name, **fields: None)
+    store = get_chunk_store()
+    metas = {path: {"file_path": path.name, "source_hash": file_sha256(path)} for path in paths}
+    previous = {path: _indexed_chunks(view, path) for path in paths}
+
+    per_path: Dict[Path, List[Document]] = {}
+    summaries: Dict[str, List[str]] = {}
+    reports_by_path: Dict[Path, Dict[str, Any]] = {}
     for path in paths:
-        pipeline = Pipeline()
-        pipeline.add_component("converter", _build_converter_for_path(path))
-        pipeline.add_component("cleaner", DocumentCleaner())
-        pipeline.add_component(
-            "splitter", DocumentSplitter(split_by="word", split_length=350)
-        )
-        pipeline.add_component("writer", DocumentWriter(document_store=document_store_bm25))
+        source_hash = metas[path]["source_hash"]
+        if previous[path] and all(
+            d.meta.get("source_hash") == source_hash and d.meta.get("file_path") == path.name for d in previous[path]
+        ):
+            per_path[path] = []
+            reports_by_path[path] = {
+                "file_name": path.name, "chunks": len(previous[path]), "parse_seconds": 0.0,
+                "shared": False, "unchanged": True,
+            }
+            progress(path.name, state="unchanged", chunks=len(previous[path]), parse_seconds=0.0)
+            continue
+        stored = store.get_documents_by_meta("source_hash", source_hash)
+        if not stored:
+            continue
+        # the same bytes may be stored under several names, keep one copy
+        source = next((d.meta["file_path"] for d in stored if d.meta.get("file_path") == path.name), None)
+        source = source or stored[0].meta.get("file_path")
+        per_path[path] = []
+        for d in stored:
+            if d.meta.get("file_path") == source:
+                # ids are derived from the fields set at creation, and chunks are created
+                # before they are embedded; attach the embedding after so ids match
+                chunk = Document(content=d.content, meta={**d.meta, **metas[path]})
+                chunk.embedding = d.embedding
+                per_path[path].append(chunk)
+        reports_by_path[path] = {
+            "file_name": path.name, "chunks": len(per_path[path]), "parse_seconds": 0.0,
+            "shared": True, "unchanged": False,
+        }
+        progress(path.name, state="parsed", chunks=len(per_path[path]), parse_seconds=0.0, shared=True)
+
+    to_parse = [path for path in paths if path not in per_path]
+    parsed, parse_reports = split_paths(to_parse, INDEX_SPLIT_LENGTH, progress=progress, metas=metas, cancel=cancel)
+    position = 0
+    for path, report in zip(to_parse, parse_reports):
+        per_path[path] = parsed[position : position + report["chunks"]]
+        position += report["chunks"]
+        reports_by_path[path] = {**report, "shared": False, "unchanged": False}
+        if view == "rag" and "error" not in report:
+            # before repeated chunks are dropped below, so the text is complete
+            sections = resplit(per_path[path], SUMMARY_SPLIT_LENGTH)
+            summaries[metas[path]["source_hash"]] = [d.content for d in sections]
+
+    stale: List[Document] = []
+    for path in paths:
+        report = reports_by_path[path]
+        if report["unchanged"] or "error" in report:
+            # a file that failed to parse keeps its previous chunks
+            per_path[path] = []
+            continue
+        previous_embeddings = {d.content: d.embedding for d in previous[path] if d.embedding is not None}
+        unique: Dict[str, Document] = {}
+        for chunk in per_path[path]:
+            # a chunk repeated verbatim in one file has the same id, store it once
+            if chunk.embedding is None:
+                chunk.embedding = previous_embeddings.get(chunk.content)
+            unique.setdefault(chunk.id, chunk)
+        per_path[path] = list(unique.values())
+        report["chunks"] = len(per_path[path])
+        stale.extend(d for d in previous[path] if d.id not in unique)
+
+    chunks = [chunk for path in paths for chunk in per_path[path]]
+    return chunks, [reports_by_path[path] for path in paths], stale, summaries
+
+
+def _compact_in_background():
+    """
+    Start compacting the chunk store on a background thread once it is fragmented
+    enough, unless a compaction is already running. The upload or delete that
+    triggers it returns at once; queries and writes go on while it runs.
+    """
+    global _compaction
+    if _compaction is not None and _compaction.is_alive():
+        return
+    store = get_chunk_store()
+    if store.dead_fraction() >= COMPACT_DEAD_FRACTION:
+        _compaction = threading.Thread(target=store.compact, name="store-compaction", daemon=True)
+        _compaction.start()
+
+
+def _prune_summary_chunks(removed: List[Document]):
+    """
+    Delete the stored summary chunks of file versions no chunk refers to any more.
+    """
+    store = get_chunk_store()
+    for source_hash in {d.meta.get("source_hash") for d in removed} - {None}:
+        if not store.get_documents_by_meta("source_hash", source_hash, limit=1):
+            _summary_chunks.delete(source_hash)
 
-        pipeline.connect("converter", "cleaner")
-        pipeline.connect("cleaner", "splitter")
-        pipeline.connect("splitter", "writer")
 
-        pipeline.run({"converter": {"sources": [path]}})
+def _replace_chunks(view: str, stale: List[Document]):
+    """
+    Drop the previous chunks of re-uploaded files from `view`, after their replacements
+    were written so the files never disappear from search in between.
+    """
+    if stale:
+        get_chunk_store().delete_documents([d.id for d in stale], view=view)
+        _prune_summary_chunks(stale)
+        _compact_in_background()
+
+
+def _raise_if_cancelled(cancel: Optional[threading.Event]):
+    if cancel is not None and cancel.is_set():
+        raise IngestionCancelled("Ingestion was cancelled")
+
+
+def index_rag_paths(
+    paths: List[Path],
+    progress: Optional[Callable[..., None]] = None,
+    cancel: Optional[threading.Event] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Equivalent to your old write_documents_rag, but works on already-saved files.
+    Files are parsed on the ingestion process pool (or shared with the BM25
+    collection), then the chunks of the whole upload are embedded together, so
+    embedding batches span files. Re-uploading a file replaces its chunks;
+    an unchanged file is skipped.
+    Returns one report per file (chunk count and parse time, or error).
+    `progress(file_name, **fields)` receives per-file state and counters.
+    Setting `cancel` while files are parsed raises IngestionCancelled and leaves
+    the collection as it was; once writing starts the upload completes.
+    """
+    chunks, reports, stale, summaries = _chunk_paths("rag", paths, progress=progress, cancel=cancel)
+    _raise_if_cancelled(cancel)
+    _write_chunks(_rag_writing_pipeline(), "embedder", chunks, reports, progress)
+    for source_hash, sections in summaries.items():
+        _summary_chunks.put(source_hash, sections)
+    _replace_chunks("rag", stale)
+    if GENERIC_SUMMARIES_AT_UPLOAD:
+        indexed = [path for path, report in zip(paths, reports) if "error" not in report]
+        precompute_generic_summaries(indexed, progress)
+    return reports
+
+
+def index_bm25_paths(
+    paths: List[Path],
+    progress: Optional[Callable[..., None]] = None,
+    cancel: Optional[threading.Event] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Equivalent to your old write_documents_bm25, no embeddings.
+    """
+    chunks, reports, stale, _ = _chunk_paths("bm25", paths, progress=progress, cancel=cancel)
+    _raise_if_cancelled(cancel)
+    _write_chunks(_bm25_writing_pipeline(), "writer", chunks, reports, progress)
+    _replace_chunks("bm25", stale)
+    return reports
+
+
+def _delete_file(view: str, path: Path) -> int:
+    chunks = _indexed_chunks(view, path)
+    if chunks:
+        get_chunk_store().delete_documents([d.id for d in chunks], view=view)
+        _prune_summary_chunks(chunks)
+        _compact_in_background()
+    return len(chunks)
+
+
+def delete_rag_file(path: Path) -> int:
+    """
+    Remove an uploaded file's chunks from the RAG collection (chunks the BM25
+    collection shares stay there). Returns the number of chunks removed.
+    """
+    return _delete_file("rag", path)
+
+
+def delete_bm25_file(path: Path) -> int:
+    return _delete_file("bm25", path)
 
 
 # ================
 # CHUNKING (for summaries)
 # ================
 
+def _indexed_hash(path: Path) -> Optional[str]:
+    """
+    source_hash of the version of `path` in the RAG collection, or None if it is not indexed.
+    """
+    for file_path in (path.name, str(path)):
+        found = get_chunk_store().get_documents_by_meta("file_path", file_path, view="rag", limit=1)
+        if found:
+            return found[0].meta.get("source_hash")
+    return None
+
+
 def chunk_documents(file_names: List[str], uploads_dir: Path = Path("uploads_rag")) -> List[str]:
     """
-    Your old chunk_documents, but takes file names and re-opens them from uploads_rag.
+    Your old chunk_documents, but takes file names and reads the summary chunks stored
+    when they were indexed. Files indexed before those were stored are parsed from
+    uploads_rag once, and their chunks stored for next time.
     """
     chunks: List[str] = []
     for fname in file_names:
         path = uploads_dir / fname
-        if not path.exists():
-            continue
-
-        pipeline = Pipeline()
-        pipeline.add_component("converter", _build_converter_for_path(path))
-        pipeline.add_component("cleaner", DocumentCleaner())
-        pipeline.add_component(
-            "splitter", DocumentSplitter(split_by="word", split_length=3000)
-        )
-        pipeline.connect("converter", "cleaner")
-        pipeline.connect("cleaner", "splitter")
-
-        docs = pipeline.run({"converter": {"sources": [path]}})
-        chunks.extend([d.content for d in docs["splitter"]["documents"]])
+        source_hash = _indexed_hash(path)
+        stored = _summary_chunks.get(source_hash) if source_hash else None
+        if stored is None:
+            if not path.exists():
+                continue
+            parsed, reports = split_paths([path], split_length=INDEX_SPLIT_LENGTH)
+            stored = [d.content for d in resplit(parsed, SUMMARY_SPLIT_LENGTH)]
+            if source_hash and "error" not in reports[0] and file_sha256(path) == source_hash:
+                _summary_chunks.put(source_hash, stored)
+        chunks.extend(stored)
     return chunks
 
 
@@ -193,49 +581,155 @@ def chunk_documents(file_names: List[str], uploads_dir: Path = Path("uploads_rag
 # RETRIEVER PIPELINE (hybrid RAG)
 # ================
 
-def query_pipeline_func(query: str):
+def _add_retrieval_components(pipeline: Pipeline):
     """
-    Same as your old query_pipeline_func: hybrid retrieval + RRF.
+    Embedding + BM25 retrievers over the RAG store, fused with RRF.
     """
     document_store_rag = get_doc_store_rag()
-
-    qp = Pipeline()
-    qp.add_component(
-        "text_embedder", OpenAITextEmbedder(Secret.from_token(openai.api_key))
-    )
-    qp.add_component(
+    pipeline.add_component(
         "retriever",
         InMemoryEmbeddingRetriever(document_store=document_store_rag, top_k=4),
     )
-    qp.add_component(
+    pipeline.add_component(
         "bm25_retriever",
         InMemoryBM25Retriever(document_store=document_store_rag, top_k=4),
     )
-    qp.add_component(
+    pipeline.add_component(
         "joiner",
         DocumentJoiner(
             join_mode="reciprocal_rank_fusion", top_k=4, sort_by_score=True
         ),
     )
+    pipeline.connect("bm25_retriever", "joiner")
+    pipeline.connect("retriever", "joiner")
 
+
+def _build_query_pipeline() -> Pipeline:
+    qp = Pipeline()
+    qp.add_component(
+        "text_embedder",
+        CachedOpenAITextEmbedder(
+            cache=get_query_embedding_cache(),
+            client=get_openai_client(),
+            api_key=Secret.from_token(openai.api_key),
+            model=EMBEDDING_MODEL,
+        ),
+    )
+    _add_retrieval_components(qp)
     qp.connect("text_embedder.embedding", "retriever.query_embedding")
-    qp.connect("bm25_retriever", "joiner")
-    qp.connect("retriever", "joiner")
+    return qp
+
 
-    result = qp.run(
-        {"text_embedder": {"text": query}, "bm25_retriever": {"query": query}}
+def _build_retrieval_pipeline() -> Pipeline:
+    pipeline = Pipeline()
+    _add_retrieval_components(pipeline)
+    return pipeline
+
+
+def _query_pipeline() -> ReusablePipeline:
+    """
+    The hybrid query pipeline, built once per store and embedding config.
+    It is dropped by set_openai_config (reset_pipelines) and rebuilt on next use.
+    """
+    key = ("query", id(get_doc_store_rag()), EMBEDDING_MODEL)
+    return get_pipeline(key, _build_query_pipeline)
+
+
+def _retrieval_pipeline() -> ReusablePipeline:
+    """
+    Same as _query_pipeline but for an already embedded query (async path).
+    """
+    return get_pipeline(("retrieval", id(get_doc_store_rag())), _build_retrieval_pipeline)
+
+
+def warm_up_query_pipelines():
+    """
+    Build and warm the query pipelines so the first question doesn't pay for it.
+    The embedder needs an API key, so the full pipeline is only warmed once configured.
+    The BM25 index is built on a background thread, so startup does not wait for a
+    pass over every chunk; a BM25 query arriving before it is done waits for it.
+    """
+    threading.Thread(target=get_chunk_store().warm_up_bm25, name="bm25-warm-up", daemon=True).start()
+    _retrieval_pipeline().warm_up()
+    if openai.api_key:
+        _query_pipeline().warm_up()
+
+
+def _file_scope(file_names: Optional[List[str]]) -> Optional[Dict[str, Any]]:
+    """
+    Retriever filters restricting a question to the chunks of `file_names` (None = every
+    chunk). The chunk store answers this filter from its per-file partitions.
+    """
+    if not file_names:
+        return None
+    return {"field": "meta.file_path", "operator": "in", "value": list(file_names)}
+
+
+def query_pipeline_func(query: str, file_names: Optional[List[str]] = None):
+    """
+    Same as your old query_pipeline_func: hybrid retrieval + RRF.
+    With `file_names`, only the chunks of those files are searched.
+    """
+    filters = _file_scope(file_names)
+    result = _query_pipeline().run(
+        {
+            "text_embedder": {"text": query},
+            "retriever": {"filters": filters},
+            "bm25_retriever": {"query": query, "filters": filters},
+        }
     )
     return result["joiner"]["documents"]
 
 
-# ================
-# ROUTER + TOOLS (using OpenAI)
-# ================
+def _hybrid_retrieve(
+    query: str, query_embedding: List[float], file_names: Optional[List[str]] = None
+) -> List[Document]:
+    """
+    The retrieval half of query_pipeline_func, for an already embedded query.
+    """
+    filters = _file_scope(file_names)
+    result = _retrieval_pipeline().run(
+        {
+            "retriever": {"query_embedding": query_embedding, "filters": filters},
+            "bm25_retriever": {"query": query, "filters": filters},
+        }
+    )
+    return result["joiner"]["documents"]
 
-def query_router_func(query: str) -> str:
+
+async def _aembed_query(query: str) -> List[float]:
     """
-    Same logic as before. Returns "(1)", "(2)" or "(3)".
+    Embed a query on the shared AsyncOpenAI client, through the query embedding
+    cache shared with CachedOpenAITextEmbedder.
     """
+    cache = get_query_embedding_cache()
+    key = cache.make_key(query, EMBEDDING_MODEL)
+    # a miss in memory falls through to the SQLite cache, kept off the event loop
+    embedding = await asyncio.to_thread(cache.get, key)
+    if embedding is not None:
+        return embedding
+    response = await get_async_openai_client().embeddings.create(
+        model=EMBEDDING_MODEL, input=query.replace("\n", " ")
+    )
+    embedding = response.data[0].embedding
+    await asyncio.to_thread(cache.put, key, embedding)
+    return embedding
+
+
+async def aquery_pipeline_func(query: str, file_names: Optional[List[str]] = None) -> List[Document]:
+    """
+    Async query_pipeline_func: the query is embedded without blocking the event
+    loop, then retrieval and RRF (CPU work) run in a worker thread.
+    """
+    query_embedding = await _aembed_query(query)
+    return await asyncio.to_thread(_hybrid_retrieve, query, query_embedding, file_names)
+
+
+# ================
+# PROMPTS (shared by the sync and async tools)
+# ================
+
+def _router_messages(query: str) -> List[Dict[str, str]]:
     system = """You are a professional decision making query router bot for a chatbot system that decides whether a user's query requires a summary,  
 requires context, or is a simple follow up that requires neither."""
 
@@ -246,37 +740,113 @@ requires context, or is a simple follow up that requires neither."""
 
 Here is the query: {query}"""
 
-    client = openai.OpenAI(api_key=openai.api_key)
+    return [
+        {"role": "system", "content": system},
+        {"role": "user", "content": instruction},
+    ]
+
+
+def _context_messages(query: str, context: List[str]) -> List[Dict[str, str]]:
+    system = """You are a professional Q/A responder for a chatbot system.  
+You are responsible for responding to a user query using ONLY the context provided within the <context> tags."""
+
+    instruction = f"""You are given a user's query in the <query> field. Respond appropriately to the user's input using only the context
+in the <context> field:\n <query>{query}</query>\n <context>{context}</context>"""
+
+    return [
+        {"role": "system", "content": system},
+        {"role": "user", "content": instruction},
+    ]
+
+
+def _simple_messages(query: str) -> List[Dict[str, str]]:
+    system = """You are a professional greeting/gratitude/salutation/ follow up responder for a chatbot system.  
+You are responsible for responding to simple queries that do not require context or summaries."""
+
+    instruction = f"""Given a user's simple query, respond appropriately and professionally.
+Here is the query: {query}"""
+
+    return [
+        {"role": "system", "content": system},
+        {"role": "user", "content": instruction},
+    ]
+
+
+def _map_messages(query: str, chunk_text: str) -> List[Dict[str, str]]:
+    system = """You are a professional corpus summarizer for a chatbot system.  
+You are responsible for summarizing a chunk of text based on a user's query."""
+
+    instruction = f"""You are given a user's query in the <query> field and a chunk of text in the <chunk> field.  
+Summarize the chunk of text based on the user's query:\n <query>{query}</query>\n <chunk>{chunk_text}</chunk>"""
+
+    return [
+        {"role": "system", "content": system},
+        {"role": "user", "content": instruction},
+    ]
+
+
+def _format_summaries(analyses: List[str]) -> str:
+    return "\n\n".join(f"[{i}] {analysis}" for i, analysis in enumerate(analyses, start=1))
+
+
+def _reduce_messages(query: str, analyses: List[str]) -> List[Dict[str, str]]:
+    system = """You are a professional corpus summarizer for a chatbot system.  
+You are responsible for combining multiple summaries into a final summary based on a user's query."""
+
+    instruction = f"""You are given a user's query in the <query> field and a list of summaries in the <summaries> field.  
+Combine these summaries into a final summary that answers the user's query:\n <query>{query}</query>\n <summaries>\n{_format_summaries(analyses)}\n</summaries>"""
+
+    return [
+        {"role": "system", "content": system},
+        {"role": "user", "content": instruction},
+    ]
+
+
+def _combine_messages(query: str, analyses: List[str]) -> List[Dict[str, str]]:
+    system = """You are a professional corpus summarizer for a chatbot system.  
+You are responsible for merging summaries of consecutive parts of a corpus into one summary based on a user's query."""
+
+    instruction = f"""You are given a user's query in the <query> field and a list of summaries in the <summaries> field.  
+Merge these summaries into one summary, keeping every detail relevant to the user's query; it will later be combined with summaries of the other parts:\n <query>{query}</query>\n <summaries>\n{_format_summaries(analyses)}\n</summaries>"""
+
+    return [
+        {"role": "system", "content": system},
+        {"role": "user", "content": instruction},
+    ]
+
+
+# ================
+# ROUTER + TOOLS (using OpenAI)
+# ================
+
+def query_router_func(query: str) -> str:
+    """
+    Same logic as before. Returns "(1)", "(2)" or "(3)".
+    """
+    client = get_openai_client()
     response = client.chat.completions.create(
         model=_selected_model,
-        messages=[
-            {"role": "system", "content": system},
-            {"role": "user", "content": instruction},
-        ],
+        messages=_router_messages(query),
     )
     return response.choices[0].message.content
 
 
-def context_tool_func(query: str):
+def context_tool_func(
+    query: str, context_docs: Optional[List[Document]] = None, file_names: Optional[List[str]] = None
+):
     """
     Same as before, but no Streamlit. Yields chunks in the same dict format.
+    `context_docs` skips retrieval when the documents were already fetched;
+    otherwise retrieval is scoped to `file_names` (all files if empty).
     """
-    context_docs = query_pipeline_func(query)
+    if context_docs is None:
+        context_docs = query_pipeline_func(query, file_names)
     context = [c.content for c in context_docs]
 
-    system = """You are a professional Q/A responder for a chatbot system.  
-You are responsible for responding to a user query using ONLY the context provided within the <context> tags."""
-
-    instruction = f"""You are given a user's query in the <query> field. Respond appropriately to the user's input using only the context
-in the <context> field:\n <query>{query}</query>\n <context>{context}</context>"""
-
-    client = openai.OpenAI(api_key=openai.api_key)
+    client = get_openai_client()
     stream = client.chat.completions.create(
         model=_selected_model,
-        messages=[
-            {"role": "system", "content": system},
-            {"role": "user", "content": instruction},
-        ],
+        messages=_context_messages(query, context),
         stream=True,
     )
 
@@ -286,19 +856,10 @@ in the <context> field:\n <query>{query}</query>\n <context>{context}</context>"
 
 
 def simple_responder_func(query: str):
-    system = """You are a professional greeting/gratitude/salutation/ follow up responder for a chatbot system.  
-You are responsible for responding to simple queries that do not require context or summaries."""
-
-    instruction = f"""Given a user's simple query, respond appropriately and professionally.
-Here is the query: {query}"""
-
-    client = openai.OpenAI(api_key=openai.api_key)
+    client = get_openai_client()
     stream = client.chat.completions.create(
         model=_selected_model,
-        messages=[
-            {"role": "system", "content": system},
-            {"role": "user", "content": instruction},
-        ],
+        messages=_simple_messages(query),
         stream=True,
     )
 
@@ -307,39 +868,41 @@ Here is the query: {query}"""
             yield {"replies": [{"content": chunk.choices[0].delta.content}]}
 
 
-def map_summarizer_func(query: str, chunk_text: str) -> str:
-    system = """You are a professional corpus summarizer for a chatbot system.  
-You are responsible for summarizing a chunk of text based on a user's query."""
+# Completion budget assumed for a summary call when reserving tokens per minute
+SUMMARY_COMPLETION_TOKENS = 700
 
-    instruction = f"""You are given a user's query in the <query> field and a chunk of text in the <chunk> field.  
-Summarize the chunk of text based on the user's query:\n <query>{query}</query>\n <chunk>{chunk_text}</chunk>"""
 
-    client = openai.OpenAI(api_key=openai.api_key)
-    response = client.chat.completions.create(
-        model=_selected_model,
-        messages=[
-            {"role": "system", "content": system},
-            {"role": "user", "content": instruction},
-        ],
-    )
-    return response.choices[0].message.content
+def _approx_tokens(text: str) -> int:
+    # ~4 characters per token for English text
+    return len(text) // 4
 
 
-def reduce_summarizer_func(query: str, analyses: List[str]):
-    system = """You are a professional corpus summarizer for a chatbot system.  
-You are responsible for combining multiple summaries into a final summary based on a user's query."""
+def _estimate_tokens(messages: List[Dict[str, str]]) -> int:
+    return sum(_approx_tokens(m["content"]) for m in messages) + SUMMARY_COMPLETION_TOKENS
 
-    instruction = f"""You are given a user's query in the <query> field and a list of summaries in the <summaries> field.  
-Combine these summaries into a final summary that answers the user's query:\n <query>{query}</query>\n <summaries>{analyses}</summaries>"""
 
-    client = openai.OpenAI(api_key=openai.api_key)
-    stream = client.chat.completions.create(
-        model=_selected_model,
-        messages=[
-            {"role": "system", "content": system},
-            {"role": "user", "content": instruction},
-        ],
-        stream=True,
+def map_summarizer_func(query: str, chunk_text: str, job: Optional[object] = None) -> str:
+    """
+    One map call, scheduled as part of `job` (its own job if None).
+    """
+    messages = _map_messages(query, chunk_text)
+    # retries are left to the scheduler, which also paces the other calls
+    client = get_openai_client().with_options(max_retries=0)
+    response = _llm_scheduler.call(
+        job or object(),
+        lambda: client.chat.completions.create(model=_selected_model, messages=messages),
+        tokens=_estimate_tokens(messages),
+    )
+    return response.choices[0].message.content
+
+
+def reduce_summarizer_func(query: str, analyses: List[str], job: Optional[object] = None):
+    messages = _reduce_messages(query, analyses)
+    client = get_openai_client().with_options(max_retries=0)
+    stream = _llm_scheduler.call(
+        job or object(),
+        lambda: client.chat.completions.create(model=_selected_model, messages=messages, stream=True),
+        tokens=_estimate_tokens(messages),
     )
 
     for chunk in stream:
@@ -347,19 +910,385 @@ Combine these summaries into a final summary that answers the user's query:\n <q
             yield {"replies": [{"content": chunk.choices[0].delta.content}]}
 
 
+# Summaries fed to one reduce call, in estimated tokens. Larger sets are merged
+# level by level (the groups of a level in parallel) until they fit, so the final
+# streamed call stays bounded however many chunks were summarized.
+REDUCE_INPUT_TOKENS = 12_000
+
+
+def _clip_summary(analysis: str) -> str:
+    # at most half a reduce budget, so any two summaries can be merged together
+    return analysis[: REDUCE_INPUT_TOKENS // 2 * 4]
+
+
+def _fits_reduce(analyses: List[str]) -> bool:
+    return len(analyses) <= 1 or sum(_approx_tokens(a) for a in analyses) <= REDUCE_INPUT_TOKENS
+
+
+def _reduce_groups(analyses: List[str]) -> List[List[str]]:
+    """
+    Consecutive runs of (clipped) summaries that fit REDUCE_INPUT_TOKENS. Every group
+    but the last holds at least two, so each level at least halves the count.
+    """
+    groups: List[List[str]] = [[]]
+    size = 0
+    for analysis in analyses:
+        tokens = _approx_tokens(analysis)
+        if groups[-1] and size + tokens > REDUCE_INPUT_TOKENS:
+            groups.append([])
+            size = 0
+        groups[-1].append(analysis)
+        size += tokens
+    return groups
+
+
+def combine_summarizer_func(query: str, analyses: List[str], job: Optional[object] = None) -> str:
+    """
+    One intermediate reduce call, merging a group of summaries into one.
+    """
+    if len(analyses) == 1:
+        return analyses[0]
+    messages = _combine_messages(query, analyses)
+    client = get_openai_client().with_options(max_retries=0)
+    response = _llm_scheduler.call(
+        job or object(),
+        lambda: client.chat.completions.create(model=_selected_model, messages=messages),
+        tokens=_estimate_tokens(messages),
+    )
+    return response.choices[0].message.content
+
+
+def tree_reduce(query: str, analyses: List[str], job: Optional[object] = None) -> List[str]:
+    """
+    Merge map summaries level by level until they fit one reduce prompt, keeping their order.
+    """
+    job = job or object()
+    analyses = [_clip_summary(a) for a in analyses]
+    while not _fits_reduce(analyses):
+        groups = _reduce_groups(analyses)
+        workers = min(len(groups), _llm_scheduler.max_concurrency)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            merged = executor.map(lambda group: combine_summarizer_func(query, group, job), groups)
+            analyses = [_clip_summary(a) for a in merged]
+    return analyses
+
+
+# The map prompt of query-independent summaries
+GENERIC_SUMMARY_PROMPT = "Summarize the main points of this text."
+
+
+def _map_query(query: str) -> Tuple[str, str]:
+    """
+    (cache query, map prompt query) of a summary question. Plain "summarize this"
+    requests all share the generic summaries, whatever their wording.
+    """
+    if rule_intent(query) == "(1)":
+        return GENERIC_QUERY, GENERIC_SUMMARY_PROMPT
+    return query, query
+
+
+def _summary_keys(cache_query: str, chunks: List[str]) -> List[str]:
+    return [_summary_cache.make_key(ch, cache_query, _selected_model) for ch in chunks]
+
+
+def map_summaries(query: str, chunks: List[str], job: Optional[object] = None) -> List[str]:
+    """
+    Map-phase summaries of `chunks` for `query`, in chunk order. Cached ones are
+    reused; the rest are summarized in parallel (as the LLM scheduler allows, as
+    part of `job`) and cached as they complete.
+    """
+    return _cached_map(*_map_query(query), chunks, job or object())
+
+
+def _cached_map(cache_query: str, prompt_query: str, chunks: List[str], job: object) -> List[str]:
+    keys = _summary_keys(cache_query, chunks)
+    found = _summary_cache.get_many(keys, generic=cache_query == GENERIC_QUERY)
+    missing = {key: ch for key, ch in zip(keys, chunks) if key not in found}
+    if missing:
+        # more threads than scheduler slots would only wait
+        workers = min(len(missing), _llm_scheduler.max_concurrency)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(map_summarizer_func, prompt_query, ch, job): key for key, ch in missing.items()
+            }
+            for future in concurrent.futures.as_completed(futures):
+                found[futures[future]] = future.result()
+                _summary_cache.put_many({futures[future]: found[futures[future]]})
+    return [found[key] for key in keys]
+
+
+def precompute_generic_summaries(paths: List[Path], progress: Optional[Callable[..., None]] = None):
+    """
+    Compute (or refresh in the cache) the generic summary of every summary chunk of `paths`.
+    A failure is reported per file and does not fail the upload, whose chunks are already indexed.
+    """
+    progress = progress or (lambda file_name, **fields: None)
+    for path in paths:
+        texts = chunk_documents([path.name], uploads_dir=path.parent)
+        try:
+            _cached_map(GENERIC_QUERY, GENERIC_SUMMARY_PROMPT, texts, object())
+        except Exception as e:
+            progress(path.name, generic_summaries_error=str(e))
+        else:
+            progress(path.name, generic_summaries=len(texts))
+
+
 def summary_tool_func(query: str, file_names: List[str]):
     """
     Your old summary_tool_func, adapted to use file names.
     """
     chunks = chunk_documents(file_names)
-    analyses: List[str] = []
+    job = object()  # this question's share of the LLM scheduler
+    analyses = tree_reduce(query, map_summaries(query, chunks, job), job)
+
+    # only the final reduce streams
+    for chunk in reduce_summarizer_func(query, analyses, job):
+        yield chunk
+
+
+# ================
+# ASYNC ROUTER + TOOLS (shared AsyncOpenAI client)
+# ================
+
+async def _astream_replies(messages: List[Dict[str, str]]):
+    stream = await get_async_openai_client().chat.completions.create(
+        model=_selected_model,
+        messages=messages,
+        stream=True,
+    )
+    async for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content is not None:
+            yield {"replies": [{"content": chunk.choices[0].delta.content}]}
+
+
+async def aquery_router_func(query: str) -> str:
+    response = await get_async_openai_client().chat.completions.create(
+        model=_selected_model,
+        messages=_router_messages(query),
+    )
+    return response.choices[0].message.content
+
+
+# ================
+# LOCAL ROUTING TIERS
+# ================
+
+def local_route(query: str) -> Optional[str]:
+    """
+    Route with the rules / local model. Returns None when the LLM router has to decide.
+    """
+    started = time.perf_counter()
+    intent, tier = _intent_router.classify(query)
+    if intent is not None:
+        _routing_latency[tier].record(time.perf_counter() - started)
+    return intent
+
+
+def record_llm_route(query: str, intent: str, seconds: float):
+    """
+    Count an LLM router decision and keep it as a training example for the local model.
+    """
+    _routing_latency["llm"].record(seconds)
+    _intent_router.learn(query, intent)
+
+
+def train_intent_router() -> Dict[str, Any]:
+    """
+    Retrain the local intent model on every logged LLM router decision now.
+    """
+    examples = _intent_router.train()
+    return {"examples": examples, **_intent_router.info()}
+
+
+def get_routing_stats() -> Dict[str, Any]:
+    tiers = {tier: recorder.stats() for tier, recorder in _routing_latency.items()}
+    total = sum(t["count"] for t in tiers.values())
+    local = total - tiers["llm"]["count"]
+    return {
+        **_intent_router.info(),
+        "local_rate": local / total if total else 0.0,
+        "tiers": tiers,
+    }
+
+
+async def acontext_tool_func(
+    query: str, context_docs: Optional[List[Document]] = None, file_names: Optional[List[str]] = None
+):
+    if context_docs is None:
+        context_docs = await aquery_pipeline_func(query, file_names)
+    context = [c.content for c in context_docs]
+    async for chunk in _astream_replies(_context_messages(query, context)):
+        yield chunk
+
+
+async def asimple_responder_func(query: str):
+    async for chunk in _astream_replies(_simple_messages(query)):
+        yield chunk
+
+
+async def amap_summarizer_func(query: str, chunk_text: str, job: Optional[object] = None) -> str:
+    messages = _map_messages(query, chunk_text)
+    client = get_async_openai_client().with_options(max_retries=0)
+    response = await _llm_scheduler.acall(
+        job or object(),
+        lambda: client.chat.completions.create(model=_selected_model, messages=messages),
+        tokens=_estimate_tokens(messages),
+    )
+    return response.choices[0].message.content
+
+
+async def acombine_summarizer_func(query: str, analyses: List[str], job: Optional[object] = None) -> str:
+    if len(analyses) == 1:
+        return analyses[0]
+    messages = _combine_messages(query, analyses)
+    client = get_async_openai_client().with_options(max_retries=0)
+    response = await _llm_scheduler.acall(
+        job or object(),
+        lambda: client.chat.completions.create(model=_selected_model, messages=messages),
+        tokens=_estimate_tokens(messages),
+    )
+    return response.choices[0].message.content
+
+
+async def atree_reduce(
+    query: str,
+    analyses: List[str],
+    job: Optional[object] = None,
+    progress: Optional[Callable[[int, int, int], None]] = None,
+) -> List[str]:
+    """
+    `progress(level, groups_done, groups_total)` is called as the merges of each level complete.
+    """
+    job = job or object()
+    progress = progress or (lambda level, done, total: None)
+    analyses = [_clip_summary(a) for a in analyses]
+    level = 0
+    while not _fits_reduce(analyses):
+        level += 1
+        groups = _reduce_groups(analyses)
+        merged: List[Optional[str]] = [None] * len(groups)
+
+        async def merge(i: int, group: List[str]) -> int:
+            merged[i] = await acombine_summarizer_func(query, group, job)
+            return i
+
+        progress(level, 0, len(groups))
+        tasks = [asyncio.ensure_future(merge(i, group)) for i, group in enumerate(groups)]
+        try:
+            for done, task in enumerate(asyncio.as_completed(tasks), start=1):
+                await task
+                progress(level, done, len(groups))
+        finally:
+            for task in tasks:
+                task.cancel()
+        analyses = [_clip_summary(a) for a in merged]
+    return analyses
+
+
+async def areduce_summarizer_func(query: str, analyses: List[str], job: Optional[object] = None):
+    messages = _reduce_messages(query, analyses)
+    client = get_async_openai_client().with_options(max_retries=0)
+    stream = await _llm_scheduler.acall(
+        job or object(),
+        lambda: client.chat.completions.create(model=_selected_model, messages=messages, stream=True),
+        tokens=_estimate_tokens(messages),
+    )
+    async for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content is not None:
+            yield {"replies": [{"content": chunk.choices[0].delta.content}]}
+
+
+async def amap_summaries(
+    query: str,
+    chunks: List[str],
+    job: Optional[object] = None,
+    progress: Optional[Callable[[int, int], None]] = None,
+) -> List[str]:
+    """
+    `progress(chunks_done, chunks_total)` is called once the cached summaries are
+    known and then as each missing one completes.
+    """
+    job = job or object()
+    progress = progress or (lambda done, total: None)
+    cache_query, prompt_query = _map_query(query)
+    keys = _summary_keys(cache_query, chunks)
+    found = await asyncio.to_thread(_summary_cache.get_many, keys, cache_query == GENERIC_QUERY)
+    missing = {key: ch for key, ch in zip(keys, chunks) if key not in found}
+    done = len(keys) - len(missing)
+    progress(done, len(keys))
+
+    async def summarize(key: str, chunk_text: str) -> Tuple[str, str]:
+        return key, await amap_summarizer_func(prompt_query, chunk_text, job)
+
+    tasks = [asyncio.ensure_future(summarize(key, ch)) for key, ch in missing.items()]
+    try:
+        for task in asyncio.as_completed(tasks):
+            key, summary = await task
+            found[key] = summary
+            await asyncio.to_thread(_summary_cache.put_many, {key: summary})
+            # chunks sharing a text share a summary
+            done += sum(1 for k in keys if k == key)
+            progress(done, len(keys))
+    finally:
+        # a failed call or a closed stream abandons the other calls
+        for task in tasks:
+            task.cancel()
+    return [found[key] for key in keys]
+
+
+async def _relay_progress(task: asyncio.Future, events: asyncio.Queue):
+    """
+    Yields the events put on `events` while `task` runs, then any left over.
+    """
+    while not task.done():
+        getter = asyncio.ensure_future(events.get())
+        await asyncio.wait({getter, task}, return_when=asyncio.FIRST_COMPLETED)
+        if getter.done():
+            yield getter.result()
+        else:
+            getter.cancel()
+    while not events.empty():
+        yield events.get_nowait()
 
-    with concurrent.futures.ThreadPoolExecutor() as executor:
-        futures = [executor.submit(map_summarizer_func, query, ch) for ch in chunks]
-        for future in concurrent.futures.as_completed(futures):
-            analyses.append(future.result())
 
-    for chunk in reduce_summarizer_func(query, analyses):
+async def asummary_tool_func(query: str, file_names: List[str]):
+    """
+    Besides the reply chunks, yields {"progress": {...}} events while the summary is
+    prepared: the map phase (chunks_done / chunks_total), then each reduce level.
+    """
+    started = time.perf_counter()
+    events: asyncio.Queue = asyncio.Queue()
+
+    def report(phase: str, **fields):
+        elapsed_ms = round((time.perf_counter() - started) * 1000)
+        events.put_nowait({"progress": {"phase": phase, **fields, "elapsed_ms": elapsed_ms}})
+
+    # parsing is CPU work, keep it off the event loop
+    chunks = await asyncio.to_thread(chunk_documents, file_names)
+    job = object()
+    task = asyncio.ensure_future(
+        amap_summaries(query, chunks, job, lambda done, total: report("map", chunks_done=done, chunks_total=total))
+    )
+    try:
+        async for event in _relay_progress(task, events):
+            yield event
+        analyses = task.result()
+
+        task = asyncio.ensure_future(
+            atree_reduce(
+                query, analyses, job,
+                lambda level, done, total: report("reduce", level=level, groups_done=done, groups_total=total),
+            )
+        )
+        async for event in _relay_progress(task, events):
+            yield event
+        analyses = task.result()
+    finally:
+        task.cancel()
+
+    report("answer", summaries=len(analyses))
+    yield events.get_nowait()
+    async for chunk in areduce_summarizer_func(query, analyses, job):
         yield chunk
 
 
@@ -367,19 +1296,99 @@ def summary_tool_func(query: str, file_names: List[str]):
 # RAG AGENT
 # ================
 
+# Most questions are routed to "(2)", so by default retrieval starts at the same
+# time as the router call instead of after it. When the router picks another
+# intent the retrieval is cancelled (or its result discarded).
+SPECULATIVE_RETRIEVAL = True
+
+_speculative_executor = concurrent.futures.ThreadPoolExecutor(
+    max_workers=8, thread_name_prefix="speculative-retrieval"
+)
+_speculation_counts = {"launched": 0, "used": 0, "discarded": 0, "failed": 0}
+_speculation_lock = threading.Lock()
+# Time-to-first-token saved per used speculation: retrieval that overlapped routing
+_speculation_saved = LatencyRecorder()
+
+
+def _record_speculation(outcome: str, saved_seconds: Optional[float] = None):
+    with _speculation_lock:
+        _speculation_counts[outcome] += 1
+    if saved_seconds is not None:
+        _speculation_saved.record(saved_seconds)
+
+
+def get_speculation_stats() -> Dict[str, Any]:
+    with _speculation_lock:
+        counts = dict(_speculation_counts)
+    launched = counts["launched"]
+    return {
+        **counts,
+        "hit_rate": counts["used"] / launched if launched else 0.0,
+        "saved": _speculation_saved.stats(),
+    }
+
+
+def _should_speculate(speculative: Optional[bool]) -> bool:
+    enabled = SPECULATIVE_RETRIEVAL if speculative is None else speculative
+    # nothing to retrieve from, don't spend an embedding call
+    return enabled and get_doc_store_rag().count_documents() > 0
+
+
+def _timed(func, *args):
+    started = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - started
+
+
+async def _atimed(awaitable):
+    started = time.perf_counter()
+    result = await awaitable
+    return result, time.perf_counter() - started
+
+
 class RAGAgent:
     """
     Same logic as before, but without Streamlit.
     """
 
-    def __init__(self):
+    def __init__(self, speculative: Optional[bool] = None):
         self.loops = 0
+        self.speculative = speculative
 
     def invoke_agent(self, query: str, file_names: Optional[List[str]] = None):
-        intent_response = query_router_func(query)
-        intent = intent_response.strip()
+        speculation = None
+        intent = local_route(query)
+        if intent is None:
+            if _should_speculate(self.speculative):
+                speculation = _speculative_executor.submit(_timed, query_pipeline_func, query, file_names)
+                _record_speculation("launched")
+
+            started = time.perf_counter()
+            try:
+                intent = query_router_func(query).strip()
+            except BaseException:
+                if speculation is not None:
+                    speculation.cancel()
+                    _record_speculation("discarded")
+                raise
+            router_seconds = time.perf_counter() - started
+            record_llm_route(query, intent, router_seconds)
         file_names = file_names or []
 
+        context_docs = None
+        if speculation is not None:
+            if intent == "(2)":
+                try:
+                    context_docs, retrieval_seconds = speculation.result()
+                except Exception:
+                    # fall back to retrieving inside context_tool_func
+                    _record_speculation("failed")
+                else:
+                    _record_speculation("used", min(router_seconds, retrieval_seconds))
+            else:
+                speculation.cancel()
+                _record_speculation("discarded")
+
         if intent == "(1)":
             # Summary
             for chunk in summary_tool_func(query, file_names):
@@ -387,7 +1396,7 @@ class RAGAgent:
                     yield chunk
         elif intent == "(2)":
             # Contextual RAG
-            for chunk in context_tool_func(query):
+            for chunk in context_tool_func(query, context_docs, file_names):
                 if chunk["replies"][0]["content"]:
                     yield chunk
         elif intent == "(3)":
@@ -399,6 +1408,68 @@ class RAGAgent:
             yield {"replies": [{"content": "I'm not sure how to help with that."}]}
 
 
+class AsyncRAGAgent:
+    """
+    RAGAgent for the event loop: every LLM and embedding call is awaited on the
+    shared AsyncOpenAI client, so one worker can serve many concurrent streams.
+    """
+
+    def __init__(self, speculative: Optional[bool] = None):
+        self.loops = 0
+        self.speculative = speculative
+
+    async def invoke_agent(self, query: str, file_names: Optional[List[str]] = None):
+        speculation = None
+        intent = local_route(query)
+        if intent is None:
+            if _should_speculate(self.speculative):
+                speculation = asyncio.ensure_future(_atimed(aquery_pipeline_func(query, file_names)))
+                # a discarded speculation's exception is never awaited, don't log it
+                speculation.add_done_callback(lambda t: t.cancelled() or t.exception())
+                _record_speculation("launched")
+
+            started = time.perf_counter()
+            try:
+                intent_response = await aquery_router_func(query)
+            except BaseException:
+                if speculation is not None:
+                    speculation.cancel()
+                    _record_speculation("discarded")
+                raise
+            router_seconds = time.perf_counter() - started
+            intent = intent_response.strip()
+            # appends to the router's training log, a file write kept off the event loop
+            await asyncio.to_thread(record_llm_route, query, intent, router_seconds)
+        file_names = file_names or []
+
+        context_docs = None
+        if speculation is not None:
+            if intent == "(2)":
+                try:
+                    context_docs, retrieval_seconds = await speculation
+                except Exception:
+                    _record_speculation("failed")
+                else:
+                    _record_speculation("used", min(router_seconds, retrieval_seconds))
+            else:
+                speculation.cancel()
+                _record_speculation("discarded")
+
+        if intent == "(1)":
+            tool = asummary_tool_func(query, file_names)
+        elif intent == "(2)":
+            tool = acontext_tool_func(query, context_docs, file_names)
+        elif intent == "(3)":
+            tool = asimple_responder_func(query)
+        else:
+            yield {"replies": [{"content": "I'm not sure how to help with that."}]}
+            return
+
+        async for chunk in tool:
+            if "progress" in chunk or chunk["replies"][0]["content"]:
+                yield chunk
+
+
 # ================
 # CHAT HELPERS (DB)
 # ================
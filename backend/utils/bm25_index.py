@@ -0,0 +1,316 @@
+import math
+import threading
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+from haystack.document_stores.in_memory import InMemoryDocumentStore
+from haystack.utils import expit
+
+
+BM25_SCALING_FACTOR = 8
+
+
+class BM25Index:
+    """
+    Incremental inverted index scoring BM25L exactly like rank_bm25 (the scorer
+    behind InMemoryDocumentStore.bm25_retrieval).
+
+    Postings (term, slot, term frequency) are kept in numpy segments sorted by
+    term, one per add() batch; a segment is merged into the one before it once it
+    is at least half its size, so there are O(log n) of them. Deletions only clear
+    an alive flag (merges drop the dead postings), so document frequencies, the
+    corpus size and the average length always describe the live documents. A query
+    scores just the documents that contain one of its terms: under BM25L every
+    other document gets the same baseline score (the delta term), which is lower
+    than any candidate's, so it only matters when there are fewer than top_k
+    candidates.
+
+    Documents are partitioned (e.g. by source file). A query restricted to some
+    partitions is scored as if they were the whole corpus, like haystack's
+    filtered BM25.
+
+    Scores are accumulated term by term in query order, the same float arithmetic
+    as rank_bm25; equal scores are ordered later-added first.
+    """
+
+    def __init__(self, tokenize: Callable[[str], List[str]], k1: float = 1.5, b: float = 0.75, delta: float = 0.5):
+        self.tokenize = tokenize
+        self.k1 = k1
+        self.b = b
+        self.delta = delta
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        self._keys: List[Hashable] = []
+        self._slots: Dict[Hashable, int] = {}
+        self._doc_len: List[int] = []
+        self._alive: List[bool] = []
+        self._n_alive = 0
+        self._total_len = 0
+        self._vocab: Dict[str, int] = {}
+        # (term ids, slots, term frequencies), sorted by term then slot; later segments hold later slots
+        self._segments: List[Tuple[np.ndarray, np.ndarray, np.ndarray]] = []
+        self._partition_slots: Dict[Hashable, List[int]] = {}
+        # numpy views of the lists above, rebuilt lazily after writes
+        self._partition_arrays: Dict[Hashable, np.ndarray] = {}
+        self._doc_len_array: Optional[np.ndarray] = None
+        self._alive_array: Optional[np.ndarray] = None
+        # (corpus size, total length) of subsets passed as `include`, by id(include)
+        self._subset_stats: Dict[int, Tuple[np.ndarray, np.ndarray, int, int]] = {}
+
+    def __len__(self) -> int:
+        return self._n_alive
+
+    def add(self, keys: List[Hashable], texts: List[str], partitions: Optional[List[Hashable]] = None):
+        """
+        Index texts under caller-chosen keys (e.g. document ids). Re-adding a key replaces it.
+        """
+        with self._lock:
+            self.remove([key for key in keys if key in self._slots])
+            partitions = partitions or [None] * len(keys)
+            first = len(self._keys)
+            tokens: List[str] = []
+            lengths: List[int] = []
+            for key, text, partition in zip(keys, texts, partitions):
+                slot = len(self._keys)
+                doc_tokens = self.tokenize(text.lower())
+                tokens.extend(doc_tokens)
+                lengths.append(len(doc_tokens))
+                self._partition_slots.setdefault(partition, []).append(slot)
+                self._partition_arrays.pop(partition, None)
+                self._keys.append(key)
+                self._slots[key] = slot
+                self._doc_len.append(len(doc_tokens))
+                self._alive.append(True)
+                self._n_alive += 1
+                self._total_len += len(doc_tokens)
+            if tokens:
+                vocab = self._vocab
+                for token in set(tokens).difference(vocab):
+                    vocab[token] = len(vocab)
+                term_ids = np.fromiter(map(vocab.__getitem__, tokens), dtype=np.int64, count=len(tokens))
+                count = len(lengths)
+                slots = np.repeat(np.arange(count, dtype=np.int64), lengths)
+                # one posting per (term, document), counting the term's occurrences in it
+                pairs, tfs = np.unique(term_ids * count + slots, return_counts=True)
+                self._add_segment(
+                    ((pairs // count).astype(np.int32), (pairs % count + first).astype(np.int32), tfs.astype(np.int32))
+                )
+            self._doc_len_array = self._alive_array = None
+            self._subset_stats = {}
+
+    def _add_segment(self, segment: Tuple[np.ndarray, np.ndarray, np.ndarray]):
+        self._segments.append(segment)
+        while len(self._segments) > 1 and 2 * len(self._segments[-1][0]) >= len(self._segments[-2][0]):
+            newer = self._segments.pop()
+            older = self._segments.pop()
+            alive = np.asarray(self._alive, dtype=bool)
+            older, newer = (self._drop_dead(segment, alive) for segment in (older, newer))
+            # both are sorted by term: a newer posting goes after the older ones of its term
+            # (which have lower slots), so no sort is needed
+            at = np.searchsorted(older[0], newer[0], side="right") + np.arange(len(newer[0]))
+            from_older = np.ones(len(older[0]) + len(newer[0]), dtype=bool)
+            from_older[at] = False
+            merged = []
+            for old, new in zip(older, newer):
+                array = np.empty(len(from_older), dtype=old.dtype)
+                array[at] = new
+                array[from_older] = old
+                merged.append(array)
+            self._segments.append(tuple(merged))
+
+    @staticmethod
+    def _drop_dead(segment: Tuple[np.ndarray, np.ndarray, np.ndarray], alive: np.ndarray):
+        keep = alive[segment[1]]
+        return segment if keep.all() else tuple(array[keep] for array in segment)
+
+    def remove(self, keys: List[Hashable]):
+        with self._lock:
+            for key in keys:
+                slot = self._slots.pop(key, None)
+                if slot is None:
+                    continue
+                self._alive[slot] = False
+                self._n_alive -= 1
+                self._total_len -= self._doc_len[slot]
+            self._alive_array = None
+            self._subset_stats = {}
+
+    def clear(self):
+        with self._lock:
+            self._reset()
+
+    def renumber(self, mapping: np.ndarray):
+        """
+        Move every slot s to mapping[s], dropping those mapped to -1, after the caller
+        compacted its storage. Only for indexes whose keys are their slots (like
+        PersistentDocumentStore's line numbers); kept slots must keep their order.
+        """
+        with self._lock:
+            kept = np.flatnonzero(mapping >= 0)
+            alive = np.asarray(self._alive, dtype=bool)
+            doc_len = np.asarray(self._doc_len, dtype=np.int64)[kept]
+            segments = []
+            for terms, slots, tfs in self._segments:
+                keep = alive[slots] & (mapping[slots] >= 0)
+                segments.append((terms[keep], mapping[slots[keep]].astype(np.int32), tfs[keep]))
+            alive = alive[kept]
+            partition_slots = {}
+            for partition, slots in self._partition_slots.items():
+                slots = mapping[np.asarray(slots, dtype=np.int64)]
+                if (slots >= 0).any():
+                    partition_slots[partition] = slots[slots >= 0].tolist()
+            vocab = self._vocab
+            self._reset()
+            self._vocab = vocab
+            self._keys = list(range(len(kept)))
+            self._slots = {slot: slot for slot in np.flatnonzero(alive).tolist()}
+            self._doc_len = doc_len.tolist()
+            self._alive = alive.tolist()
+            self._n_alive = len(self._slots)
+            self._total_len = int(doc_len[alive].sum())
+            self._segments = segments
+            self._partition_slots = partition_slots
+
+    def _term_postings(self, term: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Slots and term frequencies of the documents containing `term`, sorted by slot.
+        """
+        term_id = self._vocab.get(term)
+        if term_id is None:
+            return None
+        parts = []
+        bounds = np.asarray([term_id, term_id + 1], dtype=np.int32)
+        for terms, slots, tfs in self._segments:
+            start, end = np.searchsorted(terms, bounds)
+            if start < end:
+                parts.append((slots[start:end], tfs[start:end]))
+        if not parts:
+            return None
+        return (
+            np.concatenate([slots for slots, _ in parts]).astype(np.int64),
+            np.concatenate([tfs for _, tfs in parts]).astype(np.float64),
+        )
+
+    def _partition_array(self, partition: Hashable) -> np.ndarray:
+        array = self._partition_arrays.get(partition)
+        if array is None:
+            array = self._partition_arrays[partition] = np.asarray(
+                self._partition_slots.get(partition, []), dtype=np.int64
+            )
+        return array
+
+    def _subset(self, include: np.ndarray) -> Tuple[np.ndarray, int, int]:
+        """
+        Alive mask, corpus size and total length of the documents whose slot is set in `include`.
+        """
+        cached = self._subset_stats.get(id(include))
+        if cached is not None and cached[0] is include:
+            return cached[1:]
+        mask = np.zeros(len(self._alive_array), dtype=bool)
+        n = min(len(mask), len(include))
+        mask[:n] = include[:n]
+        mask &= self._alive_array
+        stats = (mask, int(mask.sum()), int(self._doc_len_array[mask].sum()))
+        if len(self._subset_stats) >= 16:
+            self._subset_stats = {}
+        # keep `include` referenced so its id cannot be reused while cached
+        self._subset_stats[id(include)] = (include, *stats)
+        return stats
+
+    def search(
+        self,
+        query: str,
+        top_k: int,
+        include: Optional[np.ndarray] = None,
+        partitions: Optional[List[Hashable]] = None,
+    ) -> List[Tuple[Hashable, float]]:
+        """
+        Returns (key, score) of the top_k documents, best first. With `include`
+        (a boolean mask over slots, in add order) and/or `partitions`, only that
+        subset is searched, scored as if it were the whole corpus.
+        """
+        with self._lock:
+            if self._doc_len_array is None:
+                self._doc_len_array = np.asarray(self._doc_len, dtype=np.float64)
+            if self._alive_array is None:
+                self._alive_array = np.asarray(self._alive, dtype=bool)
+            doc_len = self._doc_len_array
+
+            if partitions is None:
+                if include is None:
+                    alive, n, total_len = self._alive_array, self._n_alive, self._total_len
+                else:
+                    alive, n, total_len = self._subset(include)
+            else:
+                scope = np.concatenate(
+                    [self._partition_array(p) for p in dict.fromkeys(partitions)] or [np.zeros(0, np.int64)]
+                )
+                keep = self._alive_array[scope]
+                if include is not None:
+                    inside = scope < len(include)
+                    keep &= inside
+                    keep[inside] &= include[scope[inside]]
+                scope = scope[keep]
+                alive = np.zeros(len(self._alive_array), dtype=bool)
+                alive[scope] = True
+                n, total_len = len(scope), int(doc_len[scope].sum())
+            if n == 0 or top_k <= 0:
+                return []
+            avgdl = total_len / n
+            k1, b, delta = self.k1, self.b, self.delta
+
+            terms = self.tokenize(query.lower())
+            live: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+            idf: Dict[str, float] = {}
+            for term in set(terms):
+                postings = self._term_postings(term)
+                if postings is None:
+                    continue
+                slots, tfs = postings
+                keep = alive[slots]
+                if keep.any():
+                    live[term] = (slots[keep], tfs[keep])
+                    idf[term] = math.log(n + 1) - math.log(len(live[term][0]) + 0.5)
+
+            candidates = (
+                np.unique(np.concatenate([slots for slots, _ in live.values()]))
+                if live else np.zeros(0, dtype=np.int64)
+            )
+            norm = 1 - b + b * doc_len[candidates] / avgdl
+            scores = np.zeros(len(candidates))
+            baseline = 0.0
+            for term in terms:
+                if term not in idf:
+                    continue
+                slots, tfs = live[term]
+                tf = np.zeros(len(candidates))
+                tf[np.searchsorted(candidates, slots)] = tfs
+                ctd = tf / norm
+                scores += idf[term] * (k1 + 1) * (ctd + delta) / (k1 + ctd + delta)
+                baseline += idf[term] * (k1 + 1) * delta / (k1 + delta)
+
+            if len(candidates) < top_k:
+                # pad with the latest non-matching documents, which all score `baseline`
+                others = np.flatnonzero(alive)
+                others = others[~np.isin(others, candidates)][-(top_k - len(candidates)):]
+                candidates = np.concatenate([candidates, others])
+                scores = np.concatenate([scores, np.full(len(others), baseline)])
+
+            order = np.lexsort((-candidates, -scores))[:top_k]
+            return [(self._keys[candidates[i]], float(scores[i])) for i in order]
+
+
+def bm25_index_for(store: InMemoryDocumentStore) -> Optional[BM25Index]:
+    """
+    A BM25Index configured like `store`, or None if its algorithm is not BM25L.
+    """
+    if store.bm25_algorithm.__name__ != "BM25L":
+        return None
+    params = {"k1": 1.5, "b": 0.75, "delta": 0.5, **store.bm25_parameters}
+    return BM25Index(store.tokenizer, k1=params["k1"], b=params["b"], delta=params["delta"])
+
+
+def scale_bm25_score(score: float) -> float:
+    return expit(score / BM25_SCALING_FACTOR)
@@ -1,17 +1,141 @@
 from haystack import component
 import docx
-from typing import List, Union, Dict, Any, Optional
+from docx.enum.style import WD_STYLE_TYPE
+from docx.oxml.ns import qn
+from docx.table import Table
+from typing import Iterator, List, Tuple, Union, Dict, Any, Optional
 from haystack import Document
 from pathlib import Path
-import pandas as pd 
+import openpyxl
+import datetime
+import logging
+from pypdf import PdfReader
+
+
+logger = logging.getLogger(__name__)
+
+
+_W_T, _W_TAB, _W_BR, _W_CR, _W_R = (qn(tag) for tag in ("w:t", "w:tab", "w:br", "w:cr", "w:r"))
+
+
+def _docx_text(element) -> str:
+    """
+    Text of the runs under a paragraph (or table cell) element in one pass over its
+    XML, with tabs and line breaks; python-docx's Paragraph.text runs an xpath query
+    per run. Tab stops in the paragraph properties are not runs and are skipped.
+    """
+    parts = []
+    for node in element.iter(_W_T, _W_TAB, _W_BR, _W_CR):
+        if node.tag == _W_T:
+            parts.append(node.text or "")
+        elif node.getparent().tag == _W_R:
+            parts.append("\t" if node.tag == _W_TAB else "\n")
+    return "".join(parts)
+
+
+def _docx_table_text(table: Table) -> str:
+    """
+    One line per row, cells separated by " | ". Reads the XML directly: python-docx's
+    row.cells rebuilds the whole cell grid on every call, which is quadratic in rows.
+    """
+    rows = []
+    for tr in table._tbl.tr_lst:
+        cells = [" ".join(_docx_text(tc).split()) for tc in tr.tc_lst]
+        if any(cells):
+            rows.append(" | ".join(cells))
+    return "\n".join(rows)
+
+
+def _docx_blocks(document) -> Iterator[Tuple[str, Optional[str]]]:
+    """
+    (text, heading) of each non-empty block in reading order: page header paragraphs
+    (once each), then body paragraphs and tables. `heading` is the paragraph's text
+    when it is styled as a heading or title, else None.
+    """
+    heading_styles = {
+        style.style_id
+        for style in document.styles
+        if style.type == WD_STYLE_TYPE.PARAGRAPH and style.name.startswith(("Heading", "Title"))
+    }
+    seen_headers = set()
+    for section in document.sections:
+        # a header linked to the previous section's repeats its paragraphs
+        for para in section.header.paragraphs:
+            text = para.text.strip()
+            if text and text not in seen_headers:
+                seen_headers.add(text)
+                yield text, None
+    for block in document.iter_inner_content():
+        if isinstance(block, Table):
+            text = _docx_table_text(block)
+            if text:
+                yield text, None
+        else:
+            text = _docx_text(block._p)
+            if text.strip():
+                yield text, text.strip() if block._p.style in heading_styles else None
 
 
 @component
 class DocxToTextConverter:
     """
-    A component to convert docx file to Document
+    A component to convert docx file to Document.
+
+    Paragraphs, tables (one line per row) and page headers are kept in reading order,
+    one block per line, and the text is joined once. Every Document records how many
+    blocks and sections (runs of blocks starting at a heading) it holds.
+
+    With `sections=True` a file becomes one Document per section instead, cut at block
+    boundaries after `max_section_words` words when a section runs longer. Each records
+    its `section` index, `section_title`, the `char_offset` of its text in the
+    single-Document text of the file and the index of its first block (`paragraph`).
+    iter_sections() yields those one at a time, so a very large file is never held as
+    one string.
     """
 
+    def __init__(self, sections: bool = False, max_section_words: int = 5000):
+        self.sections = sections
+        self.max_section_words = max_section_words
+
+    def iter_sections(
+        self, file_path: Union[str, Path], meta: Optional[Dict[str, Any]] = None
+    ) -> Iterator[Document]:
+        meta = meta or {}
+        parts: List[str] = []
+        words = 0
+        title: Optional[str] = None
+        index = paragraph = first_paragraph = offset = section_offset = 0
+
+        def section() -> Document:
+            return Document(
+                content="\n".join(parts),
+                meta={
+                    "section": index,
+                    "section_title": title,
+                    "char_offset": section_offset,
+                    "paragraph": first_paragraph,
+                    "paragraphs": len(parts),
+                    **meta,
+                },
+            )
+
+        for text, heading in _docx_blocks(docx.Document(file_path)):
+            block_words = len(text.split())
+            if parts and (heading is not None or words + block_words > self.max_section_words):
+                yield section()
+                index += 1
+                parts, words = [], 0
+                title = heading if heading is not None else title
+                first_paragraph, section_offset = paragraph, offset
+            elif heading is not None:
+                title = heading
+            parts.append(text)
+            words += block_words
+            paragraph += 1
+            offset += len(text) + 1  # the "\n" joining blocks
+        if parts:
+            yield section()
+
     @component.output_types(documents=List[Document])
     def run(
         self,
@@ -22,21 +146,107 @@ class DocxToTextConverter:
             meta = {}
         documents = []
         for file_path in sources:
-            doc = docx.Document(file_path)
-            text = ""
-            for para in doc.paragraphs:
-                text += para.text
-            doc = Document(content=text, meta=meta)
+            if self.sections:
+                documents.extend(self.iter_sections(file_path, meta))
+                continue
+            blocks = list(_docx_blocks(docx.Document(file_path)))
+            text = "\n".join(text for text, _ in blocks)
+            # the first block opens a section even when it is not a heading
+            sections = sum(1 for i, (_, heading) in enumerate(blocks) if i == 0 or heading is not None)
+            doc = Document(content=text, meta={"paragraphs": len(blocks), "sections": sections, **meta})
             documents.append(doc)
         return {"documents": documents}
 
 
+def _excel_cell_text(value: Any) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    if isinstance(value, datetime.datetime) and value.time() == datetime.time():
+        return value.date().isoformat()  # Excel stores dates as datetimes
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    return " ".join(str(value).split())
+
+
+def _excel_rows(sheet) -> Iterator[Tuple[int, str]]:
+    """
+    (row number, text) of each non-empty row, cells separated by " | " without the
+    empty cells that read-only mode pads rows with on the right.
+    """
+    for number, values in enumerate(sheet.iter_rows(values_only=True), start=1):
+        cells = [_excel_cell_text(value) for value in values]
+        while cells and not cells[-1]:
+            cells.pop()
+        if cells:
+            yield number, " | ".join(cells)
+
+
 @component
 class ExcelToTextConverter:
     """
     A component to convert Excel (.xlsx) files to Document.
+
+    Every sheet is read row by row in openpyxl's read-only mode (formulas as their
+    last computed value), so the workbook is never loaded as a whole. Rows are
+    grouped into Documents of at most about `max_chars` characters, one row per
+    line, each starting with the sheet's header row (its first non-empty row). Each
+    Document records its `sheet`, `header` and the `row_start` / `row_end` sheet row
+    numbers it covers. iter_documents() yields them one at a time; run() returns
+    them all, so it (and ingestion, which keeps every chunk of a file until it is
+    written) holds the text of the whole file.
     """
 
+    def __init__(self, max_chars: int = 20_000):
+        self.max_chars = max_chars
+
+    def iter_documents(
+        self, file_path: Union[str, Path], meta: Optional[Dict[str, Any]] = None
+    ) -> Iterator[Document]:
+        meta = meta or {}
+        workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+        try:
+            for sheet in workbook.worksheets:
+                header: Optional[str] = None
+                lines: List[str] = []
+                size = 0
+                header_row = row_start = row_end = 0
+
+                def group() -> Document:
+                    return Document(
+                        content="\n".join([header, *lines]),
+                        meta={
+                            "sheet": sheet.title,
+                            "header": header,
+                            "row_start": row_start,
+                            "row_end": row_end,
+                            **meta,
+                        },
+                    )
+
+                for number, line in _excel_rows(sheet):
+                    if header is None:
+                        header, header_row = line, number
+                        size = len(header)
+                        continue
+                    if lines and size + len(line) + 1 > self.max_chars:
+                        yield group()
+                        lines, size = [], len(header)
+                    if not lines:
+                        row_start = number
+                    lines.append(line)
+                    size += len(line) + 1
+                    row_end = number
+                if lines:
+                    yield group()
+                elif header is not None:
+                    # a sheet with nothing but its header row
+                    row_start = row_end = header_row
+                    yield group()
+        finally:
+            workbook.close()
+
     @component.output_types(documents=List[Document])
     def run(
         self,
@@ -47,10 +257,61 @@ class ExcelToTextConverter:
             meta = {}
         documents = []
         for file_path in sources:
-            # Read the Excel file into a DataFrame
-            df = pd.read_excel(file_path)
-            # Convert the DataFrame to a string
-            text = df.to_string(index=False)
-            doc = Document(content=text, meta=meta)
-            documents.append(doc)
+            documents.extend(self.iter_documents(file_path, meta))
+        return {"documents": documents}
+
+
+def _has_fonts(resources, depth: int = 0) -> bool:
+    """
+    Whether a page's (or form XObject's) resources define a font, i.e. it can draw text.
+    """
+    resources = resources.get_object() if resources is not None else None
+    if not resources:
+        return False
+    if resources.get("/Font"):
+        return True
+    if depth < 3:
+        for xobject in (resources.get("/XObject") or {}).values():
+            xobject = xobject.get_object()
+            if xobject.get("/Subtype") == "/Form" and _has_fonts(xobject.get("/Resources"), depth + 1):
+                return True
+    return False
+
+
+@component
+class PDFPagesToDocument:
+    """
+    A component to convert PDF files to one Document per page, with its 1-based
+    `page` number in meta.
+
+    `page_range` ([start, end), 0-based) converts only those pages, so one file can
+    be split over several workers. Pages whose resources define no font (scans,
+    figures) have no text layer and are skipped without parsing their content;
+    pages with no text are not emitted.
+    """
+
+    @component.output_types(documents=List[Document])
+    def run(
+        self,
+        sources: List[Union[str, Path]],
+        meta: Optional[Union[Dict[str, Any], List[Dict[str, Any]]]] = None,
+        page_range: Optional[Tuple[int, int]] = None,
+    ):
+        if meta is None:
+            meta = {}
+        documents = []
+        for file_path in sources:
+            reader = PdfReader(file_path)
+            start, end = page_range or (0, len(reader.pages))
+            for number in range(start, min(end, len(reader.pages))):
+                page = reader.pages[number]
+                if not _has_fonts(page.get("/Resources")):
+                    continue
+                try:
+                    text = page.extract_text()
+                except Exception as e:
+                    logger.warning("Could not extract page %d of %s, skipping it: %s", number + 1, file_path, e)
+                    continue
+                if text.strip():
+                    documents.append(Document(content=text, meta={"page": number + 1, **meta}))
         return {"documents": documents}
@@ -0,0 +1,229 @@
+import hashlib
+import inspect
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+import numpy as np
+from haystack import Document, component
+from haystack.components.embedders import OpenAIDocumentEmbedder, OpenAITextEmbedder
+from openai import OpenAI
+
+from .sqlite_lru import SQLiteLRUCache
+
+
+class EmbeddingCache(SQLiteLRUCache):
+    """
+    A content-addressed, size-bounded LRU cache of embeddings on disk.
+
+    Entries are keyed by a hash of the exact text sent to the embedding model plus the
+    model name (and output dimensions), so an unchanged chunk is never embedded twice,
+    whichever file it came from. Once more than `max_entries` are stored, the least
+    recently used ones are evicted. Caches in separate tables of the same file
+    keep separate entries and counters.
+    """
+
+    def __init__(self, path: Union[str, Path], max_entries: int = 500_000, table: str = "embeddings"):
+        super().__init__(path, table, {"embedding": "BLOB NOT NULL"}, max_entries)
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(text: str, model: str, dimensions: Optional[int] = None) -> str:
+        return hashlib.sha256(f"{model}\x00{dimensions}\x00{text}".encode("utf-8")).hexdigest()
+
+    def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        """
+        Returns the cached embeddings for the given keys and marks them as recently used.
+        """
+        with self._lock:
+            rows = self._fetch_many(keys)
+            hits = sum(1 for key in keys if key in rows)
+            self.hits += hits
+            self.misses += len(keys) - hits
+        return {key: np.frombuffer(blob, dtype=np.float32).tolist() for key, (blob,) in rows.items()}
+
+    def put_many(self, items: Dict[str, List[float]]):
+        if not items:
+            return
+        rows = {key: (np.asarray(emb, dtype=np.float32).tobytes(),) for key, emb in items.items()}
+        with self._lock:
+            self._store_many(rows)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = self._entries
+        lookups = self.hits + self.misses
+        return {
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+class QueryEmbeddingCache:
+    """
+    A bounded in-process LRU of query embeddings, optionally backed by an EmbeddingCache
+    of its own (not the document one, whose hit counters it would skew).
+
+    Queries are keyed by their normalized text (case and whitespace folded) and the
+    model, so repeated FAQs and frontend retries skip the embeddings round trip.
+    """
+
+    def __init__(self, max_entries: int = 4096, backing: Optional[EmbeddingCache] = None):
+        self.max_entries = max_entries
+        self.backing = backing
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def normalize(query: str) -> str:
+        return " ".join(query.split()).casefold()
+
+    def make_key(self, query: str, model: str, dimensions: Optional[int] = None) -> str:
+        return EmbeddingCache.make_key(self.normalize(query), model, dimensions)
+
+    def get(self, key: str) -> Optional[List[float]]:
+        with self._lock:
+            embedding = self._entries.get(key)
+            if embedding is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return embedding
+        if self.backing is not None:
+            embedding = self.backing.get_many([key]).get(key)
+            if embedding is not None:
+                with self._lock:
+                    self.disk_hits += 1
+                self._remember(key, embedding)
+                return embedding
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, embedding: List[float]):
+        self._remember(key, embedding)
+        if self.backing is not None:
+            self.backing.put_many({key: embedding})
+
+    def _remember(self, key: str, embedding: List[float]):
+        with self._lock:
+            self._entries[key] = embedding
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+                "disk": self.backing.stats() if self.backing is not None else None,
+            }
+
+
+def _init_embedder(embedder, base: type, client: Optional[OpenAI], kwargs: Dict[str, Any]):
+    """
+    Runs base.__init__ on the embedder, unless a client is given: then the same
+    attributes are set from base.__init__'s signature without constructing the
+    OpenAI client (and its connection pool) that would be thrown away at once.
+    """
+    if client is None:
+        base.__init__(embedder, **kwargs)
+        return
+    bound = inspect.signature(base.__init__).bind(embedder, **kwargs)
+    bound.apply_defaults()
+    for name, value in list(bound.arguments.items())[1:]:
+        setattr(embedder, name, value)
+    if hasattr(embedder, "meta_fields_to_embed"):
+        embedder.meta_fields_to_embed = embedder.meta_fields_to_embed or []
+    # share the caller's connection pool instead of the embedder's own client
+    embedder.client = client
+
+
+@component
+class CachedOpenAIDocumentEmbedder(OpenAIDocumentEmbedder):
+    """
+    OpenAIDocumentEmbedder that only sends chunks missing from an EmbeddingCache to the API.
+    """
+
+    def __init__(self, cache: EmbeddingCache, client: Optional[OpenAI] = None, **kwargs):
+        # @component rebuilds the class, so the zero-argument super() cannot be used here
+        _init_embedder(self, OpenAIDocumentEmbedder, client, kwargs)
+        self.cache = cache
+
+    @component.output_types(documents=List[Document], meta=Dict[str, Any])
+    def run(self, documents: List[Document]):
+        if not isinstance(documents, list) or documents and not isinstance(documents[0], Document):
+            raise TypeError(
+                "OpenAIDocumentEmbedder expects a list of Documents as input."
+                "In case you want to embed a string, please use the OpenAITextEmbedder."
+            )
+
+        # documents that already carry an embedding (e.g. unchanged chunks of a
+        # re-uploaded file) are passed through as they are
+        to_embed = [doc for doc in documents if doc.embedding is None]
+        texts_to_embed = self._prepare_texts_to_embed(documents=to_embed)
+        keys = [EmbeddingCache.make_key(text, self.model, self.dimensions) for text in texts_to_embed]
+        cached = self.cache.get_many(keys)
+
+        # embed each missing text once, even if several chunks share it
+        missing = {key: text for key, text in zip(keys, texts_to_embed) if key not in cached}
+        meta: Dict[str, Any] = {"model": self.model, "usage": {"prompt_tokens": 0, "total_tokens": 0}}
+        if missing:
+            embeddings, meta = self._embed_batch(texts_to_embed=list(missing.values()), batch_size=self.batch_size)
+            fresh = dict(zip(missing.keys(), embeddings))
+            self.cache.put_many(fresh)
+            cached.update(fresh)
+
+        for doc, key in zip(to_embed, keys):
+            doc.embedding = cached[key]
+
+        meta["cache"] = {
+            "hits": len(to_embed) - len(missing),
+            "misses": len(missing),
+            "reused": len(documents) - len(to_embed),
+        }
+        return {"documents": documents, "meta": meta}
+
+
+@component
+class CachedOpenAITextEmbedder(OpenAITextEmbedder):
+    """
+    OpenAITextEmbedder that answers repeated queries from a QueryEmbeddingCache.
+    """
+
+    def __init__(self, cache: QueryEmbeddingCache, client: Optional[OpenAI] = None, **kwargs):
+        _init_embedder(self, OpenAITextEmbedder, client, kwargs)
+        self.cache = cache
+
+    @component.output_types(embedding=List[float], meta=Dict[str, Any])
+    def run(self, text: str):
+        if not isinstance(text, str):
+            raise TypeError(
+                "OpenAITextEmbedder expects a string as an input."
+                "In case you want to embed a list of Documents, please use the OpenAIDocumentEmbedder."
+            )
+
+        key = self.cache.make_key(self.prefix + text + self.suffix, self.model, self.dimensions)
+        embedding = self.cache.get(key)
+        if embedding is not None:
+            meta = {"model": self.model, "usage": {"prompt_tokens": 0, "total_tokens": 0}, "cache": "hit"}
+            return {"embedding": embedding, "meta": meta}
+
+        result = OpenAITextEmbedder.run(self, text=text)
+        self.cache.put(key, result["embedding"])
+        result["meta"]["cache"] = "miss"
+        return result
@@ -0,0 +1,204 @@
+import json
+import re
+import threading
+import zlib
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+
+INTENTS = ["(1)", "(2)", "(3)"]
+
+# High-precision patterns for queries that never need the LLM router.
+# Only whole-message matches count, so "thanks, and what does section 4 say?"
+# still goes to the model / LLM.
+_RULES: List[Tuple[str, "re.Pattern"]] = [
+    (
+        "(3)",
+        re.compile(
+            r"^\s*(hi|hello|hey|yo|hiya|good (morning|afternoon|evening)|thanks?( you)?( so much| a lot)?|"
+            r"thx|ty|cheers|great|awesome|perfect|cool|nice|ok(ay)?|got it|bye|goodbye|see you)"
+            r"[\s!.,:)]*$",
+            re.IGNORECASE,
+        ),
+    ),
+    (
+        "(1)",
+        re.compile(
+            r"^\s*(please\s+)?(summari[sz]e|give me a summary of|tl;?dr|overview of)\b"
+            r"(\s+(this|these|the|my|all|both))?(\s+(document|documents|file|files|report|reports|docs?))?"
+            r"[\s!.?]*$",
+            re.IGNORECASE,
+        ),
+    ),
+]
+
+
+def rule_intent(query: str) -> Optional[str]:
+    for intent, pattern in _RULES:
+        if pattern.match(query):
+            return intent
+    return None
+
+
+class HashedNgramClassifier:
+    """
+    A multinomial logistic regression over hashed word unigrams/bigrams and
+    character trigrams. Prediction is a handful of row lookups, so it runs in
+    microseconds; training is plain SGD and takes about a second on 10k queries.
+    """
+
+    def __init__(self, n_features: int = 2 ** 16):
+        self.n_features = n_features
+        self.weights = np.zeros((n_features, len(INTENTS)), dtype=np.float32)
+        self.bias = np.zeros(len(INTENTS), dtype=np.float32)
+        self.n_examples = 0
+
+    def features(self, query: str) -> np.ndarray:
+        words = re.findall(r"\w+|[?!]", query.lower())
+        grams = [f"w:{w}" for w in words]
+        grams += [f"b:{a} {b}" for a, b in zip(words, words[1:])]
+        text = f" {' '.join(words)} "
+        grams += [f"c:{text[i:i + 3]}" for i in range(len(text) - 2)]
+        grams.append(f"n:{min(len(words), 20)}")
+        return np.unique(
+            np.fromiter((zlib.crc32(g.encode("utf-8")) % self.n_features for g in grams), dtype=np.int64)
+        )
+
+    def predict_proba(self, query: str) -> np.ndarray:
+        logits = self.weights[self.features(query)].sum(axis=0) + self.bias
+        logits = np.exp(logits - logits.max())
+        return logits / logits.sum()
+
+    def predict(self, query: str) -> Tuple[str, float]:
+        proba = self.predict_proba(query)
+        best = int(proba.argmax())
+        return INTENTS[best], float(proba[best])
+
+    def fit(self, queries: List[str], intents: List[str], epochs: int = 8, lr: float = 0.5, l2: float = 1e-5):
+        features = [self.features(q) for q in queries]
+        targets = np.array([INTENTS.index(i) for i in intents])
+        self.weights[:] = 0
+        self.bias[:] = 0
+        rng = np.random.default_rng(0)
+        for epoch in range(epochs):
+            step = lr / (1 + epoch)
+            for i in rng.permutation(len(features)):
+                idx = features[i]
+                logits = self.weights[idx].sum(axis=0) + self.bias
+                proba = np.exp(logits - logits.max())
+                proba /= proba.sum()
+                proba[targets[i]] -= 1.0
+                self.weights[idx] -= step * (proba + l2 * self.weights[idx])
+                self.bias -= step * proba
+        self.n_examples = len(features)
+
+    def save(self, path: Union[str, Path]):
+        np.savez_compressed(path, weights=self.weights, bias=self.bias, n_examples=self.n_examples)
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> "HashedNgramClassifier":
+        data = np.load(path)
+        model = cls(n_features=data["weights"].shape[0])
+        model.weights = data["weights"]
+        model.bias = data["bias"]
+        model.n_examples = int(data["n_examples"])
+        return model
+
+
+class LocalIntentRouter:
+    """
+    Answers routing decisions locally when it is confident: first by rules, then
+    by the hashed n-gram model. Decisions made by the LLM router are logged and the
+    model is retrained in the background every `retrain_every` new decisions.
+    """
+
+    def __init__(
+        self,
+        log_path: Union[str, Path],
+        model_path: Union[str, Path],
+        threshold: float = 0.9,
+        min_examples: int = 200,
+        retrain_every: int = 200,
+    ):
+        self.log_path = Path(log_path)
+        self.model_path = Path(model_path)
+        self.threshold = threshold
+        self.min_examples = min_examples
+        self.retrain_every = retrain_every
+        self.model: Optional[HashedNgramClassifier] = None
+        if self.model_path.exists():
+            self.model = HashedNgramClassifier.load(self.model_path)
+        self._pending = 0
+        self._training = False
+        self._lock = threading.Lock()
+
+    def classify(self, query: str) -> Tuple[Optional[str], str]:
+        """
+        Returns (intent, tier), with intent None when the LLM router has to decide.
+        """
+        intent = rule_intent(query)
+        if intent is not None:
+            return intent, "rules"
+        model = self.model
+        if model is not None and model.n_examples >= self.min_examples:
+            intent, confidence = model.predict(query)
+            if confidence >= self.threshold:
+                return intent, "model"
+        return None, "llm"
+
+    def learn(self, query: str, intent: str):
+        """
+        Log a decision of the LLM router as a training example.
+        """
+        if intent not in INTENTS:
+            return
+        with self._lock:
+            with self.log_path.open("a", encoding="utf-8") as f:
+                f.write(json.dumps({"query": query, "intent": intent}) + "\n")
+            self._pending += 1
+            if self._pending < self.retrain_every or self._training:
+                return
+            self._pending = 0
+            self._training = True
+        threading.Thread(target=self._retrain, name="intent-retrain", daemon=True).start()
+
+    def _retrain(self):
+        try:
+            self.train()
+        finally:
+            with self._lock:
+                self._training = False
+
+    def train(self) -> int:
+        """
+        Fit a new model on every logged decision and swap it in. Returns the example count.
+        """
+        queries: List[str] = []
+        intents: List[str] = []
+        if self.log_path.exists():
+            with self.log_path.open(encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    if record.get("intent") in INTENTS:
+                        queries.append(record["query"])
+                        intents.append(record["intent"])
+        if not queries:
+            return 0
+        model = HashedNgramClassifier()
+        model.fit(queries, intents)
+        model.save(self.model_path)
+        self.model = model
+        return len(queries)
+
+    def info(self) -> Dict[str, object]:
+        model = self.model
+        return {
+            "threshold": self.threshold,
+            "model_examples": model.n_examples if model is not None else 0,
+            "model_active": model is not None and model.n_examples >= self.min_examples,
+        }
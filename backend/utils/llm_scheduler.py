@@ -0,0 +1,259 @@
+import asyncio
+import os
+import random
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Hashable, Optional, TypeVar
+
+import openai
+
+
+T = TypeVar("T")
+
+# HTTP statuses worth retrying: rate limited, or a transient server-side failure
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """
+    Refills `per_minute` units per minute. Bursts are limited to a tenth of a second's
+    worth, as APIs enforce per-minute limits over shorter windows. `reserve(n)` takes n
+    units right away, going into debt if needed, and returns how long the caller
+    must wait before using them, so waiters are served in arrival order.
+    """
+
+    def __init__(self, per_minute: float):
+        self.per_minute = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.capacity = max(1.0, self.rate / 10)
+        self._level = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self._level = min(self.capacity, self._level + (now - self._updated) * self.rate)
+            self._updated = now
+            self._level -= amount
+            return max(0.0, -self._level / self.rate)
+
+
+class _Ticket:
+    """
+    A caller waiting for a concurrency slot, woken through an Event (threads)
+    or a Future (coroutines).
+    """
+
+    __slots__ = ("event", "future", "loop")
+
+    def __init__(self, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.loop = loop
+        self.event = None if loop else threading.Event()
+        self.future = loop.create_future() if loop else None
+
+
+class LLMScheduler:
+    """
+    Runs LLM calls under a concurrency cap and request/token-per-minute budgets,
+    retrying rate-limited and transient failures.
+
+    Calls belong to a job (e.g. one summary question). Free slots are handed out
+    round-robin across the jobs that are waiting, so a large job cannot starve the
+    others: each concurrent job gets an equal share of the slots.
+
+    A retryable failure (429 / 5xx / connection error) is retried up to `max_retries`
+    times after a jittered exponential backoff, or the server's Retry-After if longer.
+    A 429 also pauses every call for that long, since the whole process shares the
+    API's limits. The slot is given up while a call backs off.
+
+    `tokens` passed with a call is its estimated prompt + completion size; set
+    `requests_per_minute` / `tokens_per_minute` to 0 for no budget.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = int(os.environ.get("RAG_LLM_MAX_CONCURRENCY", "8")),
+        requests_per_minute: float = float(os.environ.get("RAG_LLM_RPM", "0")),
+        tokens_per_minute: float = float(os.environ.get("RAG_LLM_TPM", "0")),
+        max_retries: int = int(os.environ.get("RAG_LLM_MAX_RETRIES", "5")),
+        backoff_base: float = 0.5,
+        backoff_max: float = 30.0,
+    ):
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self._tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self._lock = threading.Lock()
+        self._active = 0
+        # job -> its waiting tickets; the first job is next in the rotation
+        self._waiting: "OrderedDict[Hashable, Deque[_Ticket]]" = OrderedDict()
+        self._paused_until = 0.0
+        self._counts = {"calls": 0, "retries": 0, "rate_limited": 0, "failed": 0}
+        self._throttled_seconds = 0.0
+
+    # ----------------
+    # slots
+    # ----------------
+
+    def _grant_locked(self):
+        while self._active < self.max_concurrency and self._waiting:
+            job, tickets = self._waiting.popitem(last=False)
+            ticket = tickets.popleft()
+            if tickets:
+                self._waiting[job] = tickets  # back of the rotation
+            self._active += 1
+            if ticket.event is not None:
+                ticket.event.set()
+            else:
+                ticket.loop.call_soon_threadsafe(self._wake, ticket.future)
+
+    def _wake(self, future: asyncio.Future):
+        if future.cancelled():
+            # the waiter went away after being granted a slot
+            self._release()
+        else:
+            future.set_result(None)
+
+    def _enqueue(self, job: Hashable, ticket: _Ticket):
+        with self._lock:
+            self._waiting.setdefault(job, deque()).append(ticket)
+            self._grant_locked()
+
+    def _withdraw(self, job: Hashable, ticket: _Ticket):
+        with self._lock:
+            tickets = self._waiting.get(job)
+            if tickets is not None and ticket in tickets:
+                tickets.remove(ticket)
+                if not tickets:
+                    del self._waiting[job]
+
+    def _release(self):
+        with self._lock:
+            self._active -= 1
+            self._grant_locked()
+
+    def _acquire(self, job: Hashable):
+        ticket = _Ticket()
+        self._enqueue(job, ticket)
+        ticket.event.wait()
+
+    async def _aacquire(self, job: Hashable):
+        ticket = _Ticket(asyncio.get_running_loop())
+        self._enqueue(job, ticket)
+        try:
+            await ticket.future
+        except asyncio.CancelledError:
+            if ticket.future.done() and not ticket.future.cancelled():
+                self._release()  # granted just before the cancellation
+            else:
+                self._withdraw(job, ticket)
+            raise
+
+    # ----------------
+    # budgets and retries
+    # ----------------
+
+    def _throttle_delay(self, tokens: int) -> float:
+        """
+        Reserve one request and `tokens` tokens; returns how long to wait before calling.
+        """
+        delay = max(0.0, self._paused_until - time.monotonic())
+        if self._requests is not None:
+            delay = max(delay, self._requests.reserve(1))
+        if self._tokens is not None and tokens:
+            delay = max(delay, self._tokens.reserve(tokens))
+        if delay:
+            with self._lock:
+                self._throttled_seconds += delay
+        return delay
+
+    def _retry_delay(self, attempt: int, error: Exception) -> Optional[float]:
+        """
+        Seconds to back off before retrying after `error`, or None if it is not retryable.
+        """
+        status = getattr(error, "status_code", None)
+        if status not in RETRYABLE_STATUS and not isinstance(error, (openai.APIConnectionError, openai.APITimeoutError)):
+            return None
+        if attempt >= self.max_retries:
+            return None
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        response = getattr(error, "response", None)
+        try:
+            retry_after = float(response.headers.get("retry-after")) if response is not None else None
+        except (TypeError, ValueError):
+            retry_after = None
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.backoff_max))
+        with self._lock:
+            self._counts["retries"] += 1
+            if status == 429:
+                self._counts["rate_limited"] += 1
+                self._paused_until = max(self._paused_until, time.monotonic() + delay)
+        return delay
+
+    def _count(self, name: str):
+        with self._lock:
+            self._counts[name] += 1
+
+    # ----------------
+    # calls
+    # ----------------
+
+    def call(self, job: Hashable, func: Callable[[], T], tokens: int = 0) -> T:
+        """
+        Run `func()` (one LLM request) for `job`, blocking until it is its turn.
+        """
+        attempt = 0
+        while True:
+            self._acquire(job)
+            try:
+                time.sleep(self._throttle_delay(tokens))
+                self._count("calls")
+                return func()
+            except Exception as e:
+                delay = self._retry_delay(attempt, e)
+                if delay is None:
+                    self._count("failed")
+                    raise
+            finally:
+                self._release()
+            time.sleep(delay)
+            attempt += 1
+
+    async def acall(self, job: Hashable, func: Callable[[], Awaitable[T]], tokens: int = 0) -> T:
+        """
+        Same as call(), for a coroutine function.
+        """
+        attempt = 0
+        while True:
+            await self._aacquire(job)
+            try:
+                await asyncio.sleep(self._throttle_delay(tokens))
+                self._count("calls")
+                return await func()
+            except Exception as e:
+                delay = self._retry_delay(attempt, e)
+                if delay is None:
+                    self._count("failed")
+                    raise
+            finally:
+                self._release()
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **self._counts,
+                "active": self._active,
+                "waiting": sum(len(tickets) for tickets in self._waiting.values()),
+                "waiting_jobs": len(self._waiting),
+                "max_concurrency": self.max_concurrency,
+                "requests_per_minute": self._requests.per_minute if self._requests else None,
+                "tokens_per_minute": self._tokens.per_minute if self._tokens else None,
+                "throttled_seconds": round(self._throttled_seconds, 3),
+            }
@@ -0,0 +1,38 @@
+import threading
+from collections import deque
+from typing import Any, Dict
+
+
+class LatencyRecorder:
+    """
+    Keeps the most recent latency samples (in seconds) and summarizes them in milliseconds.
+    """
+
+    def __init__(self, max_samples: int = 1000):
+        self.count = 0
+        self._samples: deque = deque(maxlen=max_samples)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self.count += 1
+            self._samples.append(seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            samples = sorted(self._samples)
+            count = self.count
+        if not samples:
+            return {"count": count}
+
+        def pct(p: float) -> float:
+            return round(samples[min(len(samples) - 1, int(p * len(samples)))] * 1000, 2)
+
+        return {
+            "count": count,
+            "avg_ms": round(sum(samples) / len(samples) * 1000, 2),
+            "p50_ms": pct(0.50),
+            "p95_ms": pct(0.95),
+            "p99_ms": pct(0.99),
+            "max_ms": round(samples[-1] * 1000, 2),
+        }
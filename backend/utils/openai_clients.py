@@ -0,0 +1,158 @@
+import asyncio
+import os
+import threading
+import weakref
+from typing import Any, Dict, List, Optional, Set
+
+import httpx
+import openai
+
+
+# Close tasks of superseded async clients, referenced until they finish
+_closing: Set[asyncio.Task] = set()
+
+
+def _transports(http_client) -> List[Any]:
+    return [http_client._transport, *(t for t in http_client._mounts.values() if t is not None)]
+
+
+def _close_when_unused(client: openai.OpenAI):
+    """
+    Closes a superseded client's connection pool once nothing references its http
+    client any more, so calls still running on it (or pipelines built with it) finish first.
+    """
+
+    def close(transports):
+        for transport in transports:
+            transport.close()
+
+    weakref.finalize(client._client, close, _transports(client._client))
+
+
+def _aclose_when_unused(client: openai.AsyncOpenAI, loop: asyncio.AbstractEventLoop):
+    """
+    Like _close_when_unused for an async client; its connections belong to `loop`,
+    so they are closed by a task on that loop (or left to it if it has been closed).
+    """
+
+    async def aclose(transports):
+        for transport in transports:
+            await transport.aclose()
+
+    def schedule(transports):
+        def start():
+            task = loop.create_task(aclose(transports))
+            _closing.add(task)
+            task.add_done_callback(_closing.discard)
+
+        try:
+            loop.call_soon_threadsafe(start)
+        except RuntimeError:
+            pass  # the loop is closed, and its sockets with it
+
+    weakref.finalize(client._client, schedule, _transports(client._client))
+
+
+class OpenAIClientManager:
+    """
+    Owns the process-wide OpenAI clients (sync and async).
+
+    Every LLM and embedding call goes through the same keep-alive connection pool,
+    so calls reuse TCP+TLS connections instead of opening a new one each time.
+    Clients are built lazily and rebuilt when the API key, base URL or pool
+    settings change. `base_url` (or the OPENAI_BASE_URL environment variable)
+    can point at any OpenAI-compatible server, e.g. a local stand-in for tests.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = int(os.environ.get("RAG_OPENAI_MAX_CONNECTIONS", "100")),
+        max_keepalive_connections: int = int(os.environ.get("RAG_OPENAI_MAX_KEEPALIVE", "20")),
+        keepalive_expiry: float = float(os.environ.get("RAG_OPENAI_KEEPALIVE_EXPIRY", "30")),
+        timeout: float = float(os.environ.get("RAG_OPENAI_TIMEOUT", "120")),
+        connect_timeout: float = float(os.environ.get("RAG_OPENAI_CONNECT_TIMEOUT", "10")),
+        max_retries: int = int(os.environ.get("RAG_OPENAI_MAX_RETRIES", "2")),
+        base_url: Optional[str] = None,
+    ):
+        self.api_key: Optional[str] = None
+        self.base_url = base_url
+        self.max_connections = max_connections
+        self.max_keepalive_connections = max_keepalive_connections
+        self.keepalive_expiry = keepalive_expiry
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.max_retries = max_retries
+        self._client: Optional[openai.OpenAI] = None
+        self._async_client: Optional[openai.AsyncOpenAI] = None
+        self._async_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock = threading.Lock()
+
+    def configure(self, api_key: Optional[str] = None, **settings):
+        """
+        Update the key, base URL or pool settings; clients are rebuilt on next use and
+        the superseded ones closed once nothing uses them.
+        """
+        with self._lock:
+            if api_key is not None:
+                self.api_key = api_key
+            for name, value in settings.items():
+                if not hasattr(self, name) or name.startswith("_"):
+                    raise ValueError(f"Unknown OpenAI client setting '{name}'")
+                if value is not None or name == "base_url":
+                    setattr(self, name, value)
+            old_client, self._client = self._client, None
+            old_async_client, self._async_client = self._async_client, None
+        if old_client is not None:
+            _close_when_unused(old_client)
+        if old_async_client is not None:
+            _aclose_when_unused(old_async_client, self._async_loop)
+
+    def _limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive_connections,
+            keepalive_expiry=self.keepalive_expiry,
+        )
+
+    def _timeout(self) -> httpx.Timeout:
+        return httpx.Timeout(self.timeout, connect=self.connect_timeout)
+
+    def client(self) -> openai.OpenAI:
+        with self._lock:
+            if self._client is None:
+                self._client = openai.OpenAI(
+                    api_key=self.api_key,
+                    base_url=self.base_url,
+                    max_retries=self.max_retries,
+                    timeout=self._timeout(),
+                    http_client=httpx.Client(limits=self._limits(), timeout=self._timeout()),
+                )
+            return self._client
+
+    def async_client(self) -> openai.AsyncOpenAI:
+        # an httpx.AsyncClient's connections belong to the loop that opened them
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._async_client is None or self._async_loop is not loop:
+                if self._async_client is not None:
+                    _aclose_when_unused(self._async_client, self._async_loop)
+                self._async_client = openai.AsyncOpenAI(
+                    api_key=self.api_key,
+                    base_url=self.base_url,
+                    max_retries=self.max_retries,
+                    timeout=self._timeout(),
+                    http_client=httpx.AsyncClient(limits=self._limits(), timeout=self._timeout()),
+                )
+                self._async_loop = loop
+            return self._async_client
+
+    def settings(self) -> Dict[str, Any]:
+        return {
+            "base_url": self.base_url or os.environ.get("OPENAI_BASE_URL") or "https://api.openai.com/v1",
+            "max_connections": self.max_connections,
+            "max_keepalive_connections": self.max_keepalive_connections,
+            "keepalive_expiry": self.keepalive_expiry,
+            "timeout": self.timeout,
+            "connect_timeout": self.connect_timeout,
+            "max_retries": self.max_retries,
+        }
@@ -0,0 +1,1052 @@
+import functools
+import json
+import os
+import shutil
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Literal, Optional, Tuple, Union
+
+import numpy as np
+from haystack import Document, default_to_dict
+from haystack.document_stores.errors import DocumentStoreError, DuplicateDocumentError
+from haystack.document_stores.in_memory import InMemoryDocumentStore
+from haystack.document_stores.types import DuplicatePolicy
+from haystack.utils import expit
+from haystack.utils.filters import convert, document_matches_filter
+
+from .bm25_index import bm25_index_for, scale_bm25_score
+from .vector_index import ExactIndex, VectorIndex
+
+
+DOT_PRODUCT_SCALING_FACTOR = 100
+
+# On-disk layout of a store directory. Every file is append-only, so a crash
+# can only leave a torn tail, which is ignored on the next open; compact()
+# replaces the whole set at once (see COMPACT_DIR).
+CHUNKS_FILE = "chunks.jsonl"  # one JSON record (id, content, meta) per line
+OFFSETS_FILE = "chunks.offsets"  # uint64 byte offset of every line in CHUNKS_FILE
+IDS_FILE = "chunks.ids"  # one document id per line, same order as CHUNKS_FILE
+DELETED_FILE = "chunks.deleted"  # int64 line numbers of deleted chunks
+EMBEDDINGS_FILE = "embeddings.f32"  # contiguous float32 matrix, one row per embedded chunk
+ROWS_FILE = "embeddings.rows"  # int64 chunk line number of every embedding row
+NORMS_FILE = "embeddings.norms"  # float32 L2 norm of every embedding row
+VIEWS_FILE = "chunks.views"  # int64 (line, +view/-view) membership changes, view numbers start at 1
+HEADER_FILE = "store.json"  # {"dim": <embedding dimension>, "views": [<view names>]}
+STORE_FILES = (
+    CHUNKS_FILE, OFFSETS_FILE, IDS_FILE, DELETED_FILE, EMBEDDINGS_FILE, ROWS_FILE, NORMS_FILE, VIEWS_FILE, HEADER_FILE,
+)
+# compact() writes the new files into this subdirectory, then moves them into place;
+# COMPACT_DONE marks a complete set, which the next open finishes moving after a crash
+COMPACT_DIR = "compact.tmp"
+COMPACT_DONE = "complete"
+
+
+def _map_array(path: Path, dtype, width: int = 1) -> np.ndarray:
+    """
+    Memory-map a flat binary file as a read-only array, ignoring any torn tail.
+    """
+    itemsize = np.dtype(dtype).itemsize * width
+    size = path.stat().st_size if path.exists() else 0
+    count = size // itemsize
+    if count == 0:
+        shape = (0, width) if width > 1 else (0,)
+        return np.zeros(shape, dtype=dtype)
+    shape = (count, width) if width > 1 else (count,)
+    return np.memmap(path, dtype=dtype, mode="r", shape=shape)
+
+
+def _fsync_dir(path: Path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _grow(array: np.ndarray, n: int) -> np.ndarray:
+    """
+    A 1-D array extended to n entries, the new ones zero. The result is a view of a
+    buffer with spare room, so an array grown a few entries per write is only
+    copied O(log n) times; views handed out earlier keep their length.
+    """
+    if n <= len(array):
+        return array
+    buffer = array.base
+    if type(buffer) is np.ndarray and buffer.ctypes.data == array.ctypes.data and len(buffer) >= n:
+        buffer[len(array):n] = 0
+    else:
+        buffer = np.zeros(max(n, 2 * len(array), 1024), dtype=array.dtype)
+        buffer[: len(array)] = array
+    return buffer[:n]
+
+
+def _retry_if_compacted(method):
+    """
+    For the read paths, which turn line numbers into records without holding the
+    store lock: if a compaction renumbered the lines while one ran, its result may
+    pair a chunk's score with another chunk's record (or fail to decode one), so it
+    runs again once the compaction has swapped the files in.
+    """
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        while True:
+            generation = self._generation
+            # odd while a compaction swaps files, which it does holding _lock
+            if generation % 2 == 0:
+                try:
+                    result = method(self, *args, **kwargs)
+                except (IndexError, ValueError):
+                    if generation == self._generation:
+                        raise
+                else:
+                    if generation == self._generation:
+                        return result
+            with self._lock:
+                pass
+
+    return wrapper
+
+
+class PersistentDocumentStore(InMemoryDocumentStore):
+    """
+    A drop-in InMemoryDocumentStore that survives restarts.
+
+    Embeddings are kept in a single contiguous float32 file that is memory-mapped
+    on open, and chunk text and meta live in a JSONL sidecar addressed through a
+    byte-offset index. Opening the store only maps files, so it takes the same
+    time for ten chunks or ten million; records are decoded only when a query
+    returns them. Embedding retrieval scores the query against the mapped matrix
+    in one vectorized pass, over only the candidate rows proposed by `vector_index`
+    (every row with the default ExactIndex). BM25 retrieval uses an inverted index
+    built from the sidecar on first use and kept up to date by every write.
+
+    Several collections can share one store through named views (`store.view(name)`):
+    a chunk written through two views is stored once and belongs to both. Each view
+    searches only its own chunks, with BM25 statistics computed over the view.
+    Chunks that were never written through a view belong to `default_view`.
+
+    With `partition_field` set (e.g. "file_path"), chunks are partitioned by that
+    meta field: a query filtered to some of its values (`{"field": "meta.<field>",
+    "operator": "in", "value": [...]}`) reads only those partitions, for both BM25
+    and embedding retrieval, instead of filtering a full scan.
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        bm25_tokenization_regex: str = r"(?u)\b\w\w+\b",
+        bm25_algorithm: Literal["BM25Okapi", "BM25L", "BM25Plus"] = "BM25L",
+        bm25_parameters: Optional[Dict] = None,
+        embedding_similarity_function: Literal["dot_product", "cosine"] = "dot_product",
+        vector_index: Optional[VectorIndex] = None,
+        default_view: Optional[str] = None,
+        partition_field: Optional[str] = None,
+    ):
+        super().__init__(
+            bm25_tokenization_regex=bm25_tokenization_regex,
+            bm25_algorithm=bm25_algorithm,
+            bm25_parameters=bm25_parameters,
+            embedding_similarity_function=embedding_similarity_function,
+        )
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()
+        self._compact_lock = threading.Lock()
+        # bumped (under _lock) before and after compact() swaps files, see _retry_if_compacted
+        self._generation = 0
+        # serializes vector index updates, which run outside _lock (training can take a while)
+        self._index_lock = threading.Lock()
+        self.vector_index = vector_index or ExactIndex()
+        self._bm25_index = bm25_index_for(self)
+        self._bm25_built = False
+        self._bm25_build_lock = threading.Lock()
+        self.default_view = default_view
+        self.partition_field = partition_field
+        self._view_objects: Dict[str, "StoreView"] = {}
+        self._meta_lines: Dict[str, Dict[Any, List[int]]] = {}
+        self._id_to_line: Optional[Dict[str, int]] = None
+        self._dim: Optional[int] = None
+        self._views: List[str] = []
+        self._finish_compaction()
+        header = self.path / HEADER_FILE
+        if header.exists():
+            header = json.loads(header.read_text())
+            self._dim = header.get("dim")
+            self._views = header.get("views", [])
+        self._open()
+        self._sync_vector_index()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return default_to_dict(
+            self,
+            path=str(self.path),
+            bm25_tokenization_regex=self._bm25_tokenization_regex,
+            bm25_algorithm=self.bm25_algorithm.__name__,
+            bm25_parameters=self.bm25_parameters,
+            embedding_similarity_function=self.embedding_similarity_function,
+            default_view=self.default_view,
+            partition_field=self.partition_field,
+        )
+
+    def view(self, name: str) -> "StoreView":
+        """
+        The document store of one named collection in this store.
+        """
+        if name not in self._view_objects:
+            self._view_objects[name] = StoreView(self, name)
+        return self._view_objects[name]
+
+    # ----------------
+    # file handling
+    # ----------------
+
+    def _open(self):
+        """
+        (Re)map every index file and rebuild the masks from them, replaying the
+        membership log. Called on startup and after compaction; writes update the
+        state incrementally instead (_remap, _mark_dead, _apply_views).
+        """
+        self._offsets = _map_array(self.path / OFFSETS_FILE, np.uint64)
+        self._chunks_size = (
+            (self.path / CHUNKS_FILE).stat().st_size if (self.path / CHUNKS_FILE).exists() else 0
+        )
+        n_lines = len(self._offsets)
+
+        deleted = _map_array(self.path / DELETED_FILE, np.int64)
+        self._dead_lines = np.zeros(n_lines, dtype=bool)
+        if len(deleted):
+            self._dead_lines[deleted[deleted < n_lines]] = True
+
+        if self._dim:
+            embeddings = _map_array(self.path / EMBEDDINGS_FILE, np.float32, self._dim)
+        else:
+            embeddings = np.zeros((0, 0), dtype=np.float32)
+        rows = _map_array(self.path / ROWS_FILE, np.int64)
+        norms = _map_array(self.path / NORMS_FILE, np.float32)
+        n_rows = min(len(embeddings), len(rows), len(norms))
+        self._embeddings = embeddings[:n_rows]
+        self._rows = rows[:n_rows]
+        self._norms = norms[:n_rows]
+        valid = self._rows < n_lines
+        self._row_alive = valid.copy()
+        self._row_alive[valid] = ~self._dead_lines[self._rows[valid]]
+
+        # replay the membership log; the last change of a (line, view) pair wins
+        log = _map_array(self.path / VIEWS_FILE, np.int64, 2)
+        log = np.asarray(log[log[:, 0] < n_lines]) if len(log) else np.zeros((0, 2), dtype=np.int64)
+        recorded = self._recorded = np.zeros(n_lines, dtype=bool)
+        recorded[log[:, 0]] = True
+        self._view_masks: Dict[str, np.ndarray] = {}
+        for number, name in enumerate(self._views, start=1):
+            changes = log[np.abs(log[:, 1]) == number][::-1]
+            lines, last = np.unique(changes[:, 0], return_index=True)
+            mask = np.zeros(n_lines, dtype=bool)
+            mask[lines] = changes[last, 1] > 0
+            self._view_masks[name] = mask
+        if self.default_view is not None:
+            mask = self._view_masks.get(self.default_view, np.zeros(n_lines, dtype=bool))
+            self._view_masks[self.default_view] = mask | ~recorded
+        for mask in self._view_masks.values():
+            mask &= ~self._dead_lines
+        self._row_view_masks: Dict[str, np.ndarray] = {}
+
+    def _remap(self):
+        """
+        Map the files again after an append and grow the masks over the new lines
+        and embedding rows. New lines start out alive and in no view.
+        """
+        self._offsets = _map_array(self.path / OFFSETS_FILE, np.uint64)
+        self._chunks_size = (self.path / CHUNKS_FILE).stat().st_size
+        n_lines = len(self._offsets)
+        self._dead_lines = _grow(self._dead_lines, n_lines)
+        self._recorded = _grow(self._recorded, n_lines)
+        for name, mask in self._view_masks.items():
+            self._view_masks[name] = _grow(mask, n_lines)
+
+        rows_before = len(self._rows)
+        embeddings = _map_array(self.path / EMBEDDINGS_FILE, np.float32, self._dim) if self._dim else self._embeddings
+        rows = _map_array(self.path / ROWS_FILE, np.int64)
+        norms = _map_array(self.path / NORMS_FILE, np.float32)
+        n_rows = min(len(embeddings), len(rows), len(norms))
+        self._embeddings = embeddings[:n_rows]
+        self._rows = rows[:n_rows]
+        self._norms = norms[:n_rows]
+        self._row_alive = _grow(self._row_alive, n_rows)
+        self._row_alive[rows_before:] = ~self._dead_lines[self._rows[rows_before:]]
+        self._row_view_masks = {}
+
+    def _mark_dead(self, lines: np.ndarray):
+        """
+        Take deleted lines (and their embedding rows) out of every mask.
+        """
+        self._dead_lines[lines] = True
+        for mask in self._view_masks.values():
+            mask[lines] = False
+        rows = np.searchsorted(self._rows, lines)
+        found = rows < len(self._rows)
+        found[found] = self._rows[rows[found]] == lines[found]
+        self._row_alive[rows[found]] = False
+        self._row_view_masks = {}
+
+    def _apply_views(self, entries: np.ndarray):
+        """
+        Apply (line, +view/-view) membership changes to the view masks, as _open's
+        replay of the log would: the last change of a (line, view) pair wins, and a
+        line's first recorded change ends its implicit membership of default_view.
+        """
+        lines, numbers = entries[:, 0], np.abs(entries[:, 1])
+        if self.default_view is not None:
+            self._view_masks[self.default_view][lines[~self._recorded[lines]]] = False
+        self._recorded[lines] = True
+        for number in np.unique(numbers):
+            name = self._views[number - 1]
+            if name not in self._view_masks:
+                self._view_masks[name] = np.zeros(len(self._dead_lines), dtype=bool)
+            changes = entries[numbers == number][::-1]
+            changed, last = np.unique(changes[:, 0], return_index=True)
+            self._view_masks[name][changed] = (changes[last, 1] > 0) & ~self._dead_lines[changed]
+        self._row_view_masks = {}
+
+    def _sync_vector_index(self):
+        """
+        Let the vector index catch up with the embedding rows. Called without _lock
+        held, so queries and other writes go on while an index trains.
+        """
+        with self._index_lock:
+            embeddings = self._embeddings
+            if len(embeddings):
+                self.vector_index.sync(self.path, embeddings)
+
+    def _write_header(self):
+        (self.path / HEADER_FILE).write_text(json.dumps({"dim": self._dim, "views": self._views}))
+
+    def _view_mask(self, view: str) -> np.ndarray:
+        mask = self._view_masks.get(view)
+        return mask if mask is not None else np.zeros(len(self._dead_lines), dtype=bool)
+
+    def _row_view_mask(self, view: str) -> np.ndarray:
+        """
+        Embedding rows that are alive and in `view`, cached until the next write.
+        """
+        masks = self._row_view_masks
+        if view not in masks:
+            line_mask = self._view_mask(view)
+            mask = np.zeros(len(self._rows), dtype=bool)
+            mask[self._row_alive] = line_mask[self._rows[self._row_alive]]
+            masks[view] = mask
+        return masks[view]
+
+    def _views_of(self, line: int) -> List[str]:
+        return [name for name, mask in self._view_masks.items() if mask[line]]
+
+    def _record_views(self, changes: Iterable[Tuple[int, str, bool]]):
+        """
+        Append (line, view, member) changes to the membership log.
+        """
+        entries = []
+        for line, view, member in changes:
+            if view not in self._views:
+                self._views.append(view)
+                self._write_header()
+            number = self._views.index(view) + 1
+            entries.append((line, number if member else -number))
+        if entries:
+            entries = np.asarray(entries, dtype=np.int64)
+            with (self.path / VIEWS_FILE).open("ab") as f:
+                f.write(entries.tobytes())
+            self._apply_views(entries)
+
+    def _load_ids(self) -> Dict[str, int]:
+        """
+        Lazily build the id -> line lookup. Only writes and deletes need it,
+        so queries on a freshly opened store never pay for it.
+        """
+        if self._id_to_line is None:
+            ids_path = self.path / IDS_FILE
+            ids = ids_path.read_text(encoding="utf-8").splitlines() if ids_path.exists() else []
+            ids = ids[: len(self._offsets)]
+            self._id_to_line = {
+                doc_id: line for line, doc_id in enumerate(ids) if not self._dead_lines[line]
+            }
+        return self._id_to_line
+
+    def _read_record(self, line: int) -> Dict[str, Any]:
+        start = int(self._offsets[line])
+        end = int(self._offsets[line + 1]) if line + 1 < len(self._offsets) else self._chunks_size
+        with (self.path / CHUNKS_FILE).open("rb") as f:
+            f.seek(start)
+            return json.loads(f.read(end - start))
+
+    def _load_document(self, line: int, score: Optional[float] = None, with_embedding: bool = True) -> Document:
+        return self._to_document(line, self._read_record(line), score, with_embedding)
+
+    def _to_document(
+        self, line: int, record: Dict[str, Any], score: Optional[float] = None, with_embedding: bool = True
+    ) -> Document:
+        embedding = None
+        if with_embedding:
+            # rows are appended in line order, so the row of a line can be bisected
+            row = int(np.searchsorted(self._rows, line))
+            if row < len(self._rows) and self._rows[row] == line:
+                embedding = self._embeddings[row].tolist()
+        return Document(
+            id=record["id"],
+            content=record.get("content"),
+            meta=record.get("meta") or {},
+            score=score,
+            embedding=embedding,
+        )
+
+    # ----------------
+    # DocumentStore protocol
+    # ----------------
+
+    def count_documents(self, view: Optional[str] = None) -> int:
+        if view is not None:
+            return int(self._view_mask(view).sum())
+        return int(len(self._dead_lines) - self._dead_lines.sum())
+
+    def dead_fraction(self) -> float:
+        """
+        Share of the stored lines that belong to deleted chunks (reclaimed by compact()).
+        """
+        n_lines = len(self._dead_lines)
+        return float(self._dead_lines.sum()) / n_lines if n_lines else 0.0
+
+    @_retry_if_compacted
+    def filter_documents(self, filters: Optional[Dict[str, Any]] = None, view: Optional[str] = None) -> List[Document]:
+        documents = []
+        n_lines = len(self._offsets)
+        keep = ~self._dead_lines if view is None else self._view_mask(view)
+        if keep.any():
+            # one sequential pass over the sidecar instead of a seek per chunk
+            with (self.path / CHUNKS_FILE).open("rb") as f:
+                for line, raw in zip(range(n_lines), f):
+                    if not keep[line]:
+                        continue
+                    documents.append(self._to_document(line, json.loads(raw)))
+        if filters:
+            if "operator" not in filters and "conditions" not in filters:
+                filters = convert(filters)
+            documents = [doc for doc in documents if document_matches_filter(filters=filters, document=doc)]
+        return documents
+
+    def _meta_lookup(self, field: str) -> Dict[Any, List[int]]:
+        """
+        meta[field] value -> lines, built with one pass over the sidecar on first use
+        and kept up to date by appends (deleted lines are left in and skipped by readers).
+        """
+        with self._lock:
+            if field not in self._meta_lines:
+                lookup: Dict[Any, List[int]] = {}
+                n_lines = len(self._offsets)
+                if n_lines:
+                    with (self.path / CHUNKS_FILE).open("rb") as f:
+                        for line, raw in zip(range(n_lines), f):
+                            key = (json.loads(raw).get("meta") or {}).get(field)
+                            if key is not None:
+                                lookup.setdefault(key, []).append(line)
+                self._meta_lines[field] = lookup
+            return self._meta_lines[field]
+
+    @_retry_if_compacted
+    def get_documents_by_meta(
+        self, field: str, value: Any, view: Optional[str] = None, limit: Optional[int] = None
+    ) -> List[Document]:
+        """
+        Live documents whose meta[field] == value, without a full scan after the first call for `field`.
+        With `limit`, only the first `limit` of them (in write order) are read.
+        """
+        with self._lock:
+            lines = list(self._meta_lookup(field).get(value, []))
+        keep = ~self._dead_lines if view is None else self._view_mask(view)
+        lines = [line for line in lines if line < len(keep) and keep[line]]
+        return [self._load_document(line) for line in lines[:limit]]
+
+    def _scope(self, filters: Optional[Dict[str, Any]]) -> Optional[List[Any]]:
+        """
+        The partitions selected by `filters`, if they only select partitions.
+        """
+        if not filters or self.partition_field is None:
+            return None
+        if filters.get("field") != f"meta.{self.partition_field}":
+            return None
+        if filters.get("operator") == "in":
+            return list(filters["value"])
+        if filters.get("operator") == "==":
+            return [filters["value"]]
+        return None
+
+    def _partition_lines(self, partitions: List[Any], view: Optional[str] = None) -> np.ndarray:
+        with self._lock:
+            lookup = self._meta_lookup(self.partition_field)
+            lines = [np.asarray(lookup.get(p, []), dtype=np.int64) for p in partitions]
+        lines = np.unique(np.concatenate(lines)) if lines else np.zeros(0, dtype=np.int64)
+        keep = ~self._dead_lines if view is None else self._view_mask(view)
+        lines = lines[lines < len(keep)]
+        return lines[keep[lines]]
+
+    def write_documents(
+        self, documents: List[Document], policy: DuplicatePolicy = DuplicatePolicy.NONE, view: Optional[str] = None
+    ) -> int:
+        """
+        Duplicates are judged within `view` (the whole store if None). A document that is
+        already stored for another view is shared: it joins `view` instead of being stored
+        again (and is rewritten once if it now brings an embedding the stored copy lacks).
+        """
+        if not isinstance(documents, list) or any(not isinstance(doc, Document) for doc in documents):
+            raise ValueError("Please provide a list of Documents.")
+
+        if policy == DuplicatePolicy.NONE:
+            policy = DuplicatePolicy.FAIL
+
+        with self._lock:
+            id_to_line = self._load_ids()
+            in_view = ~self._dead_lines if view is None else self._view_mask(view)
+            new_views = [view] if view is not None else []
+            to_write: Dict[str, Tuple[Document, List[str]]] = {}
+            to_delete: List[str] = []
+            joins: List[int] = []
+            for doc in documents:
+                line = id_to_line.get(doc.id)
+                if doc.id in to_write or (line is not None and in_view[line]):
+                    if policy == DuplicatePolicy.FAIL:
+                        raise DuplicateDocumentError(f"ID '{doc.id}' already exists.")
+                    if policy == DuplicatePolicy.SKIP:
+                        continue
+                    if doc.id in to_write:
+                        views = to_write.pop(doc.id)[1]
+                    else:
+                        to_delete.append(doc.id)
+                        views = self._views_of(line)
+                    to_write[doc.id] = (doc, views)
+                elif line is not None:
+                    if doc.embedding is not None and not self._has_embedding(line):
+                        to_delete.append(doc.id)
+                        to_write[doc.id] = (doc, self._views_of(line) + new_views)
+                    else:
+                        joins.append(line)
+                else:
+                    to_write[doc.id] = (doc, new_views)
+
+            if to_delete:
+                self._delete_locked(to_delete)
+            if to_write:
+                self._append_locked([doc for doc, _ in to_write.values()], [views for _, views in to_write.values()])
+            if joins:
+                self._record_views((line, view, True) for line in joins)
+        if to_write:
+            self._sync_vector_index()
+        return len(to_write) + len(joins)
+
+    def delete_documents(self, document_ids: List[str], view: Optional[str] = None) -> None:
+        """
+        Remove documents from `view`; a document is deleted once no view holds it.
+        """
+        with self._lock:
+            if view is None:
+                self._delete_locked(document_ids)
+                return
+            id_to_line = self._load_ids()
+            in_view = self._view_mask(view)
+            orphans, leaves = [], []
+            for doc_id in document_ids:
+                line = id_to_line.get(doc_id)
+                if line is None or not in_view[line]:
+                    continue
+                if self._views_of(line) == [view]:
+                    orphans.append(doc_id)
+                else:
+                    leaves.append(line)
+            if leaves:
+                self._record_views((line, view, False) for line in leaves)
+            if orphans:
+                self._delete_locked(orphans)
+
+    def _has_embedding(self, line: int) -> bool:
+        row = int(np.searchsorted(self._rows, line))
+        return row < len(self._rows) and self._rows[row] == line
+
+    def _append_locked(self, documents: List[Document], views: Optional[List[List[str]]] = None):
+        embedded = [doc for doc in documents if doc.embedding is not None]
+        if embedded:
+            dims = {len(doc.embedding) for doc in embedded}
+            if self._dim is not None:
+                dims.add(self._dim)
+            if len(dims) != 1:
+                raise DocumentStoreError(
+                    "The embedding size of all Documents should be the same. "
+                    "Please make sure that the Documents have been embedded with the same model."
+                )
+            if self._dim is None:
+                self._dim = dims.pop()
+                self._write_header()
+
+        first_line = len(self._offsets)
+        offset = self._chunks_size
+        offsets: List[int] = []
+        rows: List[int] = []
+        vectors: List[List[float]] = []
+        lines = []
+        for i, doc in enumerate(documents):
+            record = json.dumps({"id": doc.id, "content": doc.content, "meta": doc.meta}) + "\n"
+            encoded = record.encode("utf-8")
+            offsets.append(offset)
+            offset += len(encoded)
+            lines.append(encoded)
+            if doc.embedding is not None:
+                rows.append(first_line + i)
+                vectors.append(doc.embedding)
+
+        with (self.path / CHUNKS_FILE).open("ab") as f:
+            f.write(b"".join(lines))
+        with (self.path / IDS_FILE).open("a", encoding="utf-8") as f:
+            f.write("".join(doc.id + "\n" for doc in documents))
+        with (self.path / OFFSETS_FILE).open("ab") as f:
+            f.write(np.asarray(offsets, dtype=np.uint64).tobytes())
+        if vectors:
+            matrix = np.asarray(vectors, dtype=np.float32)
+            with (self.path / EMBEDDINGS_FILE).open("ab") as f:
+                f.write(matrix.tobytes())
+            with (self.path / ROWS_FILE).open("ab") as f:
+                f.write(np.asarray(rows, dtype=np.int64).tobytes())
+            with (self.path / NORMS_FILE).open("ab") as f:
+                f.write(np.linalg.norm(matrix, axis=1).astype(np.float32).tobytes())
+        self._remap()
+
+        if views:
+            self._record_views(
+                (first_line + i, view, True) for i, doc_views in enumerate(views) for view in doc_views
+            )
+        if self.default_view is not None:
+            # lines written without any view belong to the default one
+            new = np.arange(first_line, first_line + len(documents))
+            self._view_masks[self.default_view][new[~self._recorded[new]]] = True
+
+        for i, doc in enumerate(documents):
+            self._id_to_line[doc.id] = first_line + i
+            for field, lookup in self._meta_lines.items():
+                if doc.meta.get(field) is not None:
+                    lookup.setdefault(doc.meta[field], []).append(first_line + i)
+        if self._bm25_built:
+            self._bm25_add(
+                range(first_line, first_line + len(documents)),
+                [doc.content for doc in documents],
+                [doc.meta for doc in documents],
+            )
+
+    def _delete_locked(self, document_ids: List[str]):
+        id_to_line = self._load_ids()
+        lines = [id_to_line.pop(doc_id) for doc_id in document_ids if doc_id in id_to_line]
+        if not lines:
+            return
+        lines = np.asarray(lines, dtype=np.int64)
+        with (self.path / DELETED_FILE).open("ab") as f:
+            f.write(lines.tobytes())
+        self._mark_dead(lines)
+        if self._bm25_built:
+            self._bm25_index.remove(lines.tolist())
+
+    def compact(self):
+        """
+        Rewrite the store without deleted chunks, reclaiming their disk space.
+
+        Live chunks are copied as stored (sidecar bytes, ids, embedding rows) into
+        COMPACT_DIR without holding the store lock, so queries and writes go on
+        meanwhile and nothing is decoded; chunks written or deleted during the copy
+        are caught up under the lock, then the new files replace the old ones. A
+        crash leaves either the old store or a complete new one.
+        """
+        with self._compact_lock:
+            with self._lock:
+                n_lines = len(self._offsets)
+                alive = ~self._dead_lines[:n_lines]
+                files = (self._offsets, self._chunks_size, self._rows, self._embeddings, self._norms)
+            if alive.all():
+                return
+            target = self.path / COMPACT_DIR
+            if target.exists():
+                shutil.rmtree(target)
+            target.mkdir()
+            copied = np.flatnonzero(alive)
+            self._copy_lines(target, copied, files)
+            ids_position = self._copy_ids(target, alive, 0, 0)
+
+            with self._index_lock, self._bm25_build_lock, self._lock:
+                n_now = len(self._offsets)
+                added = n_lines + np.flatnonzero(~self._dead_lines[n_lines:n_now])
+                files = (self._offsets, self._chunks_size, self._rows, self._embeddings, self._norms)
+                self._copy_lines(target, added, files, first=len(copied))
+                self._copy_ids(target, ~self._dead_lines[n_lines:n_now], n_lines, ids_position)
+                kept = np.concatenate([copied, added])
+                mapping = np.full(n_now, -1, dtype=np.int64)
+                mapping[kept] = np.arange(len(kept))
+                self._write_compacted_state(target, kept, mapping)
+                self._generation += 1
+                try:
+                    self._finish_compaction()
+
+                    # carry the in-memory lookups over to the new line numbers
+                    new_line = mapping.tolist()
+                    if self._id_to_line is not None:
+                        self._id_to_line = {doc_id: new_line[line] for doc_id, line in self._id_to_line.items()}
+                    for field, lookup in self._meta_lines.items():
+                        renumbered = {}
+                        for key, lines in lookup.items():
+                            lines = [new_line[line] for line in lines if new_line[line] >= 0]
+                            if lines:
+                                renumbered[key] = lines
+                        self._meta_lines[field] = renumbered
+                    if self._bm25_built:
+                        self._bm25_index.renumber(mapping)
+                    self._open()
+                finally:
+                    self._generation += 1
+        self._sync_vector_index()
+
+    def _copy_lines(
+        self,
+        target: Path,
+        lines: np.ndarray,
+        files: Tuple[np.ndarray, int, np.ndarray, np.ndarray, np.ndarray],
+        first: int = 0,
+        block: int = 4096,
+    ):
+        """
+        Append the sidecar records and embedding rows of `lines` (sorted) to the files
+        in `target`, as new lines first, first + 1, ... `files` is a snapshot of
+        (offsets, sidecar size, rows, embeddings, norms) covering `lines`.
+        """
+        offsets, chunks_size, rows, embeddings, norms = files
+        ends = np.append(offsets[1:], np.uint64(chunks_size))
+        starts, ends = offsets[lines].astype(np.int64), ends[lines].astype(np.int64)
+        chunks = target / CHUNKS_FILE
+        base = chunks.stat().st_size if chunks.exists() else 0
+        new_offsets = base + np.concatenate([[0], np.cumsum(ends - starts)[:-1]]) if len(lines) else starts
+        with (target / OFFSETS_FILE).open("ab") as f:
+            f.write(new_offsets.astype(np.uint64).tobytes())
+        # consecutive lines are copied as one byte range
+        breaks = np.flatnonzero(np.diff(lines) != 1) + 1
+        run_starts = np.concatenate([[0], breaks]) if len(lines) else breaks
+        run_ends = np.append(breaks, len(lines))
+        with (self.path / CHUNKS_FILE).open("rb") as src, chunks.open("ab") as out:
+            for first_run, last_run in zip(run_starts.tolist(), (run_ends - 1).tolist()):
+                src.seek(int(starts[first_run]))
+                remaining = int(ends[last_run] - starts[first_run])
+                while remaining:
+                    data = src.read(min(remaining, 1 << 24))
+                    out.write(data)
+                    remaining -= len(data)
+
+        positions = np.searchsorted(rows, lines)
+        found = positions < len(rows)
+        found[found] = rows[positions[found]] == lines[found]
+        positions = positions[found]
+        with (target / EMBEDDINGS_FILE).open("ab") as f_embeddings, (target / NORMS_FILE).open("ab") as f_norms:
+            for i in range(0, len(positions), block):
+                batch = positions[i : i + block]
+                f_embeddings.write(np.ascontiguousarray(embeddings[batch], dtype=np.float32).tobytes())
+                f_norms.write(np.asarray(norms[batch], dtype=np.float32).tobytes())
+        with (target / ROWS_FILE).open("ab") as f:
+            f.write((first + np.flatnonzero(found)).astype(np.int64).tobytes())
+
+    def _copy_ids(self, target: Path, keep: np.ndarray, start: int, position: int) -> int:
+        """
+        Append the ids of the lines start + i with keep[i] set to the ids file in
+        `target`, reading from byte `position` (that of line `start`) of the current
+        one. Returns the position after the last line read.
+        """
+        with (self.path / IDS_FILE).open("rb") as src, (target / IDS_FILE).open("ab") as out:
+            src.seek(position)
+            for keep_line, raw in zip(keep.tolist(), src):
+                if keep_line:
+                    out.write(raw)
+                position += len(raw)
+        return position
+
+    def _write_compacted_state(self, target: Path, kept: np.ndarray, mapping: np.ndarray):
+        """
+        Write the deleted lines, membership log and header of the compacted store
+        (whose line i is the current line kept[i]) to `target`, sync every file and
+        mark the set complete.
+        """
+        dead = self._dead_lines[kept]
+        (target / DELETED_FILE).write_bytes(np.flatnonzero(dead).astype(np.int64).tobytes())
+        # one entry per recorded (line, view) membership; unrecorded lines stay in default_view
+        recorded = self._recorded[kept]
+        entries = []
+        for number, name in enumerate(self._views, start=1):
+            mask = self._view_masks.get(name)
+            if mask is not None:
+                members = np.flatnonzero(mask[kept] & recorded)
+                entries.append(np.stack([members, np.full(len(members), number)], axis=1))
+        log = np.concatenate(entries) if entries else np.zeros((0, 2), dtype=np.int64)
+        (target / VIEWS_FILE).write_bytes(log[np.argsort(log[:, 0], kind="stable")].astype(np.int64).tobytes())
+        (target / HEADER_FILE).write_text(json.dumps({"dim": self._dim, "views": self._views}))
+        for name in STORE_FILES:
+            (target / name).touch()
+            with (target / name).open("rb+") as f:
+                os.fsync(f.fileno())
+        with (target / COMPACT_DONE).open("w") as f:
+            os.fsync(f.fileno())
+        _fsync_dir(target)
+
+    def _finish_compaction(self):
+        """
+        Move a complete compacted set of files from COMPACT_DIR into place (after
+        compact(), or on open after a crash midway), or discard an incomplete one.
+        """
+        target = self.path / COMPACT_DIR
+        if not target.exists():
+            return
+        if (target / COMPACT_DONE).exists():
+            # rows are renumbered, the index is rebuilt by the next sync
+            self.vector_index.reset(self.path)
+            for name in STORE_FILES:
+                if (target / name).exists():
+                    os.replace(target / name, self.path / name)
+            _fsync_dir(self.path)
+        shutil.rmtree(target)
+
+    # ----------------
+    # retrieval
+    # ----------------
+
+    def _bm25_add(self, lines: Iterable[int], texts: List[Optional[str]], metas: List[Dict[str, Any]]):
+        # index slots are kept equal to line numbers, so view masks apply directly;
+        # dead chunks and chunks without text take a slot but are removed at once
+        lines = list(lines)
+        partitions = [meta.get(self.partition_field) for meta in metas] if self.partition_field else None
+        self._bm25_index.add(lines, [text or "" for text in texts], partitions)
+        self._bm25_index.remove(
+            [line for line, text in zip(lines, texts) if text is None or self._dead_lines[line]]
+        )
+
+    def _read_lines(self, start: int, end: int) -> Iterable[Tuple[int, Dict[str, Any]]]:
+        """
+        (line, record) for lines [start, end) of the sidecar, in one sequential read.
+        """
+        if start >= end:
+            return
+        with (self.path / CHUNKS_FILE).open("rb") as f:
+            f.seek(int(self._offsets[start]))
+            for line, raw in zip(range(start, end), f):
+                yield line, json.loads(raw)
+
+    def warm_up_bm25(self, batch: int = 1000):
+        """
+        Build the BM25 inverted index (and the partition lookup) with one pass over
+        the sidecar, ahead of the first query. The sidecar is read and tokenized
+        without holding the store lock, so writes go on meanwhile; lines written
+        or deleted during the build are caught up at the end. Concurrent callers
+        (e.g. a query arriving during a background warm-up) wait for the one build.
+        """
+        if self._bm25_index is None:
+            return
+        with self._bm25_build_lock:
+            if self._bm25_built:
+                return
+            with self._lock:
+                n_lines = len(self._offsets)
+            index = bm25_index_for(self)
+            partitions: Dict[Any, List[int]] = {}
+            # chunks without text take a slot but are removed at the end, like dead ones
+            empty: List[int] = []
+
+            def add(records: List[Tuple[int, Dict[str, Any]]]):
+                keys = None
+                if self.partition_field:
+                    keys = [(record.get("meta") or {}).get(self.partition_field) for _, record in records]
+                    for (line, _), key in zip(records, keys):
+                        if key is not None:
+                            partitions.setdefault(key, []).append(line)
+                empty.extend(line for line, record in records if record.get("content") is None)
+                index.add(
+                    [line for line, _ in records], [record.get("content") or "" for _, record in records], keys
+                )
+
+            records: List[Tuple[int, Dict[str, Any]]] = []
+            for line, record in self._read_lines(0, n_lines):
+                records.append((line, record))
+                if len(records) == batch:
+                    add(records)
+                    records = []
+            with self._lock:
+                records.extend(self._read_lines(n_lines, len(self._offsets)))
+                add(records)
+                index.remove(np.flatnonzero(self._dead_lines).tolist() + empty)
+                if self.partition_field and self.partition_field not in self._meta_lines:
+                    self._meta_lines[self.partition_field] = partitions
+                self._bm25_index = index
+                self._bm25_built = True
+
+    @_retry_if_compacted
+    def bm25_retrieval(
+        self,
+        query: str,
+        filters: Optional[Dict[str, Any]] = None,
+        top_k: int = 10,
+        scale_score: bool = False,
+        view: Optional[str] = None,
+    ) -> List[Document]:
+        """
+        Scores only the chunks sharing a term with the query, through the inverted index.
+        """
+        scope = self._scope(filters)
+        if self._bm25_index is None or (filters and scope is None):
+            # haystack's scan, over the documents of the view
+            target = self if view is None else self.view(view)
+            return InMemoryDocumentStore.bm25_retrieval(
+                target, query, filters=filters, top_k=top_k, scale_score=scale_score
+            )
+        if not query:
+            raise ValueError("Query should be a non-empty string")
+        self.warm_up_bm25()
+        include = None if view is None else self._view_mask(view)
+        documents = []
+        for line, score in self._bm25_index.search(query, top_k, include=include, partitions=scope):
+            if not scale_score and score <= 0.0:
+                continue
+            documents.append(self._load_document(line, score=scale_bm25_score(score) if scale_score else score))
+        return documents
+
+    @_retry_if_compacted
+    def embedding_retrieval(
+        self,
+        query_embedding: List[float],
+        filters: Optional[Dict[str, Any]] = None,
+        top_k: int = 10,
+        scale_score: bool = False,
+        return_embedding: bool = False,
+        view: Optional[str] = None,
+    ) -> List[Document]:
+        """
+        Scores the query against the memory-mapped embedding matrix and returns the top_k Documents.
+        """
+        if len(query_embedding) == 0 or not isinstance(query_embedding[0], float):
+            raise ValueError("query_embedding should be a non-empty list of floats.")
+
+        embeddings, rows, norms = self._embeddings, self._rows, self._norms
+        alive = self._row_alive if view is None else self._row_view_mask(view)
+        # a concurrent write may have remapped the store since the arrays above were read
+        alive = alive[: len(embeddings)]
+        if len(embeddings) == 0 or len(alive) < len(embeddings):
+            return []
+        if len(query_embedding) != embeddings.shape[1]:
+            raise DocumentStoreError(
+                "The embedding size of the query should be the same as the embedding size of the Documents. "
+                "Please make sure that the query has been embedded with the same model as the Documents."
+            )
+
+        query = np.asarray(query_embedding, dtype=np.float32)
+        scope = self._scope(filters)
+        if scope is not None:
+            # only the rows of the selected partitions are read and scored
+            lines = self._partition_lines(scope, view)
+            candidates = np.searchsorted(rows, lines)
+            found = candidates < len(rows)
+            found[found] = rows[candidates[found]] == lines[found]
+            candidates = candidates[found]
+            candidates = candidates[alive[candidates]]
+        elif filters:
+            allowed = {doc.id for doc in self.filter_documents(filters=filters, view=view)}
+            id_to_line = self._load_ids()
+            allowed_lines = np.fromiter((id_to_line[i] for i in allowed if i in id_to_line), dtype=np.int64)
+            alive = alive & np.isin(rows, allowed_lines)
+            candidates = None
+        else:
+            candidates = self.vector_index.candidates(query, top_k)
+            if candidates is not None:
+                # rows written after this query started are not in its snapshot
+                candidates = candidates[candidates < len(alive)]
+                candidates = np.sort(candidates[alive[candidates]])  # sorted: sequential reads
+                if len(candidates) < top_k:
+                    # too few live rows near the query, search exhaustively
+                    candidates = None
+
+        if candidates is None:
+            scores = embeddings @ query
+            candidate_norms = norms
+            n_alive = int(alive.sum())
+        else:
+            scores = embeddings[candidates] @ query
+            candidate_norms = norms[candidates]
+            n_alive = len(candidates)
+        if self.embedding_similarity_function == "cosine":
+            denom = candidate_norms * np.linalg.norm(query)
+            scores = np.divide(scores, denom, out=np.zeros_like(scores), where=denom > 0)
+        if candidates is None:
+            scores = np.where(alive, scores, -np.inf)
+
+        k = min(top_k, n_alive)
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+
+        documents = []
+        for i in top:
+            row = i if candidates is None else candidates[i]
+            score = float(scores[i])
+            if scale_score:
+                if self.embedding_similarity_function == "dot_product":
+                    score = expit(score / DOT_PRODUCT_SCALING_FACTOR)
+                else:
+                    score = (score + 1) / 2
+            documents.append(self._load_document(int(rows[row]), score=score, with_embedding=return_embedding))
+        return documents
+
+
+class StoreView(InMemoryDocumentStore):
+    """
+    One named collection of a PersistentDocumentStore, usable anywhere an
+    InMemoryDocumentStore is (writers, BM25 and embedding retrievers).
+    """
+
+    def __init__(self, store: PersistentDocumentStore, name: str):
+        super().__init__(
+            bm25_tokenization_regex=store._bm25_tokenization_regex,
+            bm25_algorithm=store.bm25_algorithm.__name__,
+            bm25_parameters=store.bm25_parameters,
+            embedding_similarity_function=store.embedding_similarity_function,
+        )
+        self.store = store
+        self.name = name
+
+    def to_dict(self) -> Dict[str, Any]:
+        return default_to_dict(self, store=self.store.to_dict(), name=self.name)
+
+    def count_documents(self) -> int:
+        return self.store.count_documents(view=self.name)
+
+    def filter_documents(self, filters: Optional[Dict[str, Any]] = None) -> List[Document]:
+        return self.store.filter_documents(filters, view=self.name)
+
+    def write_documents(self, documents: List[Document], policy: DuplicatePolicy = DuplicatePolicy.NONE) -> int:
+        return self.store.write_documents(documents, policy, view=self.name)
+
+    def delete_documents(self, document_ids: List[str]) -> None:
+        self.store.delete_documents(document_ids, view=self.name)
+
+    def bm25_retrieval(
+        self, query: str, filters: Optional[Dict[str, Any]] = None, top_k: int = 10, scale_score: bool = False
+    ) -> List[Document]:
+        return self.store.bm25_retrieval(query, filters=filters, top_k=top_k, scale_score=scale_score, view=self.name)
+
+    def embedding_retrieval(
+        self,
+        query_embedding: List[float],
+        filters: Optional[Dict[str, Any]] = None,
+        top_k: int = 10,
+        scale_score: bool = False,
+        return_embedding: bool = False,
+    ) -> List[Document]:
+        return self.store.embedding_retrieval(
+            query_embedding,
+            filters=filters,
+            top_k=top_k,
+            scale_score=scale_score,
+            return_embedding=return_embedding,
+            view=self.name,
+        )
@@ -0,0 +1,102 @@
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+
+class SQLiteLRUCache:
+    """
+    Base of the caches kept on disk: one SQLite table of (key, values..., last_used)
+    with least-recently-used eviction once more than `max_entries` are stored.
+
+    The number of entries is counted once when the cache is opened and tracked in
+    memory afterwards, so writes never count the table. The underscored helpers
+    expect the caller to hold `_lock`, which subclasses also use for their counters.
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        table: str,
+        columns: Dict[str, str],
+        max_entries: int,
+        indexes: Sequence[str] = (),
+    ):
+        self.path = Path(path)
+        self.table = table
+        self.columns = list(columns)
+        self.max_entries = max_entries
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        declared = "".join(f", {name} {decl}" for name, decl in columns.items())
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} (key TEXT PRIMARY KEY{declared}, last_used REAL NOT NULL)"
+        )
+        for column in ("last_used", *indexes):
+            self._conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_{column} ON {table} ({column})")
+        self._conn.commit()
+        (self._entries,) = self._conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()
+
+    def _fetch_many(self, keys: List[str], where: str = "", params: Sequence = ()) -> Dict[str, Tuple]:
+        """
+        Returns {key: (values...)} for the stored keys (matching the extra `where`
+        condition, if any) and marks them as recently used.
+        """
+        found: Dict[str, Tuple] = {}
+        unique = list(dict.fromkeys(keys))
+        condition = f" AND {where}" if where else ""
+        # stay well below SQLite's bound-parameter limit
+        for i in range(0, len(unique), 500):
+            batch = unique[i : i + 500]
+            placeholders = ",".join("?" * len(batch))
+            rows = self._conn.execute(
+                f"SELECT key, {', '.join(self.columns)} FROM {self.table} WHERE key IN ({placeholders}){condition}",
+                [*batch, *params],
+            ).fetchall()
+            for key, *values in rows:
+                found[key] = tuple(values)
+        if found:
+            now = time.time()
+            self._conn.executemany(
+                f"UPDATE {self.table} SET last_used = ? WHERE key = ?", [(now, key) for key in found]
+            )
+            self._conn.commit()
+        return found
+
+    def _store_many(self, rows: Dict[str, Tuple], now: Optional[float] = None):
+        """
+        Inserts or replaces {key: (values...)} and evicts the least recently used
+        entries beyond max_entries.
+        """
+        now = time.time() if now is None else now
+        keys = list(rows)
+        for i in range(0, len(keys), 500):
+            batch = keys[i : i + 500]
+            placeholders = ",".join("?" * len(batch))
+            (existing,) = self._conn.execute(
+                f"SELECT COUNT(*) FROM {self.table} WHERE key IN ({placeholders})", batch
+            ).fetchone()
+            self._entries += len(batch) - existing
+        placeholders = ",".join("?" * (len(self.columns) + 2))
+        self._conn.executemany(
+            f"INSERT OR REPLACE INTO {self.table} (key, {', '.join(self.columns)}, last_used) VALUES ({placeholders})",
+            [(key, *values, now) for key, values in rows.items()],
+        )
+        overflow = self._entries - self.max_entries
+        if overflow > 0:
+            evicted = self._conn.execute(
+                f"DELETE FROM {self.table} WHERE key IN "
+                f"(SELECT key FROM {self.table} ORDER BY last_used ASC LIMIT ?)",
+                (overflow,),
+            ).rowcount
+            self._entries -= evicted
+            self.evictions += evicted
+        self._conn.commit()
+
+    def _delete_where(self, where: str, params: Sequence = ()) -> int:
+        deleted = self._conn.execute(f"DELETE FROM {self.table} WHERE {where}", params).rowcount
+        self._entries -= deleted
+        self._conn.commit()
+        return deleted
@@ -0,0 +1,101 @@
+import hashlib
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Union
+
+from .sqlite_lru import SQLiteLRUCache
+
+
+# Query slot of the query-independent summary of a chunk
+GENERIC_QUERY = "\x00generic"
+
+
+class SummaryCache(SQLiteLRUCache):
+    """
+    A persistent cache of map-phase summaries on disk, with TTL and LRU eviction.
+
+    Entries are keyed by a hash of the chunk text, the normalized query (case and
+    whitespace folded) and the model, so asking about the same files again only
+    sends the chunks that were never summarized for that question to the LLM.
+    Entries older than `ttl_seconds` are treated as missing and purged every
+    `expire_every` writes; once more than `max_entries` are stored, the least
+    recently used ones go.
+
+    Hits and misses are counted separately for query-specific summaries and the
+    generic (GENERIC_QUERY) ones.
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        max_entries: int = 100_000,
+        ttl_seconds: float = 7 * 24 * 3600,
+        expire_every: int = 1000,
+    ):
+        super().__init__(
+            path,
+            "summaries",
+            {"summary": "TEXT NOT NULL", "created": "REAL NOT NULL"},
+            max_entries,
+            indexes=("created",),
+        )
+        self.ttl_seconds = ttl_seconds
+        self.expire_every = expire_every
+        self.counts = {kind: {"hits": 0, "misses": 0} for kind in ("query", "generic")}
+        self.expired = 0
+        with self._lock:
+            self._expire(time.time())
+
+    @staticmethod
+    def normalize(query: str) -> str:
+        return " ".join(query.split()).casefold()
+
+    def make_key(self, chunk_text: str, query: str, model: str) -> str:
+        chunk_hash = hashlib.sha256(chunk_text.encode("utf-8")).hexdigest()
+        return hashlib.sha256(f"{model}\x00{self.normalize(query)}\x00{chunk_hash}".encode("utf-8")).hexdigest()
+
+    def get_many(self, keys: List[str], generic: bool = False) -> Dict[str, str]:
+        """
+        Returns the live cached summaries for the given keys and marks them as recently used.
+        """
+        with self._lock:
+            rows = self._fetch_many(keys, "created >= ?", (time.time() - self.ttl_seconds,))
+            counts = self.counts["generic" if generic else "query"]
+            hits = sum(1 for key in keys if key in rows)
+            counts["hits"] += hits
+            counts["misses"] += len(keys) - hits
+        return {key: summary for key, (summary, _) in rows.items()}
+
+    def put_many(self, items: Dict[str, str]):
+        if not items:
+            return
+        now = time.time()
+        with self._lock:
+            # expired entries still count towards max_entries until the next purge
+            self._puts += 1
+            if self._puts % self.expire_every == 0:
+                self._expire(now)
+            self._store_many({key: (summary, now) for key, summary in items.items()}, now)
+
+    def _expire(self, now: float):
+        self._puts = 0
+        self.expired += self._delete_where("created < ?", (now - self.ttl_seconds,))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = self._entries
+            counts = {kind: dict(c) for kind, c in self.counts.items()}
+        for c in counts.values():
+            lookups = c["hits"] + c["misses"]
+            c["hit_rate"] = c["hits"] / lookups if lookups else 0.0
+        hits = sum(c["hits"] for c in counts.values())
+        lookups = hits + sum(c["misses"] for c in counts.values())
+        return {
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "evictions": self.evictions,
+            "expired": self.expired,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            **counts,
+        }
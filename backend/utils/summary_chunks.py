@@ -0,0 +1,63 @@
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+
+class SummaryChunkStore:
+    """
+    The summary-sized chunks of every indexed file on disk, one JSON file per
+    content hash (the chunks' source_hash), so summary questions read them back
+    instead of converting and splitting the file again.
+
+    Entries are written once per file version at indexing time and deleted when no
+    indexed chunk has their hash any more. An entry produced with another
+    `split_length` counts as missing. Writes go through a temporary file and an
+    atomic rename, so a crash never leaves a truncated entry behind.
+    """
+
+    def __init__(self, path: Union[str, Path], split_length: int):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.split_length = split_length
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _file(self, source_hash: str) -> Path:
+        return self.path / f"{source_hash}.json"
+
+    def get(self, source_hash: str) -> Optional[List[str]]:
+        try:
+            entry = json.loads(self._file(source_hash).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            entry = None
+        found = entry is not None and entry.get("split_length") == self.split_length
+        with self._lock:
+            if found:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return entry["chunks"] if found else None
+
+    def put(self, source_hash: str, chunks: List[str]):
+        target = self._file(source_hash)
+        tmp = target.with_name(f"{target.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_text(json.dumps({"split_length": self.split_length, "chunks": chunks}), encoding="utf-8")
+        os.replace(tmp, target)
+
+    def delete(self, source_hash: str):
+        self._file(source_hash).unlink(missing_ok=True)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        lookups = hits + misses
+        return {
+            "files": sum(1 for _ in self.path.glob("*.json")),
+            "split_length": self.split_length,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+        }
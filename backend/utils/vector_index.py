@@ -0,0 +1,214 @@
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+
+# Files an IVF index keeps next to the store it indexes.
+IVF_CENTROIDS_FILE = "ivf.centroids.npy"  # float32 (n_lists, dim) unit-length centroids
+IVF_ASSIGN_FILE = "ivf.assign"  # int32 list number of every embedding row, append-only
+IVF_HEADER_FILE = "ivf.json"  # {"trained_on": <rows the centroids were trained on>}
+
+
+def _unit(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms > 0, norms, 1)
+
+
+class VectorIndex:
+    """
+    Narrows embedding retrieval down to candidate rows.
+
+    The store keeps the vectors and scores candidates exactly; an index only
+    decides which rows are worth scoring. `sync` is called whenever the store
+    (re)maps its embedding matrix, `reset` when rows are renumbered (compaction).
+    """
+
+    def sync(self, path: Path, embeddings: np.ndarray):
+        pass
+
+    def reset(self, path: Path):
+        pass
+
+    def candidates(self, query: np.ndarray, top_k: int) -> Optional[np.ndarray]:
+        """
+        Row numbers to score for `query`, or None to score every row.
+        """
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        return {"type": "exact"}
+
+
+class ExactIndex(VectorIndex):
+    """
+    Brute force: every query is scored against every row.
+    """
+
+
+class IVFFlatIndex(VectorIndex):
+    """
+    Inverted-file index: rows are bucketed by their nearest k-means centroid and a
+    query only scores the rows in its `n_probe` nearest buckets.
+
+    Stores smaller than `exact_below` rows are searched exhaustively. New rows are
+    assigned to the existing centroids as they are written, deleted rows are simply
+    masked out by the store, and the centroids are retrained once the store has
+    grown `retrain_growth` times past the size they were trained on. Centroids and
+    assignments are persisted, so reopening a large store does not retrain.
+
+    Raise `n_probe` for recall, lower it for latency.
+    """
+
+    def __init__(
+        self,
+        n_probe: int = 16,
+        n_lists: Optional[int] = None,
+        exact_below: int = 20_000,
+        retrain_growth: float = 4.0,
+        kmeans_iterations: int = 8,
+        sample_per_list: int = 64,
+    ):
+        self.n_probe = n_probe
+        self.n_lists = n_lists
+        self.exact_below = exact_below
+        self.retrain_growth = retrain_growth
+        self.kmeans_iterations = kmeans_iterations
+        self.sample_per_list = sample_per_list
+        self._centroids: Optional[np.ndarray] = None
+        self._assign = np.zeros(0, dtype=np.int32)
+        self._trained_on = 0
+        # rows grouped by list: list i is order[bounds[i]:bounds[i + 1]], built on first search
+        self._lists: Optional[Tuple[np.ndarray, np.ndarray]] = None
+        self._loaded = False
+
+    # ----------------
+    # persistence
+    # ----------------
+
+    def _load(self, path: Path):
+        self._loaded = True
+        header = path / IVF_HEADER_FILE
+        centroids = path / IVF_CENTROIDS_FILE
+        if not (header.exists() and centroids.exists()):
+            return
+        self._centroids = np.load(centroids)
+        self._trained_on = json.loads(header.read_text())["trained_on"]
+        assign = path / IVF_ASSIGN_FILE
+        count = assign.stat().st_size // 4 if assign.exists() else 0
+        self._assign = np.fromfile(assign, dtype=np.int32, count=count) if count else np.zeros(0, np.int32)
+
+    def reset(self, path: Path):
+        for name in (IVF_CENTROIDS_FILE, IVF_ASSIGN_FILE, IVF_HEADER_FILE):
+            target = path / name
+            if target.exists():
+                target.unlink()
+        self._centroids = None
+        self._assign = np.zeros(0, dtype=np.int32)
+        self._trained_on = 0
+        self._lists = None
+        self._loaded = True
+
+    # ----------------
+    # building
+    # ----------------
+
+    def _nearest(self, vectors: np.ndarray, batch: int = 16384) -> np.ndarray:
+        out = np.empty(len(vectors), dtype=np.int32)
+        for start in range(0, len(vectors), batch):
+            block = _unit(np.asarray(vectors[start:start + batch], dtype=np.float32))
+            out[start:start + batch] = np.argmax(block @ self._centroids.T, axis=1)
+        return out
+
+    def _train(self, path: Path, embeddings: np.ndarray):
+        n = len(embeddings)
+        n_lists = self.n_lists or max(1, int(np.sqrt(n)))
+        rng = np.random.default_rng(0)
+        sample_size = min(n, n_lists * self.sample_per_list)
+        sample = _unit(np.asarray(embeddings[np.sort(rng.choice(n, sample_size, replace=False))], dtype=np.float32))
+
+        # spherical k-means on the sample
+        centroids = sample[rng.choice(sample_size, n_lists, replace=False)]
+        for _ in range(self.kmeans_iterations):
+            nearest = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, nearest, sample)
+            empty = ~np.bincount(nearest, minlength=n_lists).astype(bool)
+            sums[empty] = sample[rng.choice(sample_size, int(empty.sum()))]
+            centroids = _unit(sums)
+
+        self.reset(path)
+        self._centroids = centroids.astype(np.float32)
+        self._assign = self._nearest(embeddings)
+        self._trained_on = n
+        np.save(path / IVF_CENTROIDS_FILE, self._centroids)
+        self._assign.tofile(path / IVF_ASSIGN_FILE)
+        (path / IVF_HEADER_FILE).write_text(json.dumps({"trained_on": n}))
+
+    def sync(self, path: Path, embeddings: np.ndarray):
+        if not self._loaded:
+            self._load(path)
+        n = len(embeddings)
+        if self._centroids is not None and (
+            self._centroids.shape[1] != embeddings.shape[1] or len(self._assign) > n
+        ):
+            # built for other data (a different model, or a store that was rewritten)
+            self.reset(path)
+        if n < self.exact_below:
+            return
+        if self._centroids is None or n > self.retrain_growth * self._trained_on:
+            self._train(path, embeddings)
+        elif len(self._assign) < n:
+            new = self._nearest(embeddings[len(self._assign):])
+            with (path / IVF_ASSIGN_FILE).open("ab") as f:
+                f.write(new.tobytes())
+            self._assign = np.concatenate([self._assign, new])
+        else:
+            return
+        self._lists = None
+
+    # ----------------
+    # search
+    # ----------------
+
+    def candidates(self, query: np.ndarray, top_k: int) -> Optional[np.ndarray]:
+        if self._centroids is None or len(self._assign) < self.exact_below:
+            return None
+        lists = self._lists
+        if lists is None:
+            order = np.argsort(self._assign, kind="stable")
+            bounds = np.searchsorted(self._assign[order], np.arange(len(self._centroids) + 1))
+            lists = self._lists = (order, bounds)
+        order, bounds = lists
+        n_probe = min(self.n_probe, len(self._centroids))
+        scores = self._centroids @ _unit(query)
+        probed = np.argpartition(-scores, n_probe - 1)[:n_probe]
+        return np.concatenate([order[bounds[i]:bounds[i + 1]] for i in probed])
+
+    def stats(self) -> Dict[str, Any]:
+        active = self._centroids is not None and len(self._assign) >= self.exact_below
+        return {
+            "type": "ivf_flat" if active else "exact",
+            "n_lists": len(self._centroids) if self._centroids is not None else 0,
+            "n_probe": self.n_probe,
+            "rows": len(self._assign),
+            "trained_on": self._trained_on,
+        }
+
+
+def vector_index_from_env() -> VectorIndex:
+    """
+    RAG_VECTOR_INDEX=exact|ivf (default exact), RAG_IVF_PROBES, RAG_IVF_EXACT_BELOW.
+
+    Exact is the default: on held-out queries over weakly clustered embeddings
+    (benchmarks/bench_vector_index.py --noise 3), IVF recall@4 at 100k rows was
+    0.77 with 16 probes and 0.89 with 64, while an exact scan took ~15 ms.
+    """
+    if os.environ.get("RAG_VECTOR_INDEX", "exact") != "ivf":
+        return ExactIndex()
+    return IVFFlatIndex(
+        n_probe=int(os.environ.get("RAG_IVF_PROBES", "16")),
+        exact_below=int(os.environ.get("RAG_IVF_EXACT_BELOW", "20000")),
+    )
@@ -0,0 +1,95 @@
+"""
+Benchmark: BM25 retrieval, haystack's full scan vs. the inverted index.
+
+Builds one shared synthetic corpus (Zipf-distributed vocabulary, chunk-sized
+documents) in two stores and checks that every query returns the same top-k
+scores and documents from all of them (any of the documents tied with the k-th
+score may make the cut), then reports query latency:
+  * scan       - InMemoryDocumentStore.bm25_retrieval (re-tokenizes the corpus per query)
+  * persistent - PersistentDocumentStore with its BM25Index (the store behind both the RAG and BM25 views)
+
+Some documents are deleted before querying, and the query set includes terms
+that match nothing and terms that match fewer than top_k documents. Runs offline.
+
+    python -m benchmarks.bench_bm25 [--docs 5000] [--queries 100] [--top-k 5]
+"""
+
+import argparse
+import math
+import tempfile
+import time
+
+import numpy as np
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--docs", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--scan-max", type=int, default=20000, help="skip the (slow) scan above this size")
+    args = parser.parse_args()
+
+    from haystack import Document
+    from haystack.document_stores.in_memory import InMemoryDocumentStore
+    from backend.utils.persistent_store import PersistentDocumentStore
+
+    rng = np.random.default_rng(0)
+    vocab = [f"term{i}" for i in range(20000)]
+    zipf = 1 / np.arange(1, len(vocab) + 1)
+    zipf /= zipf.sum()
+    docs = [
+        Document(content=" ".join(vocab[w] for w in rng.choice(len(vocab), rng.integers(20, 350), p=zipf)))
+        for _ in range(args.docs)
+    ]
+    deleted = [doc.id for doc in docs[:: max(1, args.docs // 50)]]
+    queries = [
+        " ".join(vocab[w] for w in rng.choice(len(vocab), rng.integers(1, 6), p=zipf))
+        for _ in range(args.queries)
+    ]
+    queries += ["nothing matches this", f"{vocab[-1]} {vocab[-2]}", f"{vocab[3]} {vocab[3]} {vocab[5000]}"]
+
+    with tempfile.TemporaryDirectory(prefix="bench_bm25_") as tmp:
+        stores = {"persistent": PersistentDocumentStore(tmp)}
+        if args.docs <= args.scan_max:
+            stores = {"scan": InMemoryDocumentStore(), **stores}
+        for store in stores.values():
+            store.write_documents(docs)
+            store.delete_documents(deleted)
+        stores["persistent"].warm_up_bm25()
+
+        results = {}
+        for name, store in stores.items():
+            store.bm25_retrieval(queries[0], top_k=args.top_k)  # warm
+            samples, results[name] = [], []
+            for query in queries:
+                start = time.perf_counter()
+                found = store.bm25_retrieval(query, top_k=args.top_k)
+                samples.append(time.perf_counter() - start)
+                results[name].append([(d.id, d.score) for d in found])
+            samples.sort()
+            print(
+                f"{name:10s} p50 {samples[len(samples) // 2] * 1e3:9.3f} ms   "
+                f"p99 {samples[int(len(samples) * 0.99) - 1] * 1e3:9.3f} ms"
+            )
+
+        reference = results[next(iter(results))]
+        for name, found in results.items():
+            mismatches = 0
+            for expected, got in zip(reference, found):
+                same_scores = len(expected) == len(got) and all(
+                    math.isclose(a, b, rel_tol=1e-12)
+                    for a, b in zip(sorted(s for _, s in expected), sorted(s for _, s in got))
+                )
+                # documents tied with the k-th score are interchangeable (which of them make
+                # the cut is arbitrary), the ones scoring above it must be the same
+                cutoff = min((s for _, s in expected), default=0.0)
+                same_docs = {d for d, s in expected if not math.isclose(s, cutoff, rel_tol=1e-12)} == {
+                    d for d, s in got if not math.isclose(s, cutoff, rel_tol=1e-12)
+                }
+                mismatches += not (same_scores and same_docs)
+            print(f"{name:10s} top-{args.top_k} mismatches vs {next(iter(results))}: {mismatches}/{len(queries)}")
+
+
+if __name__ == "__main__":
+    main()
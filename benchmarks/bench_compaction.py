@@ -0,0 +1,119 @@
+"""
+Benchmark: PersistentDocumentStore.compact() while queries are in flight.
+
+Writes --docs chunks with embeddings to a store (views "rag" and "bm25",
+partitioned by file), then runs --rounds rounds of deleting a share of them
+and compacting, while --threads threads keep running BM25 and embedding
+queries (some filtered to a partition). Every returned document is checked
+against what was written: its content must be the one written under its id
+and its embedding score must be the query's dot product with its embedding,
+so a chunk returned under another chunk's score or a failed read counts as a
+mismatch. Reports compaction time, the size reclaimed and query latency.
+Runs offline.
+
+    python -m benchmarks.bench_compaction [--docs 20000] [--dim 256] [--rounds 5] [--threads 4]
+"""
+
+import argparse
+import tempfile
+import threading
+import time
+import traceback
+
+import numpy as np
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--docs", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--delete", type=float, default=0.15, help="share of the live chunks deleted per round")
+    args = parser.parse_args()
+
+    from haystack import Document
+    from backend.utils.persistent_store import CHUNKS_FILE, PersistentDocumentStore
+
+    rng = np.random.default_rng(0)
+    vocab = [f"term{i}" for i in range(2000)]
+    embeddings = rng.standard_normal((args.docs, args.dim)).astype(np.float32)
+    docs = [
+        Document(
+            content=f"chunk{i} " + " ".join(rng.choice(vocab, 40)),
+            meta={"file_path": f"file{i % 50}.pdf"},
+            embedding=embeddings[i].tolist(),
+        )
+        for i in range(args.docs)
+    ]
+    expected = {doc.id: (doc.content, embeddings[i]) for i, doc in enumerate(docs)}
+
+    with tempfile.TemporaryDirectory(prefix="bench_compaction_") as tmp:
+        store = PersistentDocumentStore(tmp, default_view="rag", partition_field="file_path")
+        half = args.docs // 2
+        store.view("rag").write_documents(docs[:half])
+        store.view("bm25").write_documents(docs[half:])
+        store.view("bm25").write_documents(docs[: half // 2])  # shared by both views
+        store.warm_up_bm25()
+
+        stop = threading.Event()
+        checked, mismatches, errors, latencies = [0], [0], [0], []
+
+        def check(documents, query=None):
+            for doc in documents:
+                content, embedding = expected.get(doc.id, (None, None))
+                if doc.content != content:
+                    mismatches[0] += 1
+                elif query is not None and abs(float(embedding @ query) - doc.score) > 1e-3 * max(1.0, abs(doc.score)):
+                    mismatches[0] += 1
+                checked[0] += 1
+
+        def query_loop(seed: int):
+            query_rng = np.random.default_rng(seed)
+            while not stop.is_set():
+                view = store.view(["rag", "bm25"][int(query_rng.integers(2))])
+                filters = None
+                if query_rng.random() < 0.3:
+                    filters = {"field": "meta.file_path", "operator": "==", "value": f"file{query_rng.integers(50)}.pdf"}
+                query = query_rng.standard_normal(args.dim).astype(np.float32)
+                start = time.perf_counter()
+                try:
+                    check(view.bm25_retrieval(" ".join(query_rng.choice(vocab, 3)), filters=filters, top_k=5))
+                    check(view.embedding_retrieval(query.tolist(), filters=filters, top_k=5), query)
+                except Exception:
+                    errors[0] += 1
+                    traceback.print_exc()
+                latencies.append(time.perf_counter() - start)
+
+        threads = [threading.Thread(target=query_loop, args=(seed,)) for seed in range(args.threads)]
+        for thread in threads:
+            thread.start()
+        try:
+            for round_number in range(args.rounds):
+                live = [doc.id for doc in store.filter_documents()]
+                doomed = rng.choice(len(live), int(len(live) * args.delete), replace=False)
+                store.delete_documents([live[i] for i in doomed])
+                size = (store.path / CHUNKS_FILE).stat().st_size
+                start = time.perf_counter()
+                store.compact()
+                seconds = time.perf_counter() - start
+                print(
+                    f"round {round_number}: compacted in {seconds:6.2f}s, sidecar "
+                    f"{size / 2**20:6.1f} -> {(store.path / CHUNKS_FILE).stat().st_size / 2**20:6.1f} MiB, "
+                    f"{store.count_documents()} chunks left"
+                )
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
+
+        latencies_ms = np.asarray(latencies) * 1000
+        print(
+            f"{len(latencies)} queries during compaction (p50 {np.percentile(latencies_ms, 50):.1f} ms, "
+            f"p99 {np.percentile(latencies_ms, 99):.1f} ms): {checked[0]} documents checked, "
+            f"{mismatches[0]} mismatches, {errors[0]} errors"
+        )
+
+
+if __name__ == "__main__":
+    main()
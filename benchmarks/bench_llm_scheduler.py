@@ -0,0 +1,149 @@
+"""
+Benchmark: summary map calls against a rate-limited API, unscheduled vs. LLMScheduler.
+
+Starts a local OpenAI-compatible stand-in server that allows --server-rps chat
+completions per second (429 with Retry-After above that) and fails a fraction
+of calls with 503, then runs several concurrent "summary jobs" of different
+sizes against it:
+  * unscheduled - every call of every job submitted to a thread pool at once,
+                  with the OpenAI client's own retries (the previous behaviour)
+  * scheduled   - calls go through LLMScheduler (concurrency cap, RPM budget,
+                  jittered retries, fair share between jobs)
+
+Reports failed calls, 429s seen by the server and when each job finished:
+with fair sharing the small jobs finish long before the large one. Runs offline.
+
+    python -m benchmarks.bench_llm_scheduler [--jobs 40 5 5] [--server-rps 20] [--error-rate 0.02]
+"""
+
+import argparse
+import asyncio
+import concurrent.futures
+import random
+import threading
+import time
+from collections import deque
+
+
+def start_server(port: int, rps: float, error_rate: float, latency: float) -> dict:
+    import uvicorn
+    from fastapi import FastAPI, Request
+    from fastapi.responses import JSONResponse
+
+    app = FastAPI()
+    state = {"calls": 0, "throttled": 0, "errors": 0}
+    recent = deque()
+
+    @app.post("/v1/chat/completions")
+    async def chat(request: Request):
+        body = await request.json()
+        state["calls"] += 1
+        now = time.monotonic()
+        while recent and recent[0] <= now - 1.0:
+            recent.popleft()
+        if len(recent) >= rps:
+            state["throttled"] += 1
+            retry_after = max(0.01, recent[0] + 1.0 - now)
+            return JSONResponse(
+                {"error": {"message": "Rate limit reached", "type": "requests"}},
+                status_code=429,
+                headers={"retry-after": f"{retry_after:.3f}"},
+            )
+        recent.append(now)
+        if random.random() < error_rate:
+            state["errors"] += 1
+            return JSONResponse({"error": {"message": "Service unavailable"}}, status_code=503)
+        await asyncio.sleep(latency)
+        return {
+            "id": "x",
+            "object": "chat.completion",
+            "created": 0,
+            "model": body["model"],
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": "summary"}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+        }
+
+    server = uvicorn.Server(uvicorn.Config(app, port=port, log_level="error"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return state
+
+
+def run(name: str, jobs: list, call_job) -> None:
+    start = time.perf_counter()
+    finished, failures = {}, {}
+
+    def job(index: int, size: int):
+        failures[index] = call_job(index, size)
+        finished[index] = time.perf_counter() - start
+
+    threads = [threading.Thread(target=job, args=(i, size)) for i, size in enumerate(jobs)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    done = ", ".join(f"job{i}({size}) {finished[i]:5.1f}s/{failures[i]} failed" for i, size in enumerate(jobs))
+    print(f"{name:12s} {done}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--jobs", type=int, nargs="+", default=[40, 5, 5], help="map calls per concurrent job")
+    parser.add_argument("--server-rps", type=float, default=20)
+    parser.add_argument("--error-rate", type=float, default=0.02)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--port", type=int, default=8917)
+    args = parser.parse_args()
+
+    import openai
+    from backend.utils.llm_scheduler import LLMScheduler
+
+    state = start_server(args.port, args.server_rps, args.error_rate, args.latency)
+    base_url = f"http://127.0.0.1:{args.port}/v1"
+    messages = [{"role": "user", "content": "Summarize: " + "lorem ipsum " * 200}]
+
+    client = openai.OpenAI(api_key="sk-bench", base_url=base_url)
+
+    def unscheduled(index: int, size: int) -> int:
+        failed = 0
+        with concurrent.futures.ThreadPoolExecutor() as executor:
+            futures = [
+                executor.submit(client.chat.completions.create, model="bench", messages=messages)
+                for _ in range(size)
+            ]
+            for future in concurrent.futures.as_completed(futures):
+                failed += future.exception() is not None
+        return failed
+
+    run("unscheduled", args.jobs, unscheduled)
+    print(f"{'':12s} server: {state['calls']} calls, {state['throttled']} throttled, {state['errors']} errors")
+
+    for key in state:
+        state[key] = 0
+    scheduler = LLMScheduler(
+        max_concurrency=args.concurrency, requests_per_minute=args.server_rps * 60 * 0.9, tokens_per_minute=0
+    )
+    bare = client.with_options(max_retries=0)
+
+    def scheduled(index: int, size: int) -> int:
+        failed = 0
+        with concurrent.futures.ThreadPoolExecutor(max_workers=min(size, args.concurrency)) as executor:
+            futures = [
+                executor.submit(
+                    scheduler.call, index, lambda: bare.chat.completions.create(model="bench", messages=messages)
+                )
+                for _ in range(size)
+            ]
+            for future in concurrent.futures.as_completed(futures):
+                failed += future.exception() is not None
+        return failed
+
+    run("scheduled", args.jobs, scheduled)
+    print(f"{'':12s} server: {state['calls']} calls, {state['throttled']} throttled, {state['errors']} errors")
+    print(f"{'':12s} scheduler: {scheduler.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Microbenchmark: per-request query pipeline construction vs. the reused pipeline.
+
+Runs entirely offline: the store is filled with random embeddings and the query
+embedding is pre-seeded in the query cache, so no OpenAI call is made and the
+numbers isolate pipeline construction overhead.
+
+    python -m benchmarks.bench_query_pipeline [--docs 2000] [--runs 200]
+"""
+
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--docs", type=int, default=2000)
+    parser.add_argument("--runs", type=int, default=200)
+    args = parser.parse_args()
+
+    # rag_core creates its stores and DB in the working directory
+    os.chdir(tempfile.mkdtemp(prefix="bench_query_pipeline_"))
+    from haystack import Document
+    from backend import rag_core
+
+    rag_core.set_openai_config("sk-benchmark")
+    dim = 1536
+    rng = random.Random(0)
+    docs = [
+        Document(
+            content=f"chunk {i} " + " ".join(f"w{rng.randrange(5000)}" for _ in range(50)),
+            embedding=[rng.uniform(-1, 1) for _ in range(dim)],
+        )
+        for i in range(args.docs)
+    ]
+    rag_core.get_doc_store_rag().write_documents(docs)
+
+    query = "w17 w42 w99"
+    cache = rag_core.get_query_embedding_cache()
+    cache.put(cache.make_key(query, rag_core.EMBEDDING_MODEL), [rng.uniform(-1, 1) for _ in range(dim)])
+    inputs = {"text_embedder": {"text": query}, "bm25_retriever": {"query": query}}
+
+    def per_request():
+        return rag_core._build_query_pipeline().run(inputs)
+
+    def reused():
+        return rag_core._query_pipeline().run(inputs)
+
+    def build_only():
+        return rag_core._build_query_pipeline()
+
+    for name, func in (("build only", build_only), ("per-request", per_request), ("reused", reused)):
+        func()  # warm
+        samples = []
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            func()
+            samples.append(time.perf_counter() - start)
+        samples.sort()
+        print(
+            f"{name:12s} mean {statistics.mean(samples) * 1e3:8.3f} ms   "
+            f"p50 {samples[len(samples) // 2] * 1e3:8.3f} ms   "
+            f"p99 {samples[int(len(samples) * 0.99) - 1] * 1e3:8.3f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
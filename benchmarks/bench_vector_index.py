@@ -0,0 +1,118 @@
+"""
+Benchmark: embedding retrieval recall@4 and latency, brute force vs. the IVF index.
+
+Compares, at each corpus size:
+  * inmemory - haystack's InMemoryDocumentStore + InMemoryEmbeddingRetriever
+               (the previous retriever; skipped above --inmemory-max chunks)
+  * exact    - PersistentDocumentStore with ExactIndex (one vectorized scan)
+  * ivf      - PersistentDocumentStore with IVFFlatIndex at several n_probe values
+
+Embeddings are synthetic but clustered like real text embeddings (topics plus
+noise). Queries are held out: drawn from the same topics as the corpus but
+never written to it, so none of them has a near-duplicate in the store (as a
+question rarely repeats a chunk). IVF recall depends mostly on how tight the
+clusters are: at --noise 2 and below it is ~1.0, at the default 3 it drops
+well below. Runs offline.
+
+    python -m benchmarks.bench_vector_index [--sizes 10000 100000 1000000] [--dim 384] [--queries 200] [--noise 3.0]
+
+1M chunks at --dim 1536 needs ~6 GB of disk for the store; use a smaller --dim
+to keep the run manageable (relative numbers are what matter).
+"""
+
+import argparse
+import tempfile
+import time
+
+import numpy as np
+
+
+def clustered(rng: np.random.Generator, n: int, dim: int, topics: int, noise: float) -> np.ndarray:
+    centers = rng.standard_normal((topics, dim)).astype(np.float32)
+    out = centers[rng.integers(0, topics, n)] + noise * rng.standard_normal((n, dim)).astype(np.float32)
+    return out / np.linalg.norm(out, axis=1, keepdims=True)
+
+
+def fill(store, vectors: np.ndarray, batch: int = 20000):
+    from haystack import Document
+
+    for start in range(0, len(vectors), batch):
+        store.write_documents(
+            [
+                Document(id=str(start + i), content=f"chunk {start + i}", embedding=v.tolist())
+                for i, v in enumerate(vectors[start:start + batch])
+            ]
+        )
+
+
+def measure(name: str, search, queries: np.ndarray, truth: list):
+    samples, hits = [], 0
+    search(queries[0])  # warm
+    for query, expected in zip(queries, truth):
+        start = time.perf_counter()
+        docs = search(query)
+        samples.append(time.perf_counter() - start)
+        hits += len({d.id for d in docs} & expected)
+    samples.sort()
+    print(
+        f"  {name:18s} recall@4 {hits / (4 * len(queries)):6.3f}   "
+        f"p50 {samples[len(samples) // 2] * 1e3:9.3f} ms   "
+        f"p99 {samples[int(len(samples) * 0.99) - 1] * 1e3:9.3f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument(
+        "--noise", type=float, default=3.0, help="spread around the topics (lower = tighter clusters, easier for IVF)"
+    )
+    parser.add_argument("--probes", type=int, nargs="+", default=[8, 16, 32])
+    parser.add_argument("--inmemory-max", type=int, default=100_000)
+    args = parser.parse_args()
+
+    from haystack import Document
+    from haystack.components.retrievers.in_memory import InMemoryEmbeddingRetriever
+    from haystack.document_stores.in_memory import InMemoryDocumentStore
+    from backend.utils.persistent_store import PersistentDocumentStore
+    from backend.utils.vector_index import ExactIndex, IVFFlatIndex
+
+    rng = np.random.default_rng(0)
+    for n in args.sizes:
+        print(f"{n} chunks, dim {args.dim}")
+        sample = clustered(rng, n + args.queries, args.dim, topics=max(10, n // 500), noise=args.noise)
+        vectors, queries = sample[:n], sample[n:]
+        truth = []
+        for query in queries:
+            scores = vectors @ (query / np.linalg.norm(query))
+            truth.append({str(i) for i in np.argpartition(-scores, 3)[:4]})
+
+        if n <= args.inmemory_max:
+            store = InMemoryDocumentStore(embedding_similarity_function="cosine")
+            store.write_documents(
+                [Document(id=str(i), content=f"chunk {i}", embedding=v.tolist()) for i, v in enumerate(vectors)]
+            )
+            retriever = InMemoryEmbeddingRetriever(document_store=store, top_k=4)
+            measure("inmemory", lambda q: retriever.run(query_embedding=q.tolist())["documents"], queries, truth)
+            del store, retriever
+
+        with tempfile.TemporaryDirectory(prefix="bench_vector_index_") as tmp:
+            store = PersistentDocumentStore(tmp, embedding_similarity_function="cosine", vector_index=ExactIndex())
+            fill(store, vectors)
+            measure("exact", lambda q: store.embedding_retrieval(q.tolist(), top_k=4), queries, truth)
+
+            # the index is trained on the same files the exact store wrote
+            start = time.perf_counter()
+            index = IVFFlatIndex(exact_below=0)
+            store = PersistentDocumentStore(tmp, embedding_similarity_function="cosine", vector_index=index)
+            print(f"  ivf build {time.perf_counter() - start:.1f} s, {index.stats()['n_lists']} lists")
+            for probes in args.probes:
+                index.n_probe = probes
+                measure(f"ivf n_probe={probes}", lambda q: store.embedding_retrieval(q.tolist(), top_k=4), queries, truth)
+            del store
+
+
+if __name__ == "__main__":
+    main()
@@ -8,10 +8,59 @@ import ReactMarkdown from 'react-markdown'
 import { Prism as SyntaxHighlighter } from 'react-syntax-highlighter'
 import { vscDarkPlus } from 'react-syntax-highlighter/dist/esm/styles/prism'
 
+// Reads the /rag/ask-stream SSE response, calling onEvent with each JSON event
+// ({content}, {progress}, {done} or {error}); ": heartbeat" comments are skipped.
+// Goes through the /api prefix like every other request (the dev server proxies it).
+async function streamAnswer(chatId, query, fileNames, onEvent) {
+  const res = await fetch('/api/rag/ask-stream', {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify({ chat_id: chatId, query, file_names: fileNames || [] }),
+  })
+  if (!res.ok || !res.body) throw new Error(`Request failed: ${res.status}`)
+
+  const handle = (event) => {
+    if (event.startsWith('data: ')) onEvent(JSON.parse(event.slice(6)))
+  }
+  const reader = res.body.getReader()
+  const decoder = new TextDecoder()
+  let buffer = ''
+  while (true) {
+    const { value, done } = await reader.read()
+    if (done) break
+    buffer += decoder.decode(value, { stream: true })
+    const events = buffer.split('\n\n')
+    buffer = events.pop()
+    events.forEach(handle)
+  }
+  // a last event the server did not terminate with a blank line
+  buffer += decoder.decode()
+  handle(buffer.trim())
+}
+
+function progressLabel(progress) {
+  const seconds = Math.round(progress.elapsed_ms / 1000)
+  if (progress.phase === 'map') {
+    return `Reading documents: ${progress.chunks_done}/${progress.chunks_total} sections (${seconds}s)`
+  }
+  if (progress.phase === 'reduce') {
+    return `Combining summaries, pass ${progress.level}: ${progress.groups_done}/${progress.groups_total} (${seconds}s)`
+  }
+  return `Writing the summary (${seconds}s)`
+}
+
+function progressFraction(progress) {
+  if (progress.phase === 'map') return progress.chunks_total ? progress.chunks_done / progress.chunks_total : 0
+  if (progress.phase === 'reduce') return progress.groups_total ? progress.groups_done / progress.groups_total : 0
+  return 1
+}
+
 export function ChatInterface({ chatId, ragFileNames }) {
   const [messages, setMessages] = useState([])
   const [input, setInput] = useState('')
   const [loading, setLoading] = useState(false)
+  const [progress, setProgress] = useState(null)
+  const [streaming, setStreaming] = useState(false)
   const messagesEndRef = useRef(null)
 
   useEffect(() => {
@@ -48,18 +97,39 @@ export function ChatInterface({ chatId, ragFileNames }) {
     setInput('')
     setLoading(true)
 
+    let answer = ''
+    const showAnswer = (content) =>
+      setMessages((prev) => [...prev.slice(0, -1), { role: 'assistant', content }])
+
     try {
-      const response = await api.askRag(chatId, userMessage.content, ragFileNames)
-      const assistantMessage = { role: 'assistant', content: response.answer }
-      setMessages((prev) => [...prev, assistantMessage])
+      await streamAnswer(chatId, userMessage.content, ragFileNames, (event) => {
+        if (event.progress) {
+          setProgress(event.progress)
+        } else if (event.content) {
+          if (!answer) {
+            // the first token replaces the progress indicator with the answer bubble
+            setProgress(null)
+            setStreaming(true)
+            setMessages((prev) => [...prev, { role: 'assistant', content: '' }])
+          }
+          answer += event.content
+          showAnswer(answer)
+        } else if (event.error) {
+          throw new Error(event.error)
+        }
+      })
     } catch (error) {
       console.error('Failed to send message:', error)
-      setMessages((prev) => [
-        ...prev,
-        { role: 'assistant', content: 'Sorry, I encountered an error processing your request.' },
-      ])
+      const reply = 'Sorry, I encountered an error processing your request.'
+      if (answer) {
+        showAnswer(reply)
+      } else {
+        setMessages((prev) => [...prev, { role: 'assistant', content: reply }])
+      }
     } finally {
       setLoading(false)
+      setStreaming(false)
+      setProgress(null)
     }
   }
 
@@ -138,13 +208,28 @@ export function ChatInterface({ chatId, ragFileNames }) {
               )}
             </div>
           ))}
-          {loading && (
+          {loading && !streaming && (
             <div className="flex gap-3 justify-start">
               <div className="flex-shrink-0 w-8 h-8 rounded-full bg-primary flex items-center justify-center">
                 <Bot className="h-5 w-5" />
               </div>
               <div className="rounded-lg px-4 py-3 bg-secondary">
-                <Loader2 className="h-5 w-5 animate-spin" />
+                {progress ? (
+                  <div className="w-64 space-y-2">
+                    <div className="flex items-center gap-2 text-sm text-muted-foreground">
+                      <Loader2 className="h-4 w-4 animate-spin flex-shrink-0" />
+                      <span>{progressLabel(progress)}</span>
+                    </div>
+                    <div className="h-1.5 rounded-full bg-background overflow-hidden">
+                      <div
+                        className="h-full bg-primary transition-all"
+                        style={{ width: `${Math.round(progressFraction(progress) * 100)}%` }}
+                      />
+                    </div>
+                  </div>
+                ) : (
+                  <Loader2 className="h-5 w-5 animate-spin" />
+                )}
               </div>
             </div>
           )}